@@ -1,16 +1,25 @@
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
 import os
+import copy
 import json
+import hashlib
 import random
-import re
 import time
-import requests
-import concurrent.futures
-from openai import OpenAI
+import uuid
 from dotenv import load_dotenv
+import checkout
 import database
+from constants import TICKET_PRICES, START_LOCATIONS, MOODS
+import gazetteer
+import images
+import jobs
+import metrics
+import pricing
+import route_cache
+import route_optimizer
+import route_prompt
+import travel_matrix
+import route_stream
 
 # --- 1. Configuration & Setup ---
 load_dotenv()
@@ -23,241 +32,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# OpenAI Client
-try:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    st.error(f"OpenAI API Key Error: {e}")
+# Prometheus endpoint, if METRICS_ENABLED and METRICS_PORT are set (see metrics.py)
+metrics.start_server()
 
 # --- 2. Constants & Data ---
 
-# Real Ticket Prices (2025 Estimates)
-TICKET_PRICES = {
-    "Gardens by the Bay": "SGD $53",
-    "Flower Dome": "SGD $32",
-    "Cloud Forest": "SGD $32",
-    "Marina Bay Sands Skypark": "SGD $32",
-    "ArtScience Museum": "SGD $25",
-    "National Museum of Singapore": "SGD $15",
-    "National Gallery Singapore": "SGD $20",
-    "Singapore Flyer": "SGD $40",
-    "Singapore Zoo": "SGD $48",
-    "Night Safari": "SGD $55",
-    "River Wonders": "SGD $42",
-    "Bird Paradise": "SGD $48",
-    "S.E.A. Aquarium": "SGD $44",
-    "Universal Studios Singapore": "SGD $88",
-    "Asian Civilisations Museum": "SGD $15"
-}
-
-# Key Locations for Start Points
-START_LOCATIONS = {
-    "NUS (National University of Singapore)": [1.2966, 103.7764],
-    "MBS (Marina Bay Sands)": [1.2847, 103.8610],
-    "Changi Airport": [1.3644, 103.9915],
-    "Orchard Road": [1.3048, 103.8318],
-    "Chinatown": [1.2842, 103.8436]
-}
+# TICKET_PRICES, START_LOCATIONS and MOODS live in constants.py so the
+# offline tools (e.g. travel_matrix.py) can use them without importing the app
 
 # --- 3. Custom CSS ---
-st.markdown("""
-<style>
-    /* Import Google Font */
-    @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@400;600;700&display=swap');
-
-    /* 1. Global Reset & High Contrast Defaults */
-    html, body, .stApp {
-        background-color: #ffffff !important;
-        color: #4a69bd !important;
-        font-family: 'Poppins', sans-serif;
-    }
-
-    /* 2. Force ALL text elements to Muted Blue */
-    h1, h2, h3, h4, h5, h6, p, label, li, span, div, caption, small {
-        color: #4a69bd !important;
-        text-shadow: none !important;
-    }
-    
-    /* Exception: Text inside components that have dark backgrounds (like Buttons/Toasts) */
-    
-    /* 3. Sidebar: Light Gray Background, Muted Blue Border */
-    [data-testid="stSidebar"] {
-        background-color: #ffffff !important;
-        border-right: 3px solid #4a69bd; /* Muted Blue */
-    }
-    [data-testid="stSidebar"] * {
-        color: #4a69bd !important;
-    }
-    
-    /* 4. Buttons (Muted Blue Background, White Text) */
-    div.stButton > button {
-        background-color: #4a69bd !important;
-        border: 2px solid #4a69bd !important;
-        border-radius: 8px;
-        padding: 0.6rem 1.5rem;
-        font-weight: 700;
-        text-transform: uppercase;
-        box-shadow: 4px 4px 0px #4a69bd; /* Hard Shadow */
-        transition: all 0.1s ease;
-    }
-    /* Text inside buttons MUST be White */
-    div.stButton > button p, div.stButton > button span, div.stButton > button {
-        color: #ffffff !important;
-    }
-    
-    div.stButton > button:hover {
-        background-color: #ffffff !important;
-        color: #4a69bd !important;
-        transform: translate(2px, 2px);
-        box-shadow: 2px 2px 0px #4a69bd;
-    }
-    /* Hover text becomes Muted Blue */
-    div.stButton > button:hover p, div.stButton > button:hover span {
-        color: #4a69bd !important;
-    }
-
-    /* 5. Inputs (Text, Selectbox, Slider, TextArea) */
-    div[data-baseweb="input"] > div, 
-    div[data-baseweb="select"] > div, 
-    div[data-baseweb="base-input"] > div,
-    div[data-baseweb="textarea"] > div {
-        background-color: #ffffff !important;
-        border: 2px solid #4a69bd !important;
-        border-radius: 8px;
-        color: #4a69bd !important;
-    }
-    input, textarea {
-        color: #4a69bd !important;
-        caret-color: #4a69bd !important;
-        background-color: #ffffff !important; 
-    }
-    /* Placeholder color */
-    ::placeholder {
-        color: #a4b0be !important;
-        opacity: 1;
-    }
-    /* Dropdown menu items */
-    ul[data-baseweb="menu"] li {
-        color: #4a69bd !important;
-        background-color: #ffffff !important;
-    }
-    
-    /* 6. Metrics */
-    [data-testid="stMetricValue"] {
-        color: #4a69bd !important;
-        font-size: 2.5rem !important;
-        font-weight: 900 !important;
-    }
-    [data-testid="stMetricLabel"] {
-        color: #4a69bd !important;
-        font-weight: 700;
-        text-decoration: underline;
-    }
-    
-    /* 7. Containers & Expanders */
-    div[data-testid="stVerticalBlock"] > div[style*="flex-direction: column;"] > div[data-testid="stVerticalBlock"] {
-        border: 2px solid #4a69bd;
-        box-shadow: 6px 6px 0px #4a69bd;
-        border-radius: 12px;
-        background-color: #ffffff;
-    }
-    .streamlit-expanderHeader {
-        background-color: #ffffff !important;
-        border: 2px solid #4a69bd !important;
-        color: #4a69bd !important;
-        border-radius: 8px;
-    }
-    .streamlit-expanderContent {
-        border: 2px solid #4a69bd;
-        border-top: none;
-        border-bottom-left-radius: 8px;
-        border-bottom-right-radius: 8px;
-        background-color: #ffffff !important;
-    }
-    /* Force text inside opened expander to be Blue */
-    .streamlit-expanderContent p, 
-    .streamlit-expanderContent span, 
-    .streamlit-expanderContent li, 
-    .streamlit-expanderContent div {
-        color: #4a69bd !important;
-    }
-    
-    /* 8. Notifications/Toasts */
-    div[data-baseweb="notification"], div[data-baseweb="toast"] {
-        background-color: #4a69bd !important;
-        border: 2px solid #ffffff !important;
-    }
-    /* Text inside Toast MUST be White - Targeting ALL children */
-    div[data-baseweb="notification"] *, div[data-baseweb="toast"] * {
-        color: #ffffff !important;
-        -webkit-text-fill-color: #ffffff !important;
-    }
-    
-    /* 9. Captions & Small Text */
-    div[data-testid="stCaptionContainer"] {
-        color: #4a69bd !important;
-        font-weight: 600;
-        opacity: 1 !important; /* Remove transparency */
-    }
+# Kept in style.css and read once per process. Streamlit drops whatever a
+# full rerun doesn't emit again, so it is still sent on every rerun, but as
+# a style-only st.html it goes to the event container and takes no space.
 
-    /* 10. Itinerary Location Names (White Text on Muted Blue Header) */
-    .streamlit-expanderHeader {
-        background-color: #4a69bd !important;
-        border: 2px solid #4a69bd !important;
-        border-radius: 8px;
-        margin-bottom: 0.5rem;
-        color: #ffffff !important;
-    }
-    
-    /* EXTREME SPECIFICITY FORCE WHITE TEXT */
-    div[data-testid="stExpander"] .streamlit-expanderHeader p,
-    div[data-testid="stExpander"] .streamlit-expanderHeader span,
-    div[data-testid="stExpander"] .streamlit-expanderHeader div,
-    div[data-testid="stExpander"] .streamlit-expanderHeader svg,
-    div[data-testid="stExpander"] .streamlit-expanderHeader strong {
-        color: #ffffff !important;
-        fill: #ffffff !important;
-    }
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
 
-    .streamlit-expanderHeader:hover {
-        opacity: 0.9;
-    }
-    /* Icon in expander header */
-    .streamlit-expanderHeader svg {
-        fill: #ffffff !important;
-        color: #ffffff !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.html(load_css())
 
 # --- 4. Helper Functions ---
 
-def get_place_image(place_name):
-    """Fetch image from Unsplash API."""
-    unsplash_key = os.getenv("UNSPLASH_ACCESS_KEY")
-    if unsplash_key:
-        try:
-            # Unsplash Search API
-            url = "https://api.unsplash.com/search/photos"
-            params = {
-                "query": f"{place_name} Singapore",
-                "per_page": 1,
-                "orientation": "landscape"
-            }
-            headers = {
-                "Authorization": f"Client-ID {unsplash_key}"
-            }
-            resp = requests.get(url, params=params, headers=headers, timeout=5).json()
-            if resp.get("results"):
-                # Return small URL for speed
-                return resp["results"][0]["urls"]["small"]
-        except Exception as e:
-            print(f"Unsplash Error: {e}")
-            pass
-
-    # Fallback to Placeholder if Unsplash fails
-    return f"https://via.placeholder.com/400x300?text={place_name.replace(' ', '+')}"
-
 def get_route_color(mood):
     colors = {
         "Chill (休闲)": "#00b894",      # Green
@@ -268,56 +64,245 @@ def get_route_color(mood):
     }
     return colors.get(mood, "#2d3436")
 
-def generate_ai_route(start_loc, start_coords, mood, duration, include_museums, custom_pref):
-    """Call OpenAI to generate a route."""
-    
-    museum_prompt = "Include at least one museum or heritage site." if include_museums else ""
-    custom_prompt = f"User Specific Preferences: {custom_pref}" if custom_pref else ""
-    prices_json = json.dumps(TICKET_PRICES)
-    
-    prompt = f"""
-    Plan a Singapore walking route.
-    Start: {start_loc} {start_coords}
-    Mood: {mood}
-    Duration: {duration} hours.
-    {museum_prompt}
-    {custom_prompt}
+def map_fingerprint(route, route_color, search_result):
+    """Identifies everything the Generator tab's map is drawn from."""
+    payload = json.dumps([route, route_color, search_result], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+@st.cache_resource(max_entries=64)
+def build_route_map(fingerprint, _route, route_color, _search_result):
+    """Build the Generator tab's folium map.
+
+    Cached on `fingerprint` (see map_fingerprint), so a rerun with an
+    unchanged route reuses the finished map instead of rebuilding it.
+    """
+    import folium # Heavy, so imported when a map is first drawn
+
+    # Zoom to search result if no route
+    if _search_result and _search_result.get("coords") and not _route:
+        m = folium.Map(location=_search_result["coords"], zoom_start=15, tiles="OpenStreetMap")
+    else:
+        # Initialize Map centered on Singapore
+        m = folium.Map(location=[1.3521, 103.8198], zoom_start=11, tiles="OpenStreetMap")
     
-    Reference Prices: {prices_json}
+    # 1. Plot Route (if exists)
+    if _route:
+        route_coords = []
+        
+        for idx, stop in enumerate(_route):
+            coords = stop.get("coords")
+            name = stop.get("name")
+            price = stop.get("price", "Free")
+            
+            if coords:
+                route_coords.append(coords)
+                
+                # Image is already fetched in parallel step
+                img_url = stop.get("image", "https://via.placeholder.com/300x200?text=Loading")
+                
+                # Custom Marker
+                icon = folium.Icon(color="white", icon_color=route_color, icon="map-marker", prefix="fa")
+                
+                popup_content = f"""
+                <div style='font-family:sans-serif; width:200px;'>
+                    <img src="{img_url}" style="width:100%; height:120px; object-fit:cover; border-radius:8px; margin-bottom:8px;">
+                    <b>{idx+1}. {name}</b><br>
+                    <span style='color:#666; font-size:12px;'>{price}</span>
+                </div>
+                """
+                
+                folium.Marker(
+                    location=coords,
+                    popup=folium.Popup(popup_content, max_width=200),
+                    tooltip=f"""
+                    <div style="width:150px;">
+                        <img src="{img_url}" style="width:100%; height:100px; object-fit:cover; border-radius:4px;">
+                        <div style="margin-top:4px; font-weight:bold;">{name}</div>
+                    </div>
+                    """,
+                    icon=icon
+                ).add_to(m)
+        
+        # Draw Line
+        if len(route_coords) > 1:
+            folium.PolyLine(
+                locations=route_coords,
+                color=route_color,
+                weight=5,
+                opacity=0.8
+            ).add_to(m)
+            
+            m.fit_bounds(route_coords)
     
-    Return JSON with key "stops" (list of objects) and "summary":
-    - "stops": [
-        - "name": Place name
-        - "coords": [lat, lon] (Accurate GPS)
-        - "desc": Short engaging description in Chinese
-        - "price": "Free" or price from Reference Prices (e.g., "SGD $53"). Estimate if missing.
-        - "transport_from_prev": (Object, null for first stop) describing how to get here from the previous stop.
-            - "method": "Walk" / "Bus" / "MRT" / "Taxi" (in Chinese, e.g. 步行, 巴士, 地铁)
-            - "duration": e.g. "10 mins"
-            - "cost": e.g. "SGD $0" or "SGD $2.50"
-    ]
-    - "summary": One sentence summary of the experience/vibe in Chinese (e.g. "这是一趟充满历史感与美食的文化之旅").
+    # 2. Plot Search Result (if exists)
+    if _search_result:
+        res = _search_result
+        s_coords = res.get("coords")
+        if s_coords:
+            # Fetch Image
+            img_url = images.get_place_image(res.get("name"))
+            
+            popup_content = f"""
+            <div style='font-family:sans-serif; width:200px;'>
+                <img src="{img_url}" style="width:100%; height:120px; object-fit:cover; border-radius:8px; margin-bottom:8px;">
+                <b>{res.get("name")}</b>
+            </div>
+            """
+            
+            folium.Marker(
+                location=s_coords,
+                popup=folium.Popup(popup_content, max_width=200),
+                tooltip=f"""
+                <div style="width:150px;">
+                    <img src="{img_url}" style="width:100%; height:100px; object-fit:cover; border-radius:4px;">
+                    <div style="margin-top:4px; font-weight:bold;">{res.get("name")}</div>
+                </div>
+                """,
+                icon=folium.Icon(color="red", icon="star", prefix="fa")
+            ).add_to(m)
     
-    Ensure 3-5 stops.
+    # Render the page around the map once here, so st_folium(render=False)
+    # doesn't redo it on every rerun (see the Generator tab)
+    m.get_root().render()
+    return m
+
+def count_tokens(response):
+    """Add a completion's token usage to the openai_tokens_total counters."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.incr("openai_tokens_total", usage.prompt_tokens or 0, kind="prompt")
+        metrics.incr("openai_tokens_total", usage.completion_tokens or 0, kind="completion")
+
+def check_route(stops):
+    """Snap/flag LLM coordinates against known places, replace the LLM's
+    guessed legs wherever the travel matrix knows both ends, and price the stops."""
+    gaz = load_gazetteer()
+    stops = [gaz.check_stop(stop) for stop in stops if isinstance(stop, dict)]
+    for prev, stop in zip(stops, stops[1:]):
+        stop["transport_from_prev"] = lookup_leg(prev, stop) or stop.get("transport_from_prev")
+    return pricing.price_route(stops)
+
+def read_variant(raw, seen, earlier):
+    """One route of a {"routes": [...]} completion as (stops, summary), or
+    None if it is empty or visits the same stops as an `earlier` one."""
+    if not isinstance(raw, dict):
+        return None
+    stops = [stop for stop in raw.get("stops") or [] if isinstance(stop, dict)]
+    stops = check_route(route_prompt.expand_repeats(stops, seen))
+    names = [stop.get("name") for stop in stops]
+    if not stops or any(names == [stop.get("name") for stop in other] for other, _ in earlier):
+        return None
+    return stops, raw.get("summary", "")
+
+@metrics.timed("app.generate_ai_route")
+def generate_ai_route(start_loc, start_coords, mood, duration, include_museums, custom_pref, fresh=False, variants=1):
+    """Call OpenAI to generate a route, unless the route cache already has one.
+
+    Drains stream_ai_route, so both share the route cache and the per-stop
+    processing. `fresh` skips the cache lookup; the new route still replaces
+    the cached one. API errors are shown and give an empty route.
+    With `variants` > 1, the same completion is asked for that many different
+    routes and a list of (stops, summary) is returned instead; it can come up
+    short if the model repeats itself.
     """
-    
+    stops, summary, routes = [], "", []
     try:
-        response = client.chat.completions.create(
+        for kind, value in stream_ai_route(start_loc, start_coords, mood, duration, include_museums, custom_pref, fresh, variants):
+            if kind == "route":
+                routes.append(value)
+            elif kind == "stop":
+                stops.append(value)
+            else:
+                summary = value
+    except Exception as e:
+        st.error(f"AI Generation Failed: {e}")
+        return ([], "") if variants == 1 else []
+    return (stops, summary) if variants == 1 else routes
+
+def stream_ai_route(start_loc, start_coords, mood, duration, include_museums, custom_pref, fresh=False, variants=1):
+    """Stream a route from OpenAI, or from the route cache.
+
+    Yields ("stop", stop) for each stop as soon as it has fully streamed in,
+    then ("summary", summary) once the completion is done. With `variants`
+    > 1 it yields ("route", (stops, summary)) for each whole route instead.
+    Cache hits yield everything straight away. API errors are raised, see
+    route_job.
+    """
+    cache_key = route_cache.make_key(start_loc, mood, duration, include_museums, custom_pref, variants)
+    if fresh:
+        route_cache.bypass()
+    else:
+        cached = route_cache.get(cache_key)
+        if cached and variants > 1:
+            for route in cached[0]:
+                yield "route", (route["stops"], route["summary"])
+            return
+        if cached:
+            for stop in cached[0]:
+                yield "stop", stop
+            yield "summary", cached[1]
+            return
+    
+    prompt = route_prompt.build_user_prompt(start_loc, start_coords, mood, duration, include_museums, custom_pref, variants)
+    parser = route_stream.StopStreamParser("routes" if variants > 1 else "stops")
+    gaz = load_gazetteer()
+    stops, routes, seen = [], [], {}
+    
+    started = time.perf_counter()
+    # The span covers the whole stream, first token to last
+    with metrics.span("openai.chat_stream"):
+        stream = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": "You are a Singapore travel guide. Output valid JSON only."},
+                {"role": "system", "content": route_prompt.SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        data = json.loads(response.choices[0].message.content)
-        return data.get("stops", []), data.get("summary", "")
-    except Exception as e:
-        st.error(f"AI Generation Failed: {e}")
-        return [], ""
+        for chunk in stream:
+            count_tokens(chunk) # Only the last chunk carries usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for stop in parser.feed(chunk.choices[0].delta.content):
+                if variants > 1:
+                    route = read_variant(stop, seen, routes)
+                    if route:
+                        routes.append(route)
+                        yield "route", route
+                    continue
+                # Snap/flag LLM coordinates against known places, and replace
+                # the LLM's guessed leg if the travel matrix knows both ends
+                stop = gaz.check_stop(stop)
+                if stops:
+                    stop["transport_from_prev"] = lookup_leg(stops[-1], stop) or stop.get("transport_from_prev")
+                stops.append(pricing.price_stop(stop))
+                yield "stop", stop
+    if variants > 1:
+        if routes:
+            route_cache.put(cache_key, [{"stops": stops, "summary": summary} for stops, summary in routes], None,
+                            time.perf_counter() - started)
+        return
+    summary = parser.document().get("summary", "")
+    
+    if stops:
+        route_cache.put(cache_key, stops, summary, time.perf_counter() - started)
+    yield "summary", summary
 
+@metrics.timed("app.search_place_ai")
 def search_place_ai(query, mood):
-    """Search for a single place via AI."""
+    """Search for a single place, locally if the query names a known place,
+    otherwise via AI. API errors are raised, see search_job."""
+    gaz = load_gazetteer()
+    place, score = gaz.lookup(query)
+    if place and score >= gazetteer.MATCH_THRESHOLD:
+        return {
+            "name": place["name"],
+            "coords": list(place["coords"]),
+            "desc": place["desc"] or "📍 本地地名库中的已知地点 (Known place)",
+        }
+    
     prompt = f"""
     Recommend ONE place in Singapore for: "{query}"
     Current Mood: {mood}
@@ -327,38 +312,390 @@ def search_place_ai(query, mood):
     - "coords": [lat, lon]
     - "desc": Why it fits (MUST be in Chinese)
     """
-    try:
-        response = client.chat.completions.create(
+    with metrics.span("openai.chat"):
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[{"role": "system", "content": "Output valid JSON. Use Chinese for descriptions."}, {"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
         )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        st.error(f"Search Failed: {e}")
+    count_tokens(response)
+    return gaz.check_stop(json.loads(response.choices[0].message.content))
+
+# {CHECKOUT_SESSION_ID} is filled in by Stripe, see checkout.forget()
+CHECKOUT_SUCCESS_URL = "http://localhost:8501/?success=true&session_id={CHECKOUT_SESSION_ID}"
+CHECKOUT_CANCEL_URL = "http://localhost:8501/?canceled=true"
+
+@st.cache_resource(show_spinner=False)
+def get_stripe():
+    """The stripe SDK, imported on the first payment and keyed once per process."""
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_API_KEY")
+    return stripe
+
+@st.cache_resource
+def init_database():
+    """Run pending schema migrations once per process, not on every rerun."""
+    database.init_db()
+    return database.get_schema_version()
+
+# Loaders below are also called from job threads, which have no page to show a spinner on
+@st.cache_resource(show_spinner=False)
+def get_openai_client():
+    """One OpenAI client per process, so its connection pool outlives reruns.
+    The SDK is imported on first use, off the cold-start path."""
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+@st.cache_resource(show_spinner=False)
+def load_travel_matrix():
+    """Memory-mapped travel matrix, built by `python travel_matrix.py`.
+
+    Raises FileNotFoundError until then. Streamlit doesn't cache exceptions,
+    so a matrix built while the app is running is picked up on the next call.
+    """
+    matrix = travel_matrix.load()
+    if matrix is None:
+        raise FileNotFoundError(travel_matrix.TRAVEL_MATRIX_FILE)
+    return matrix
+
+def lookup_leg(prev_stop, stop):
+    """transport_from_prev from the precomputed travel matrix, if both places are in it."""
+    try:
+        matrix = load_travel_matrix()
+    except FileNotFoundError:
         return None
+    return matrix.leg(prev_stop.get("name"), stop.get("name"), load_gazetteer())
 
-def fetch_images_parallel(route_data):
-    """Fetch images for all stops in parallel."""
-    def fetch_one(stop):
-        # Always fetch from external APIs (Google/Wiki) to ensure real images
-        stop["image"] = get_place_image(stop["name"])
-        return stop
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_gazetteer():
+    """Known places for local search and coordinate checks, rebuilt hourly
+    to pick up places from newly shared plans."""
+    init_database()
+    return gazetteer.build(TICKET_PRICES, START_LOCATIONS, database.get_place_locations())
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        list(executor.map(fetch_one, route_data))
-    
-    return route_data
+def set_route(route):
+    """Make `route` the current itinerary. Prices are parsed here, once, and
+    the totals kept next to it for the itinerary, Stripe and save_plan."""
+    if route:
+        pricing.price_route(route)
+    st.session_state.route = route
+    st.session_state.route_totals = pricing.route_totals(route) if route else None
+
+# --- Background Jobs ---
+# Route generation and AI search run on the shared jobs queue, so a click
+# returns straight away. The session keeps the job id and a fragment polls
+# it every JOB_POLL_SECONDS until the result can be applied. Results of
+# coalesced jobs are shared between sessions, so they are copied on apply.
+
+JOB_POLL_SECONDS = 0.5
+MAX_VARIANTS = 3
+VARIANT_LABELS = "ABC"
+
+def job_owner():
+    """Who a job counts against for jobs.MAX_PER_USER, and whose ticket cart
+    it is (see checkout.py): the account, else this browser session."""
+    if st.session_state.user:
+        return f"user:{st.session_state.user[0]}"
+    return f"session:{st.session_state.session_id}"
+
+@metrics.timed("app.route_job")
+def route_job(job, start_key, mood, duration, include_museums, custom_pref, fresh, variants=1):
+    """Job body: streams stops (or, with several variants, whole routes) into
+    job.progress, then waits for their images. A place is looked up once
+    however many variants visit it."""
+    first_stop_at, lookups, summary, routes = None, images.ImageLookups(), "", []
+    for kind, value in stream_ai_route(start_key, START_LOCATIONS[start_key], mood, duration, include_museums, custom_pref,
+                                       fresh=fresh, variants=variants):
+        if kind == "summary":
+            summary = value
+            continue
+        if first_stop_at is None:
+            first_stop_at = time.time() - job.submitted_at
+        if kind == "route":
+            routes.append(value)
+        lookups.add(value[0] if kind == "route" else [value])
+        job.progress.append(value)
+    if variants == 1:
+        routes = [(list(job.progress), summary)]
+    for stops, _ in routes:
+        lookups.fill(stops)
+    return {"variants": [{"stops": stops, "summary": summary} for stops, summary in routes],
+            "timing": {"first_stop": first_stop_at, "total": time.time() - job.submitted_at}}
+
+@metrics.timed("app.search_job")
+def search_job(job, query, mood):
+    return search_place_ai(query, mood)
+
+def submit_job(state_key, key, fn, *args, **info):
+    """Queue fn on the shared job queue and remember it in st.session_state[state_key]."""
+    try:
+        job = jobs.get_queue().submit(key, fn, *args, user=job_owner(), kind=state_key)
+    except jobs.QueueFull as e:
+        st.warning(f"⏳ {e}")
+        return
+    st.session_state[state_key] = {"id": job.id, **info}
+
+def poll_job(state_key):
+    """The session's job under state_key, or None once it is gone. A failed
+    job is cleared here and its error kept for the next full rerun."""
+    pending = st.session_state.get(state_key)
+    job = jobs.get_queue().get(pending["id"]) if pending else None
+    if pending and (job is None or job.status == "failed"):
+        st.session_state[state_key] = None
+        if job is not None:
+            st.session_state.job_error = f"{pending['error_label']}: {job.error}"
+        st.rerun()
+    return job
+
+def apply_variant(variants=None):
+    """Make the variant picked in st.session_state.route_variant the current
+    itinerary; switching variants needs no new request. A copy, so edits to
+    the itinerary leave the stored variant alone."""
+    variant = (variants or st.session_state.route_variants)[st.session_state.route_variant]
+    set_route(copy.deepcopy(variant["stops"]))
+    st.session_state.route_summary = variant["summary"]
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def route_job_status():
+    job = poll_job("route_job")
+    if job is None:
+        return
+    if job.status == "done":
+        pending, result = st.session_state.route_job, copy.deepcopy(job.result)
+        st.session_state.route_job = None
+        variants = [v for v in result["variants"] if v["stops"]]
+        if not variants:
+            st.session_state.job_error = "❌ 规划失败 (Generation failed)"
+            st.rerun()
+        st.session_state.route_variants = variants if len(variants) > 1 else None
+        st.session_state.route_variant = 0
+        apply_variant(variants)
+        st.session_state.route_timing = result["timing"]
+        st.session_state.mood = pending["mood"]
+        st.session_state.start_loc_name = pending["start_loc"]
+        st.session_state.search_result = None # Clear previous search
+        st.rerun()
+
+    st.subheader("📍 行程单")
+    with st.status("🤖 AI 正在思考中... (AI is thinking...)", expanded=True):
+        ahead = jobs.get_queue().position(job)
+        if ahead is not None:
+            st.write(f"⏳ 排队中，前面还有 {ahead} 个请求 (Queued)")
+        else:
+            st.write("🗺️ 规划路线中... (Planning Route)")
+        # Stops (or whole variants) show up as soon as the model has finished writing them
+        if st.session_state.route_job.get("variants", 1) > 1:
+            for idx, (stops, summary) in enumerate(list(job.progress)):
+                st.markdown(f"**方案 {VARIANT_LABELS[idx]}** · " + " → ".join(stop.get("name", "") for stop in stops))
+                st.caption(summary)
+        else:
+            for idx, stop in enumerate(list(job.progress)):
+                st.markdown(f"**{idx + 1}. {stop.get('name')}** · {stop.get('price', 'Free')}")
+                st.caption(stop.get("desc"))
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def search_job_status():
+    job = poll_job("search_job")
+    if job is None:
+        return
+    if job.status == "done":
+        st.session_state.search_job = None
+        st.session_state.search_result = copy.deepcopy(job.result)
+        st.rerun()
+    st.caption("🔍 Searching...")
+
+# --- Community & Meetup Feeds ---
+# Each tab renders a window of FEED_WINDOW cards, however many pages have been
+# loaded, and every card is a fragment: reviewing a plan or joining a meetup
+# reruns that one card rather than the whole app.
+
+FEED_WINDOW = database.FEED_PAGE_SIZE
+
+def feed_window(name, fetch_page, **filters):
+    """Cards to render for the paginated feed kept in st.session_state[name].
+
+    fetch_page(cursor, **filters) returns (items, next_cursor) like
+    database.get_plans_page(). Setting the session key to None reloads the
+    feed from the first page, as does changing the filters.
+    """
+    feed = st.session_state.get(name)
+    if feed is None or feed["filters"] != filters:
+        items, cursor = fetch_page(**filters)
+        feed = {"items": items, "cursor": cursor, "offset": 0, "filters": filters}
+        st.session_state[name] = feed
+    return feed["items"][feed["offset"]:feed["offset"] + FEED_WINDOW]
+
+def feed_nav(name, fetch_page):
+    """Previous/next window buttons; the next page is fetched on demand."""
+    feed = st.session_state[name]
+    offset, loaded = feed["offset"], len(feed["items"])
+    has_next = offset + FEED_WINDOW < loaded or feed["cursor"] is not None
+    if offset == 0 and not has_next:
+        return
+    c_prev, c_pos, c_next = st.columns([1, 1, 1])
+    with c_prev:
+        if st.button("⬆️ 上一页 (Newer)", key=f"{name}_prev", disabled=offset == 0, use_container_width=True):
+            feed["offset"] = max(offset - FEED_WINDOW, 0)
+            st.rerun()
+    with c_pos:
+        st.caption(f"第 {offset + 1}–{min(offset + FEED_WINDOW, loaded)} 条")
+    with c_next:
+        if st.button("⬇️ 下一页 (Older)", key=f"{name}_next", disabled=not has_next, use_container_width=True):
+            if offset + FEED_WINDOW >= loaded:
+                more, feed["cursor"] = fetch_page(feed["cursor"], **feed["filters"])
+                feed["items"].extend(more)
+            feed["offset"] = offset + FEED_WINDOW
+            st.rerun()
+
+# Card actions run as button callbacks, before the card is drawn again, and
+# update the card's dict in the feed's session state in place.
+
+def submit_review(p):
+    database.add_review(p['id'], st.session_state[f"pm_{p['id']}"],
+                        st.session_state[f"cm_{p['id']}"], st.session_state[f"rt_{p['id']}"])
+    p.update(database.get_plan(p['id'])) # The card now shows the review
+
+def join_meetup(m, username):
+    database.join_meetup(m['id'], username)
+    m.update(database.get_meetup(m['id']))
+
+@st.fragment
+def plan_card(p):
+    """One community plan."""
+    with st.container(border=True):
+        # Header: User & Mood
+        c_user, c_mood, c_date = st.columns([2, 2, 2])
+        with c_user:
+            st.markdown(f"**👤 {p['username']}**")
+        with c_mood:
+            st.markdown(f"🎭 {p['mood']}")
+        with c_date:
+            st.caption(f"📅 {p['created_at']}")
+        
+        st.markdown(f"**🚩 出发地:** {p['start_loc']}")
+        
+        # Summary if available
+        if p.get("summary"):
+            st.caption(f"✨ {p['summary']}")
+        
+        # Review Display
+        if p.get("review_text"):
+            st.markdown("---")
+            st.markdown("#### 📝 旅后感 (Post-Trip Review)")
+            
+            # Rating
+            stars = "⭐" * (p['rating'] or 0)
+            st.markdown(f"**评分:** {stars}")
+            
+            # Mood Change
+            if p.get("post_mood"):
+                st.write(f"🎭 **心情变化:** {p['mood']} ➡️ **{p['post_mood']}**")
+            
+            # Comment
+            st.info(f"🗣️ \"{p['review_text']}\"")
+            st.markdown("---")
+
+        # Route Summary
+        stops = p['stops']
+        cost = f" · 💰 {pricing.format_cents(p['total_cents'], p['currency'] or pricing.CURRENCY)}" if p.get("total_cents") is not None else ""
+        st.markdown(f"**📍 路线 ({len(stops)} stops){cost}:**")
+        
+        # Horizontal Steps (Styled to avoid black background)
+        steps_html = " <span style='color:#ccc'>→</span> ".join(stops)
+        st.markdown(f"""
+        <div style="
+            background-color: #f0f2f6; 
+            padding: 10px; 
+            border-radius: 8px; 
+            color: #4a69bd; 
+            font-weight: 600; 
+            font-size: 0.9rem;
+            border: 1px solid #d1d5db;
+        ">
+            {steps_html}
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Load Button (Optional - could load into main view)
+        c_load, c_meetup, c_review = st.columns([1, 1, 1])
+        with c_load:
+            if st.button("👀 查看详情 (Load this Plan)", key=f"load_{p['id']}"):
+                set_route(database.get_plan_route(p['id']))
+                st.session_state.route_variants = None
+                st.session_state.route_timing = None
+                st.session_state.mood = p['mood']
+                st.session_state.start_loc_name = p['start_loc']
+                st.session_state.route_summary = p.get("summary", "")
+                st.toast(f"已加载 {p['username']} 的行程！请切换到'行程规划'标签页查看地图。")
+                st.rerun() # The Generator tab lives outside this fragment
+        
+        with c_meetup:
+            if st.session_state.user:
+                with st.popover("📅 发起同游 (Schedule Meetup)"):
+                    st.write("设置出发时间，邀请其他人加入！")
+                    meetup_time = st.text_input("出发时间 (e.g. 明天上午10点)", key=f"time_{p['id']}")
+                    if st.button("确认发起", key=f"confirm_{p['id']}"):
+                        if meetup_time:
+                            database.create_meetup(p['id'], st.session_state.user[0], st.session_state.user[1], meetup_time)
+                            st.session_state.feed_meetups = None
+                            st.toast("发起成功！请前往 '结伴同游' 标签页查看。")
+                            st.rerun() # Refresh the Meetups tab too
+                        else:
+                            st.error("请输入时间")
+            else:
+                st.caption("登录后可发起同游")
+        
+        with c_review:
+            # Allow owner to add/edit review
+            if st.session_state.user and st.session_state.user[1] == p['username']:
+                with st.popover("📝 写评价 (Review)"):
+                    st.write("旅程结束了吗？分享你的感受！")
+                    st.select_slider("🎭 旅后心情 (Post-Trip Mood)", 
+                                     options=["Chill (休闲)", "Energetic (活力)", "Foodie (美食)", "Melancholy (忧郁)", "Cultural (文化)", "Happy (开心)", "Tired (累但充实)"],
+                                     key=f"pm_{p['id']}")
+                    st.slider("⭐ 评分 (Rating)", 1, 5, 5, key=f"rt_{p['id']}")
+                    st.text_area("✍️ 评价 (Comments)", key=f"cm_{p['id']}")
+                    
+                    st.button("提交评价", key=f"sub_rev_{p['id']}", on_click=submit_review, args=(p,))
+
+@st.fragment
+def meetup_card(m):
+    """One meetup."""
+    with st.container(border=True):
+        c_info, c_action = st.columns([3, 1])
+        
+        with c_info:
+            st.markdown(f"#### 🚩 {m['host_name']} 发起的漫步")
+            st.caption(f"🕒 时间: **{m['meetup_time']}**")
+            st.write(f"📍 路线: {m['start_loc']} ({m['mood']})")
+            if m.get("summary"):
+                st.info(f"✨ {m['summary']}")
+            
+            # Participants
+            parts = m['participants']
+            st.write(f"👥 已加入 ({m['participant_count']}人): {', '.join(parts)}")
+        
+        with c_action:
+            if st.session_state.user:
+                username = st.session_state.user[1]
+                if username in m['participants']:
+                    st.success("✅ 已加入")
+                else:
+                    st.button("👋 加入 (Join)", key=f"join_{m['id']}", on_click=join_meetup, args=(m, username))
+            else:
+                st.caption("登录后加入")
 
 # --- 5. Main Application Logic ---
 
 def main():
     # --- Database Init ---
-    database.init_db()
+    init_database()
 
     # --- Session State Initialization ---
     if "route" not in st.session_state:
         st.session_state.route = None
+    if "route_totals" not in st.session_state:
+        st.session_state.route_totals = None # pricing.route_totals() of the route, see set_route()
     if "route_summary" not in st.session_state:
         st.session_state.route_summary = ""
     if "search_result" not in st.session_state:
@@ -369,6 +706,24 @@ def main():
         st.session_state.user = None
     if "start_loc_name" not in st.session_state:
         st.session_state.start_loc_name = "Unknown"
+    if "route_timing" not in st.session_state:
+        st.session_state.route_timing = None # Time to first stop / full route of the last generation
+    if "feed_plans" not in st.session_state:
+        st.session_state.feed_plans = None # Loaded lazily, one page at a time, see feed_window()
+    if "feed_meetups" not in st.session_state:
+        st.session_state.feed_meetups = None
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex # Job owner when not logged in
+    if "route_job" not in st.session_state:
+        st.session_state.route_job = None # Pending generation, see route_job_status()
+    if "search_job" not in st.session_state:
+        st.session_state.search_job = None
+    if "job_error" not in st.session_state:
+        st.session_state.job_error = None
+    if "route_variants" not in st.session_state:
+        st.session_state.route_variants = None # [{"stops", "summary"}] when one request returned several routes
+    if "route_variant" not in st.session_state:
+        st.session_state.route_variant = 0 # Index into route_variants, bound to the selector
 
     # --- Sidebar ---
     with st.sidebar:
@@ -411,32 +766,26 @@ def main():
         
         st.subheader("1. 您的旅程")
         start_key = st.selectbox("🚩 出发地", list(START_LOCATIONS.keys()))
-        mood = st.select_slider("🎭 今日心情", ["Chill (休闲)", "Energetic (活力)", "Foodie (美食)", "Melancholy (忧郁)", "Cultural (文化)"])
+        mood = st.select_slider("🎭 今日心情", MOODS)
         duration = st.slider("⏱️ 时长 (小时)", 1.0, 6.0, 2.5)
         
         st.subheader("2. 偏好")
         include_museums = st.toggle("🏛️ 包含博物馆/展览", value=False)
         custom_pref = st.text_area("✍️ 其他偏好 (Optional)", placeholder="e.g. 我想吃鸡饭，或者去一个安静的公园", height=70)
+        n_variants = st.select_slider("🔀 方案数量 (Route options)", list(range(1, MAX_VARIANTS + 1)), value=1,
+                                      help="一次生成多个方案，可直接切换比较 (One request, several routes to compare)")
+        fresh_route = st.checkbox("🎲 重新生成 (不使用缓存)", value=False)
         
         st.markdown("---")
+        # Generation runs as a background job that streams into the itinerary column
         if st.button("🚀 生成路线", use_container_width=True):
-            with st.status("🤖 AI 正在思考中... (AI is thinking...)") as status:
-                st.write("🗺️ 规划路线中... (Planning Route)")
-                start_coords = START_LOCATIONS[start_key]
-                route_data, summary = generate_ai_route(start_key, start_coords, mood, duration, include_museums, custom_pref)
-                
-                if route_data:
-                    st.write("🎨 搜索真实景点图片... (Searching Real Images)")
-                    route_data = fetch_images_parallel(route_data)
-                    
-                    st.session_state.route = route_data
-                    st.session_state.route_summary = summary
-                    st.session_state.mood = mood
-                    st.session_state.start_loc_name = start_key
-                    st.session_state.search_result = None # Clear previous search
-                    
-                    status.update(label="✅ 规划完成! (Complete!)", state="complete", expanded=False)
-                    st.rerun()
+            submit_job("route_job", ("route", route_cache.make_key(start_key, mood, duration, include_museums, custom_pref, n_variants), fresh_route),
+                       route_job, start_key, mood, duration, include_museums, custom_pref, fresh_route, n_variants,
+                       mood=mood, start_loc=start_key, variants=n_variants, error_label="AI Generation Failed")
+        
+        cache_stats = route_cache.cache_stats()
+        if cache_stats["hits"]:
+            st.caption(f"⚡ 路线缓存命中率 {cache_stats['hit_ratio']:.0%} · 已节省 {cache_stats['saved_seconds']:.0f}s")
 
     # --- Main Content ---
     st.title("🇸🇬 新加坡城市漫步指南")
@@ -445,6 +794,7 @@ def main():
     if st.query_params.get("success") == "true":
         st.balloons()
         st.success("🎉 支付成功！您的门票已确认。(Payment Successful!)")
+        checkout.forget(st.query_params.pop("session_id", None)) # Paid, so the same tickets get a new session
         # Update query param to prevent repeat animations on rerun
         st.query_params["success"] = "false"
         
@@ -461,92 +811,20 @@ def main():
         
         # --- Left Column: Map ---
         with col1:
-            # Initialize Map centered on Singapore
-            m = folium.Map(location=[1.3521, 103.8198], zoom_start=11, tiles="OpenStreetMap")
-            
-            # 1. Plot Route (if exists)
-            if st.session_state.route:
-                route_coords = []
-                route_color = get_route_color(st.session_state.mood)
-                
-                for idx, stop in enumerate(st.session_state.route):
-                    coords = stop.get("coords")
-                    name = stop.get("name")
-                    price = stop.get("price", "Free")
-                    
-                    if coords:
-                        route_coords.append(coords)
-                        
-                        # Image is already fetched in parallel step
-                        img_url = stop.get("image", "https://via.placeholder.com/300x200?text=Loading")
-                        
-                        # Custom Marker
-                        icon = folium.Icon(color="white", icon_color=route_color, icon="map-marker", prefix="fa")
-                        
-                        popup_content = f"""
-                        <div style='font-family:sans-serif; width:200px;'>
-                            <img src="{img_url}" style="width:100%; height:120px; object-fit:cover; border-radius:8px; margin-bottom:8px;">
-                            <b>{idx+1}. {name}</b><br>
-                            <span style='color:#666; font-size:12px;'>{price}</span>
-                        </div>
-                        """
-                        
-                        folium.Marker(
-                            location=coords,
-                            popup=folium.Popup(popup_content, max_width=200),
-                            tooltip=f"""
-                            <div style="width:150px;">
-                                <img src="{img_url}" style="width:100%; height:100px; object-fit:cover; border-radius:4px;">
-                                <div style="margin-top:4px; font-weight:bold;">{name}</div>
-                            </div>
-                            """,
-                            icon=icon
-                        ).add_to(m)
+            # Built once per distinct (route, mood color, search result);
+            # unrelated reruns reuse the cached map
+            route = st.session_state.route
+            route_color = get_route_color(st.session_state.mood)
+            search_result = st.session_state.search_result
+            with metrics.span("render.map"):
+                m = build_route_map(map_fingerprint(route, route_color, search_result), route, route_color, search_result)
                 
-                # Draw Line
-                if len(route_coords) > 1:
-                    folium.PolyLine(
-                        locations=route_coords,
-                        color=route_color,
-                        weight=5,
-                        opacity=0.8
-                    ).add_to(m)
-                    
-                    m.fit_bounds(route_coords)
-            
-            # 2. Plot Search Result (if exists)
-            if st.session_state.search_result:
-                res = st.session_state.search_result
-                s_coords = res.get("coords")
-                if s_coords:
-                    # Fetch Image
-                    img_url = get_place_image(res.get("name"))
-                    
-                    popup_content = f"""
-                    <div style='font-family:sans-serif; width:200px;'>
-                        <img src="{img_url}" style="width:100%; height:120px; object-fit:cover; border-radius:8px; margin-bottom:8px;">
-                        <b>{res.get("name")}</b>
-                    </div>
-                    """
-                    
-                    folium.Marker(
-                        location=s_coords,
-                        popup=folium.Popup(popup_content, max_width=200),
-                        tooltip=f"""
-                        <div style="width:150px;">
-                            <img src="{img_url}" style="width:100%; height:100px; object-fit:cover; border-radius:4px;">
-                            <div style="margin-top:4px; font-weight:bold;">{res.get("name")}</div>
-                        </div>
-                        """,
-                        icon=folium.Icon(color="red", icon="star", prefix="fa")
-                    ).add_to(m)
-                    
-                    # Zoom to search result if no route, or just fit bounds
-                    if not st.session_state.route:
-                        m.location = s_coords
-                        m.zoom_start = 15
-            
-            st_folium(m, width="100%", height=550)
+                # No returned objects: we don't read map state back, so pan/zoom
+                # doesn't trigger a rerun. st_folium renders the map it is given
+                # again and each render appends to its script, so it gets a copy:
+                # the cached map stays as built and the output stays the same
+                from streamlit_folium import st_folium
+                st_folium(copy.deepcopy(m), width="100%", height=550, returned_objects=[], render=False)
 
         # --- Right Column: Details & Stats ---
         with col2:
@@ -556,11 +834,11 @@ def main():
                 query = st.text_input("想找什么？", placeholder="例：安静的看海咖啡馆")
                 if st.button("🔍 搜索"):
                     if query:
-                        with st.spinner("Searching..."):
-                            res = search_place_ai(query, st.session_state.mood)
-                            if res:
-                                st.session_state.search_result = res
-                                st.rerun()
+                        mood_now = st.session_state.mood
+                        submit_job("search_job", ("search", route_cache.normalize_pref(query), mood_now),
+                                   search_job, query, mood_now, error_label="Search Failed")
+                if st.session_state.search_job:
+                    search_job_status()
             
             # Search Result Display
             if st.session_state.search_result:
@@ -571,9 +849,6 @@ def main():
                 c_add, c_clear = st.columns(2)
                 with c_add:
                     if st.button("➕ 加入行程"):
-                        if st.session_state.route is None:
-                            st.session_state.route = []
-                        
                         # Create new stop object
                         new_stop = {
                             "name": res.get("name"),
@@ -587,7 +862,9 @@ def main():
                             }
                         }
                         
-                        st.session_state.route.append(new_stop)
+                        # Insert where it adds the least walking instead of at the end
+                        origin = START_LOCATIONS.get(st.session_state.start_loc_name)
+                        set_route(route_optimizer.insert_stop(st.session_state.route or [], new_stop, origin, leg_for=lookup_leg))
                         st.session_state.search_result = None # Clear search
                         st.toast(f"✅ 已将 {res.get('name')} 加入行程！")
                         time.sleep(1)
@@ -600,15 +877,42 @@ def main():
             
             st.markdown("---")
 
+            # Route Generation (a background job, see route_job_status)
+            if st.session_state.job_error:
+                st.error(st.session_state.job_error)
+                st.session_state.job_error = None
+            if st.session_state.route_job:
+                route_job_status()
+            
             # Route Details
-            if st.session_state.route:
+            elif st.session_state.route:
                 st.subheader("📍 行程单")
                 
+                variants = st.session_state.route_variants
+                if variants:
+                    st.radio("🔀 路线方案 (Options)", range(len(variants)), key="route_variant", horizontal=True,
+                             format_func=lambda i: f"方案 {VARIANT_LABELS[i]} · {len(variants[i]['stops'])} 站",
+                             on_change=apply_variant)
+                
                 # Show Vibe Summary
                 if st.session_state.route_summary:
                     st.info(f"✨ **体验总结:** {st.session_state.route_summary}")
                 
-                total_cost = 0
+                timing = st.session_state.route_timing
+                if timing:
+                    st.caption(f"⏱️ 首个景点 {timing['first_stop']:.1f}s · 完整路线 {timing['total']:.1f}s")
+                
+                if len(st.session_state.route) > 2:
+                    if st.button("🧭 优化路线顺序 (Optimize order)", use_container_width=True):
+                        origin = START_LOCATIONS.get(st.session_state.start_loc_name)
+                        new_route, km_before, km_after = route_optimizer.optimize_route(st.session_state.route, origin, leg_for=lookup_leg)
+                        if km_after < km_before:
+                            set_route(new_route)
+                            st.toast(f"✅ 路线缩短 {km_before - km_after:.1f} km ({km_before:.1f} → {km_after:.1f} km)")
+                            time.sleep(1)
+                            st.rerun()
+                        else:
+                            st.toast("👍 当前顺序已是最优 (Already optimal)")
                 
                 for idx, stop in enumerate(st.session_state.route):
                     name = stop.get("name")
@@ -659,67 +963,38 @@ def main():
                         # Description
                         st.markdown(f"<div style='color: #4a69bd; font-size: 0.9rem; margin-bottom: 12px; opacity: 0.9;'>{desc}</div>", unsafe_allow_html=True)
                         
-                        # Action Button (if paid)
-                        price_val = 0
-                        nums = re.findall(r'\d+', price_str)
-                        if nums: price_val = int(nums[0])
-                        
-                        if price_val > 0:
-                            # Stripe Payment Link Generation
-                            if st.button(f"🎟️ 预订门票 (SGD ${price_val})", key=f"btn_{idx}", use_container_width=True):
-                                try:
-                                    import stripe
-                                    stripe.api_key = os.getenv("STRIPE_API_KEY")
-                                    
-                                    # Create Checkout Session
-                                    session = stripe.checkout.Session.create(
-                                        payment_method_types=['card'],
-                                        line_items=[{
-                                            'price_data': {
-                                                'currency': 'sgd',
-                                                'product_data': {
-                                                    'name': f"Ticket for {name}",
-                                                },
-                                                'unit_amount': price_val * 100, # Amount in cents
-                                            },
-                                            'quantity': 1,
-                                        }],
-                                        mode='payment',
-                                        success_url='http://localhost:8501/?success=true',
-                                        cancel_url='http://localhost:8501/?canceled=true',
-                                    )
-                                    
-                                    # Store the payment URL in session state to show it
-                                    st.session_state[f"pay_link_{idx}"] = session.url
-                                    st.rerun()
-                                    
-                                except Exception as e:
-                                    st.error(f"Payment Error: {str(e)}")
-                                    st.info("Please check if STRIPE_API_KEY is set in .env")
-
-                            # Show Payment Link if generated
-                            if f"pay_link_{idx}" in st.session_state:
-                                # Check for Test Mode
-                                is_test = os.getenv("STRIPE_API_KEY", "").startswith("sk_test_")
-                                btn_label = "💳 点击前往支付 (Stripe - 沙盒测试)" if is_test else "💳 点击前往支付 (Stripe)"
-                                
-                                st.link_button(
-                                    btn_label, 
-                                    st.session_state[f"pay_link_{idx}"], 
-                                    use_container_width=True
-                                )
-                                if is_test:
-                                    st.caption("⚠️ 当前为沙盒模式，不会产生实际扣款")
-                        
-                        # Cost Calculation Logic
-                        if nums: total_cost += int(nums[0])
-                        if transport:
-                            t_nums = re.findall(r'\d+', transport.get("cost", ""))
-                            if t_nums: total_cost += int(t_nums[0])
+                        # Coordinate Check (see gazetteer.check_stop)
+                        if stop.get("geo") == "snapped":
+                            st.caption("📍 坐标已按已知地点校正 (Location corrected)")
+                        elif stop.get("geo") == "flagged":
+                            st.caption("⚠️ 坐标未能验证，请以实际为准 (Location unverified)")
+                
+                # --- Ticket Cart: every paid stop in one checkout (see checkout.py) ---
+                tickets = checkout.cart_items(st.session_state.route)
+                if tickets:
+                    tickets_total = pricing.format_cents(sum(cents for _, cents in tickets))
+                    if st.button(f"🎟️ 预订全部门票 ({len(tickets)} 张 · {tickets_total})", key="checkout", use_container_width=True):
+                        try:
+                            checkout.checkout_url(get_stripe(), job_owner(), tickets, CHECKOUT_SUCCESS_URL, CHECKOUT_CANCEL_URL)
+                        except Exception as e:
+                            st.error(f"Payment Error: {str(e)}")
+                            st.info("Please check if STRIPE_API_KEY is set in .env")
+                    
+                    # Only a live session for exactly these tickets, so a changed route never shows a stale link
+                    pay_url = checkout.cached_url(job_owner(), tickets)
+                    if pay_url:
+                        # Check for Test Mode
+                        is_test = os.getenv("STRIPE_API_KEY", "").startswith("sk_test_")
+                        btn_label = "💳 点击前往支付 (Stripe - 沙盒测试)" if is_test else "💳 点击前往支付 (Stripe)"
+                        st.link_button(btn_label, pay_url, use_container_width=True)
+                        if is_test:
+                            st.caption("⚠️ 当前为沙盒模式，不会产生实际扣款")
                 
+                totals = st.session_state.route_totals
                 st.markdown("---")
-                st.metric("💰 预计总花费", f"SGD ${total_cost}")
-                st.caption("*包含门票预估费用")
+                st.metric("💰 预计总花费", pricing.format_cents(totals["total_cents"], totals["currency"]))
+                st.caption(f"*门票 {pricing.format_cents(totals['tickets_cents'])} + 交通 {pricing.format_cents(totals['transport_cents'])}"
+                           + (f"，{totals['unpriced']} 个景点价格待定" if totals["unpriced"] else ""))
                 
                 # SAVE TO COMMUNITY BUTTON
                 if st.session_state.user:
@@ -730,8 +1005,10 @@ def main():
                             st.session_state.mood, 
                             st.session_state.start_loc_name, 
                             st.session_state.route,
-                            st.session_state.route_summary
+                            st.session_state.route_summary,
+                            totals
                         )
+                        st.session_state.feed_plans = None # Show the new plan in the feed
                         st.toast("✅ 行程已保存到社区！")
                         time.sleep(1)
                 else:
@@ -743,141 +1020,73 @@ def main():
     # --- Tab 2: Community Feed ---
     with tab_comm:
         st.subheader("🌍 社区灵感 (Community Plans)")
-        plans = database.get_all_plans()
         
-        if not plans:
-            st.info("暂无分享，快来成为第一个分享者吧！")
+        # Search & Filters
+        f_query = st.text_input("🔍 搜索 (Search plans)", key="feed_query",
+                                placeholder="地点、心情、评价… e.g. 夜景, Chinatown")
+        c_f_mood, c_f_start, c_f_refresh = st.columns([2, 2, 1])
+        with c_f_mood:
+            f_mood = st.selectbox("🎭 心情筛选", ["全部 (All)"] + MOODS, key="feed_mood")
+        with c_f_start:
+            f_start = st.selectbox("🚩 出发地筛选", ["全部 (All)"] + list(START_LOCATIONS.keys()), key="feed_start")
+        with c_f_refresh:
+            st.write("")
+            if st.button("🔄 刷新", key="feed_refresh"):
+                st.session_state.feed_plans = None
         
-        for p in plans:
-            with st.container(border=True):
-                # Header: User & Mood
-                c_user, c_mood, c_date = st.columns([2, 2, 2])
-                with c_user:
-                    st.markdown(f"**👤 {p['username']}**")
-                with c_mood:
-                    st.markdown(f"🎭 {p['mood']}")
-                with c_date:
-                    st.caption(f"📅 {p['created_at']}")
-                
-                st.markdown(f"**🚩 出发地:** {p['start_loc']}")
-                
-                # Summary if available
-                if p.get("summary"):
-                    st.caption(f"✨ {p['summary']}")
-                
-                # Review Display
-                if p.get("review_text"):
-                    st.markdown("---")
-                    st.markdown("#### 📝 旅后感 (Post-Trip Review)")
-                    
-                    # Rating
-                    stars = "⭐" * (p['rating'] or 0)
-                    st.markdown(f"**评分:** {stars}")
-                    
-                    # Mood Change
-                    if p.get("post_mood"):
-                        st.write(f"🎭 **心情变化:** {p['mood']} ➡️ **{p['post_mood']}**")
-                    
-                    # Comment
-                    st.info(f"🗣️ \"{p['review_text']}\"")
-                    st.markdown("---")
-
-                # Route Summary
-                route = p['route']
-                stops = [stop['name'] for stop in route]
-                st.markdown(f"**📍 路线 ({len(stops)} stops):**")
-                
-                # Horizontal Steps (Styled to avoid black background)
-                steps_html = " <span style='color:#ccc'>→</span> ".join(stops)
-                st.markdown(f"""
-                <div style="
-                    background-color: #f0f2f6; 
-                    padding: 10px; 
-                    border-radius: 8px; 
-                    color: #4a69bd; 
-                    font-weight: 600; 
-                    font-size: 0.9rem;
-                    border: 1px solid #d1d5db;
-                ">
-                    {steps_html}
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Load Button (Optional - could load into main view)
-                c_load, c_meetup, c_review = st.columns([1, 1, 1])
-                with c_load:
-                    if st.button("👀 查看详情 (Load this Plan)", key=f"load_{p['id']}"):
-                        st.session_state.route = route
-                        st.session_state.mood = p['mood']
-                        st.session_state.start_loc_name = p['start_loc']
-                        st.session_state.route_summary = p.get("summary", "")
-                        st.toast(f"已加载 {p['username']} 的行程！请切换到'行程规划'标签页查看地图。")
-                
-                with c_meetup:
-                    if st.session_state.user:
-                        with st.popover("📅 发起同游 (Schedule Meetup)"):
-                            st.write("设置出发时间，邀请其他人加入！")
-                            meetup_time = st.text_input("出发时间 (e.g. 明天上午10点)", key=f"time_{p['id']}")
-                            if st.button("确认发起", key=f"confirm_{p['id']}"):
-                                if meetup_time:
-                                    database.create_meetup(p['id'], st.session_state.user[0], st.session_state.user[1], meetup_time)
-                                    st.success("发起成功！请前往 '结伴同游' 标签页查看。")
-                                else:
-                                    st.error("请输入时间")
-                    else:
-                        st.caption("登录后可发起同游")
-                
-                with c_review:
-                    # Allow owner to add/edit review
-                    if st.session_state.user and st.session_state.user[1] == p['username']:
-                        with st.popover("📝 写评价 (Review)"):
-                            st.write("旅程结束了吗？分享你的感受！")
-                            new_post_mood = st.select_slider("🎭 旅后心情 (Post-Trip Mood)", 
-                                                           options=["Chill (休闲)", "Energetic (活力)", "Foodie (美食)", "Melancholy (忧郁)", "Cultural (文化)", "Happy (开心)", "Tired (累但充实)"],
-                                                           key=f"pm_{p['id']}")
-                            new_rating = st.slider("⭐ 评分 (Rating)", 1, 5, 5, key=f"rt_{p['id']}")
-                            new_comment = st.text_area("✍️ 评价 (Comments)", key=f"cm_{p['id']}")
-                            
-                            if st.button("提交评价", key=f"sub_rev_{p['id']}"):
-                                database.add_review(p['id'], new_post_mood, new_comment, new_rating)
-                                st.success("评价已保存！")
-                                time.sleep(1)
-                                st.rerun()
+        feed_filters = {
+            "mood": None if f_mood == "全部 (All)" else f_mood,
+            "start_loc": None if f_start == "全部 (All)" else f_start,
+        }
+        with st.expander("📊 社区统计 (Community Stats)"):
+            c_s_rating, c_s_moods, c_s_places = st.columns(3)
+            with c_s_rating:
+                avg_rating, n_ratings = database.get_rating_stats(**feed_filters)
+                st.metric("⭐ 平均评分 (Avg rating)", f"{avg_rating:.1f}" if avg_rating else "–",
+                          help="按当前心情/出发地筛选 (Follows the filters above)")
+                st.caption(f"{n_ratings} 条评价")
+            with c_s_moods:
+                st.markdown("**🎭 心情变化 (Mood shifts)**")
+                for mood, post_mood, count in database.get_mood_transitions(feed_filters["mood"], limit=5):
+                    st.write(f"{mood or '?'} ➡️ {post_mood} · {count}")
+            with c_s_places:
+                st.markdown("**📍 热门地点 (Popular stops)**")
+                for place, uses in database.get_popular_places(limit=5):
+                    st.write(f"{place} · {uses}")
+        
+        with metrics.span("render.community_feed"):
+            if f_query.strip():
+                plans = database.search_plans(f_query, feed_filters, limit=FEED_WINDOW)
+                st.caption(f"找到 {len(plans)} 条相关分享" + (" (仅显示最相关的)" if len(plans) == FEED_WINDOW else ""))
+            else:
+                plans = feed_window("feed_plans", database.get_plans_page, **feed_filters)
+                if not plans:
+                    st.info("暂无分享，快来成为第一个分享者吧！")
+            
+            for p in plans:
+                plan_card(p)
+            
+            if not f_query.strip():
+                feed_nav("feed_plans", database.get_plans_page)
 
     # --- Tab 3: Meetups ---
     with tab_meetup:
-        st.subheader("🤝 结伴同游 (Join a Walking Group)")
-        meetups = database.get_all_meetups()
-        
-        if not meetups:
-            st.info("暂无同游计划，去 '社区分享' 发起一个吧！")
+        c_m_title, c_m_refresh = st.columns([4, 1])
+        with c_m_title:
+            st.subheader("🤝 结伴同游 (Join a Walking Group)")
+        with c_m_refresh:
+            if st.button("🔄 刷新", key="meetups_refresh"):
+                st.session_state.feed_meetups = None
+        with metrics.span("render.meetups_feed"):
+            meetups = feed_window("feed_meetups", database.get_meetups_page)
+            
+            if not meetups:
+                st.info("暂无同游计划，去 '社区分享' 发起一个吧！")
+            
+            for m in meetups:
+                meetup_card(m)
         
-        for m in meetups:
-            with st.container(border=True):
-                c_info, c_action = st.columns([3, 1])
-                
-                with c_info:
-                    st.markdown(f"#### 🚩 {m['host_name']} 发起的漫步")
-                    st.caption(f"🕒 时间: **{m['meetup_time']}**")
-                    st.write(f"📍 路线: {m['start_loc']} ({m['mood']})")
-                    if m.get("summary"):
-                        st.info(f"✨ {m['summary']}")
-                    
-                    # Participants
-                    parts = m['participants']
-                    st.write(f"👥 已加入 ({len(parts)}人): {', '.join(parts)}")
-                
-                with c_action:
-                    if st.session_state.user:
-                        username = st.session_state.user[1]
-                        if username in m['participants']:
-                            st.success("✅ 已加入")
-                        else:
-                            if st.button("👋 加入 (Join)", key=f"join_{m['id']}"):
-                                database.join_meetup(m['id'], username)
-                                st.rerun()
-                    else:
-                        st.caption("登录后加入")
+        feed_nav("feed_meetups", database.get_meetups_page)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""Stripe round trips and wait per itinerary: a session per stop vs one cart session.
+
+"Per stop" is how tickets used to be booked: every click on a stop's
+booking button created a new single-item Checkout session. "Cart" is
+checkout.checkout_url: one session with a line item per paid stop,
+created once per (owner, cart) under an idempotency key and reused after
+that. Each itinerary is a random 3-5 stop route with some free stops, and
+every booking button is clicked --clicks times (double clicks, coming back
+to the page). Both run against the local Stripe stand-in.
+
+    python -m benchmarks.bench_checkout --itineraries 200 --clicks 2 --stripe 0.4,0.3 --out checkout.json
+"""
+import argparse
+import random
+import time
+
+import stripe
+
+import checkout
+import pricing
+from benchmarks import standins
+from benchmarks.report import header, summarize, write_json
+from constants import TICKET_PRICES
+
+FREE_STOPS = ["Maxwell Food Centre", "Fort Canning Park", "Haji Lane", "Merlion Park", "Henderson Waves"]
+SUCCESS_URL = "http://localhost:8501/?success=true&session_id={CHECKOUT_SESSION_ID}"
+CANCEL_URL = "http://localhost:8501/?canceled=true"
+
+
+def make_itineraries(n, rng):
+    itineraries = []
+    for _ in range(n):
+        names = rng.sample(list(TICKET_PRICES), rng.randint(1, 3)) + rng.sample(FREE_STOPS, rng.randint(1, 2))
+        rng.shuffle(names)
+        stops = [{"name": name, "price": TICKET_PRICES.get(name, "Free")} for name in names[:5]]
+        itineraries.append(pricing.price_route(stops))
+    return itineraries
+
+
+def per_stop(owner, stops, clicks):
+    """The old per-stop button handler, clicked `clicks` times per paid stop."""
+    for stop in stops:
+        if not (stop.get("price_cents") and stop.get("currency") == pricing.CURRENCY):
+            continue
+        for _ in range(clicks):
+            stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=[{
+                    "price_data": {"currency": "sgd", "product_data": {"name": f"Ticket for {stop['name']}"},
+                                   "unit_amount": stop["price_cents"]},
+                    "quantity": 1,
+                }],
+                mode="payment",
+                success_url="http://localhost:8501/?success=true",
+                cancel_url="http://localhost:8501/?canceled=true",
+            )
+
+
+def cart(owner, stops, clicks):
+    items = checkout.cart_items(stops)
+    if items:
+        for _ in range(clicks):
+            checkout.checkout_url(stripe, owner, items, SUCCESS_URL, CANCEL_URL)
+
+
+PHASES = {"per_stop": per_stop, "cart": cart}
+
+
+def run(args):
+    itineraries = make_itineraries(args.itineraries, random.Random(args.seed))
+    profile = standins.Profile.parse(args.stripe, seed=args.seed)
+    results = {}
+    with standins.StandIns(stripe=profile, seed=args.seed) as apis:
+        stripe.api_base = apis.stripe_api_base
+        stripe.api_key = "sk_test_bench"
+        for phase, book in PHASES.items():
+            before = dict(apis.stats)
+            waits = []
+            for i, stops in enumerate(itineraries):
+                t = time.perf_counter()
+                book(f"user:{i}", stops, args.clicks)
+                waits.append(time.perf_counter() - t)
+            used = {k: apis.stats[k] - before[k] for k in ("stripe_requests", "checkout_sessions", "idempotent_replays")}
+            results[phase] = {
+                "wait": summarize(waits),
+                **used,
+                "requests_per_itinerary": round(used["stripe_requests"] / len(itineraries), 2),
+                "sessions_per_itinerary": round(used["checkout_sessions"] / len(itineraries), 2),
+            }
+    paid = [len(checkout.cart_items(stops)) for stops in itineraries]
+    return {
+        **header("checkout"),
+        "config": {"itineraries": args.itineraries, "clicks": args.clicks, "seed": args.seed,
+                   "stripe": profile.describe(), "paid_stops_mean": round(sum(paid) / len(paid), 2)},
+        "phases": results,
+    }
+
+
+def print_report(result):
+    cfg = result["config"]
+    print(f"{cfg['itineraries']} itineraries, {cfg['paid_stops_mean']} paid stops each on average, "
+          f"{cfg['clicks']} clicks per button, Stripe {cfg['stripe']['median_s']}s\n")
+    print(f"{'phase':<10}{'requests':>10}{'per itin':>10}{'sessions':>10}{'per itin':>10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for phase, r in result["phases"].items():
+        wait = r["wait"]
+        print(f"{phase:<10}{r['stripe_requests']:>10}{r['requests_per_itinerary']:>10}{r['checkout_sessions']:>10}"
+              f"{r['sessions_per_itinerary']:>10}{wait['p50_ms']:>10.1f}{wait['p95_ms']:>10.1f}{wait['mean_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--itineraries", type=int, default=200)
+    parser.add_argument("--clicks", type=int, default=2, help="Clicks per booking button")
+    parser.add_argument("--stripe", default="0.4,0.3,0.0", help="Checkout create latency profile, see standins.Profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
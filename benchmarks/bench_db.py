@@ -0,0 +1,93 @@
+"""Microbenchmark for the feed and meetup queries in database.py.
+
+Compares the pooled connection layer against the old connect-per-call
+pattern on a throwaway database, so the bundled .db files are never touched.
+
+    python -m benchmarks.bench_db --plans 200 --meetups 50 --calls 500
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import database
+
+
+def seed(n_plans, n_meetups):
+    database.init_db()
+    database.register_user("bench", "bench")
+    user_id = database.login_user("bench", "bench")[0]
+    route = [
+        {"name": f"Stop {i}", "coords": [1.28 + i / 100, 103.85], "desc": "...", "price": "Free"}
+        for i in range(4)
+    ]
+    for i in range(n_plans):
+        database.save_plan(user_id, "bench", "Chill (休闲)", "Chinatown", route, f"Plan {i}")
+    with database.get_connection() as conn:
+        # Routes live in plan_stops now; the legacy readers below still decode a blob per plan
+        conn.execute("UPDATE plans SET route_json = ?", (json.dumps(route),))
+    for i in range(n_meetups):
+        database.create_meetup(i + 1, user_id, "bench", "明天上午10点")
+
+
+# --- "Before": a fresh connection per call, as database.py used to do ---
+
+def legacy_get_all_plans():
+    conn = sqlite3.connect(database.DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT id, username, mood, start_loc, route_json, summary, created_at, post_mood, review_text, rating FROM plans ORDER BY created_at DESC")
+    rows = c.fetchall()
+    conn.close()
+    return [json.loads(r[4]) for r in rows]
+
+
+def legacy_get_all_meetups():
+    conn = sqlite3.connect(database.DB_NAME)
+    c = conn.cursor()
+    c.execute('''
+        SELECT m.id, m.host_name, m.meetup_time, m.participants, m.created_at,
+               p.mood, p.start_loc, p.route_json, p.summary
+        FROM meetups m
+        JOIN plans p ON m.plan_id = p.id
+        ORDER BY m.created_at DESC
+    ''')
+    rows = c.fetchall()
+    conn.close()
+    return [(json.loads(r[3] or "[]"), json.loads(r[7])) for r in rows]
+
+
+def timeit(fn, calls):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6  # µs per call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--meetups", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        seed(args.plans, args.meetups)
+
+        cases = [
+            ("feed (get_all_plans)", legacy_get_all_plans, database.get_all_plans),
+            ("meetups (get_all_meetups)", legacy_get_all_meetups, database.get_all_meetups),
+        ]
+        print(f"{'query':<28}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+        for label, before, after in cases:
+            t_before = timeit(before, args.calls)
+            t_after = timeit(after, args.calls)
+            print(f"{label:<28}{t_before:>12.1f}{t_after:>12.1f}{t_before / t_after:>9.2f}x")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Throughput and latency of database.py's main calls as the data grows.
+
+A throwaway database is filled with synthetic data to each --scales size
+in turn: that many users and plans (3-5 stop routes with prices, travel
+legs and Chinese descriptions; about a quarter reviewed), and one meetup
+per 100 plans with heavy-tailed participant lists (a few with thousands).
+At every size it times:
+
+  register_user, login_user, save_plan, join_meetup
+      --ops calls each, from a single writer and from --writers threads
+  get_all_plans, get_all_meetups
+      --scan-calls full reads, single threaded
+
+and records the database size (main file plus WAL, after a checkpoint).
+
+    python -m benchmarks.bench_db_scale --scales 1000 100000 --out db_scale.json
+    python -m benchmarks.bench_db_scale --scales 1000 100000 1000000 --full-scan-limit 1000000
+
+get_all_plans builds every route of every plan in memory, a few GB at a
+million plans, so it is skipped above --full-scan-limit plans.
+Seeding a million plans takes around a quarter of an hour.
+"""
+import argparse
+import array
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database
+import pricing
+from benchmarks.report import header, summarize, write_json
+from benchmarks.standins import place_pool
+from constants import MOODS, START_LOCATIONS, TICKET_PRICES
+
+POINT_OPS = ("register_user", "login_user", "save_plan", "join_meetup")
+SCANS = ("get_all_plans", "get_all_meetups")
+SEED_BATCH = 20000
+PLANS_PER_MEETUP = 100
+REVIEW_SHARE = 0.25
+MAX_PARTICIPANTS = 5000
+
+DESCS = ["适合慢慢散步，感受城市的节奏。", "当地人最爱的去处，傍晚人最多。", "拍照打卡的好地方，记得带相机。",
+         "安静的角落，可以坐下来喝杯咖啡。", "历史悠久，值得花时间细细品味。", "Great views at sunset, bring water."]
+SUMMARIES = ["轻松悠闲的半日漫步", "探索新加坡的独特文化", "在自然与文化遗产中漫步", "品尝地道美食的一天",
+             "欣赏滨海湾夜景", "适合周末和朋友一起", "A relaxed afternoon around the bay"]
+REVIEWS = ["夜景太美了，下次还来", "Amazing food, would go again", "有点累但很充实", "Too crowded on weekends",
+           "值得一去", "路线安排很合理，时间刚好"]
+PRICES = ["Free", "Free", "SGD $8", "SGD $15", "SGD $12-18", "Check On-site"]
+LEGS = [("步行", 5, 15, None), ("MRT", 10, 25, (1.2, 2.5)), ("Bus", 10, 30, (1.0, 2.0)), ("Taxi", 8, 20, (8, 25))]
+MEETUP_TIMES = ["明天上午10点", "周六下午2点", "This Sunday 9am", "下周五晚上7点"]
+
+
+def password(i):
+    return f"pw-{i}"
+
+
+def make_route(rng, places):
+    stops = []
+    for i, (name, coords) in enumerate(rng.sample(places, rng.randint(3, 5))):
+        leg = None
+        if i:
+            method, low, high, fare = rng.choice(LEGS)
+            leg = {"method": method, "duration": f"{rng.randint(low, high)} mins",
+                   "cost": f"SGD ${rng.uniform(*fare):.2f}" if fare else "Free"}
+        stops.append({"name": name, "coords": list(coords), "desc": rng.choice(DESCS),
+                      "price": TICKET_PRICES.get(name) or rng.choice(PRICES), "transport_from_prev": leg})
+    return pricing.price_route(stops)
+
+
+def timestamp(rng, now):
+    return (now - timedelta(seconds=rng.randrange(365 * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Dataset:
+    """Grows one database and remembers what is in it, so the timed calls
+    can pick existing users, plans and meetups."""
+
+    def __init__(self, rng, places):
+        self.rng = rng
+        self.places = places
+        self.user_ids = array.array("q") # Seeded user i is named user{i:07d} and has id user_ids[i - 1]
+        self.plans = 0
+        self.meetups = 0
+        self.now = datetime.utcnow()
+
+    def grow(self, scale):
+        """Seed users and plans up to `scale` rows each and meetups to match."""
+        rng = self.rng
+        while self.users < scale:
+            batch = range(self.users + 1, min(self.users + SEED_BATCH, scale) + 1)
+            rows = [(f"user{i:07d}", hashlib.sha256(password(i).encode()).hexdigest()) for i in batch]
+            with database.get_connection() as conn:
+                first = conn.execute("SELECT ifnull(max(id), 0) + 1 FROM users").fetchone()[0]
+                conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)", rows)
+            self.user_ids.extend(range(first, first + len(rows)))
+        while self.plans < scale:
+            count = min(SEED_BATCH, scale - self.plans)
+            rows = []
+            for _ in range(count):
+                i = rng.randint(1, self.users)
+                route = make_route(rng, self.places)
+                totals = pricing.route_totals(route)
+                reviewed = rng.random() < REVIEW_SHARE
+                rows.append((self.user_ids[i - 1], f"user{i:07d}", rng.choice(MOODS), rng.choice(list(START_LOCATIONS)),
+                             json.dumps(route, ensure_ascii=False), "这是一段" + "，".join(rng.sample(SUMMARIES, 2)) + "。",
+                             rng.choice(MOODS) if reviewed else None, rng.choice(REVIEWS) if reviewed else None,
+                             rng.randint(1, 5) if reviewed else None, timestamp(rng, self.now),
+                             totals["total_cents"], totals["currency"]))
+            with database.get_connection() as conn:
+                conn.executemany('''
+                    INSERT INTO plans (user_id, username, mood, start_loc, route_json, summary, post_mood, review_text,
+                                       rating, created_at, total_cents, currency)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            database.import_route_blobs()
+            self.plans += count
+        target = max(scale // PLANS_PER_MEETUP, 1)
+        while self.meetups < target:
+            with database.get_connection() as conn:
+                for _ in range(min(SEED_BATCH // 10, target - self.meetups)):
+                    host = rng.randint(1, self.users)
+                    created = timestamp(rng, self.now)
+                    meetup_id = conn.execute(
+                        "INSERT INTO meetups (plan_id, host_id, host_name, meetup_time, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (rng.randint(1, self.plans), self.user_ids[host - 1], f"user{host:07d}",
+                         rng.choice(MEETUP_TIMES), created)).lastrowid
+                    # Lognormal sizes: median ~30, a long tail up to MAX_PARTICIPANTS
+                    size = min(int(30 * math.exp(rng.gauss(0, 1.5))) + 1, self.users, MAX_PARTICIPANTS)
+                    members = {self.user_ids[host - 1], *rng.sample(self.user_ids, size)}
+                    conn.executemany("INSERT OR IGNORE INTO meetup_participants (meetup_id, user_id, joined_at) VALUES (?, ?, ?)",
+                                     [(meetup_id, user_id, created) for user_id in members])
+                    self.meetups += 1
+
+    @property
+    def users(self):
+        return len(self.user_ids)
+
+    def counts(self):
+        with database.get_connection() as conn:
+            return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("users", "plans", "plan_stops", "places", "meetups", "meetup_participants")}
+
+
+def size_bytes():
+    with database.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sum(os.path.getsize(path) for path in (database.DB_NAME, database.DB_NAME + "-wal") if os.path.exists(path))
+
+
+def make_calls(op, data, scale, count, rng, tag):
+    """`count` zero-argument calls of `op` against the current dataset."""
+    if op == "register_user":
+        return [lambda i=i: database.register_user(f"new-{scale}-{tag}-{i}", password(i)) for i in range(count)]
+    if op == "login_user":
+        picks = [rng.randint(1, data.users) for _ in range(count)]
+        return [lambda i=i: database.login_user(f"user{i:07d}", password(i)) for i in picks]
+    if op == "save_plan":
+        calls = []
+        for _ in range(count):
+            i = rng.randint(1, data.users)
+            route, mood, summary = make_route(rng, data.places), rng.choice(MOODS), rng.choice(SUMMARIES)
+            calls.append(lambda i=i, r=route, m=mood, s=summary: database.save_plan(
+                data.user_ids[i - 1], f"user{i:07d}", m, "Chinatown", r, s, pricing.route_totals(r)))
+        return calls
+    if op == "join_meetup":
+        # Skewed towards the oldest meetups, so some lists keep growing
+        picks = [(min(int(rng.expovariate(1 / 20)) + 1, data.meetups), rng.randint(1, data.users)) for _ in range(count)]
+        return [lambda m=m, u=u: database.join_meetup(m, f"user{u:07d}") for m, u in picks]
+    raise ValueError(op)
+
+
+def timed(calls, writers):
+    """Run `calls` on `writers` threads; (latencies, errors, wall seconds)."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    chunks = [calls[i::writers] for i in range(writers)]
+
+    def work(chunk):
+        mine, failed = [], 0
+        for call in chunk:
+            t = time.perf_counter()
+            try:
+                call()
+                mine.append(time.perf_counter() - t)
+            except sqlite3.OperationalError:
+                failed += 1 # "database is locked" once busy_timeout runs out
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(chunk,)) for chunk in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors), time.perf_counter() - started
+
+
+def measure(data, scale, args, rng):
+    results = {}
+    for op in POINT_OPS:
+        for mode, writers in (("single", 1), (f"{args.writers} writers", args.writers)):
+            latencies, errors, wall = timed(make_calls(op, data, scale, args.ops, rng, writers), writers)
+            results[f"{op} ({mode})"] = {**summarize(latencies, errors), "ops_per_s": round(len(latencies) / wall, 1)}
+    for op in SCANS:
+        if op == "get_all_plans" and data.plans > args.full_scan_limit:
+            results[op] = {"skipped": f"more than --full-scan-limit {args.full_scan_limit} plans"}
+            continue
+        fn, latencies, rows = getattr(database, op), [], 0
+        for _ in range(args.scan_calls):
+            t = time.perf_counter()
+            rows = len(fn())
+            latencies.append(time.perf_counter() - t)
+        results[op] = {**summarize(latencies), "ops_per_s": round(len(latencies) / sum(latencies), 2), "rows": rows}
+    return results
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    scales = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+        data = Dataset(rng, place_pool(args.places, args.seed))
+        for scale in sorted(args.scales):
+            t = time.perf_counter()
+            data.grow(scale)
+            seed_seconds = time.perf_counter() - t
+            print(f"seeded {scale} rows in {seed_seconds:.1f} s", flush=True)
+            size = size_bytes()
+            scales.append({"scale": scale, "seed_seconds": round(seed_seconds, 1), "db_bytes": size,
+                           "rows": data.counts(), "ops": measure(data, scale, args, rng)})
+        database.close_connections()
+    return {
+        **header("db_scale"),
+        "config": {"scales": sorted(args.scales), "ops": args.ops, "writers": args.writers,
+                   "scan_calls": args.scan_calls, "full_scan_limit": args.full_scan_limit,
+                   "places": args.places, "seed": args.seed},
+        "scales": scales,
+    }
+
+
+def print_report(result):
+    for entry in result["scales"]:
+        rows = entry["rows"]
+        print(f"\n== {entry['scale']:,} rows: {rows['users']:,} users, {rows['plans']:,} plans "
+              f"({rows['plan_stops']:,} stops, {rows['places']:,} places), {rows['meetups']:,} meetups "
+              f"({rows['meetup_participants']:,} participants) · {entry['db_bytes'] / 2**20:,.1f} MB · "
+              f"seeded in {entry['seed_seconds']:.1f} s")
+        print(f"{'operation':<30}{'ops/s':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for op, s in entry["ops"].items():
+            if "skipped" in s:
+                print(f"{op:<30}  skipped: {s['skipped']}")
+            elif s["count"]:
+                print(f"{op:<30}{s['ops_per_s']:>10.1f}{s['errors']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                      f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+            else:
+                print(f"{op:<30}{'-':>10}{s['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 100000], help="Rows per table at each step")
+    parser.add_argument("--ops", type=int, default=400, help="Calls per point operation and mode")
+    parser.add_argument("--writers", type=int, default=8, help="Threads in the concurrent runs")
+    parser.add_argument("--scan-calls", type=int, default=3)
+    parser.add_argument("--full-scan-limit", type=int, default=200000, help="Skip get_all_plans above this many plans")
+    parser.add_argument("--places", type=int, default=2000, help="Distinct places routes are drawn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Rerun time of the Community tab: one card, one window, everything loaded.
+
+Plan cards are rendered through app.plan_card() under Streamlit's AppTest on
+a throwaway database. "1 card" is what a fragment rerun (review, meetup) costs,
+"window" what a full rerun costs now, and "all loaded" what it cost when every
+page loaded with "load more" was rendered on each rerun.
+
+    python -m benchmarks.bench_feed_render --plans 1000 10000 --loaded 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(n_plans):
+    database.init_db()
+    database.register_user("bench", "bench")
+    user_id = database.login_user("bench", "bench")[0]
+    route = json.dumps([
+        {"name": f"Stop {i}", "coords": [1.28 + i / 100, 103.85], "desc": "...", "price": "Free"}
+        for i in range(4)
+    ])
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO plans (user_id, username, mood, start_loc, route_json, summary) VALUES (?, ?, ?, ?, ?, ?)",
+            [(user_id, "bench", "Chill (休闲)", "Chinatown", route, f"Plan {i}") for i in range(n_plans)])
+    database.import_route_blobs()
+
+
+def render_cards(repo_root, db_name, n_cards):
+    # AppTest script: runs on its own, so it does its own imports
+    import sys
+    sys.path.insert(0, repo_root)
+    import streamlit as st
+    import app
+    import database
+
+    database.DB_NAME = db_name
+    if "cards" not in st.session_state:
+        cards, cursor = database.get_plans_page()
+        while cursor and len(cards) < n_cards:
+            more, cursor = database.get_plans_page(cursor)
+            cards += more
+        st.session_state.cards = cards[:n_cards]
+        st.session_state.user = database.login_user("bench", "bench") # Owner: review popover too
+    for p in st.session_state.cards:
+        app.plan_card(p)
+
+
+def rerun_ms(n_cards, runs):
+    at = AppTest.from_function(render_cards, args=(REPO_ROOT, database.DB_NAME, n_cards), default_timeout=120)
+    at.run() # Imports the app and loads the feed
+    if at.exception:
+        sys.exit(at.exception[0].value)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--loaded", type=int, default=200, help="Cards loaded by paging before the rerun")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'plans':>7}{'1 card ms':>11}{'window ms':>11}{'all loaded ms':>15}")
+    for n_plans in args.plans:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_NAME = os.path.join(tmp, "bench.db")
+            seed(n_plans)
+            one = rerun_ms(1, args.runs)
+            window = rerun_ms(database.FEED_PAGE_SIZE, args.runs)
+            loaded = rerun_ms(min(args.loaded, n_plans), args.runs)
+            print(f"{n_plans:>7}{one:>11.1f}{window:>11.1f}{loaded:>15.1f}")
+            database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
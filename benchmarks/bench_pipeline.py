@@ -0,0 +1,185 @@
+"""End-to-end latency of route requests against local OpenAI/Unsplash stand-ins.
+
+Each request runs the app's own pipeline: generate_ai_route (completion,
+coordinate checks, travel legs, pricing), fetch_images_parallel on the
+shared images executor, and building and rendering the folium map. Requests
+vary start location, mood and duration, and run --concurrency at a time
+on a throwaway database. Latency profiles are "median[,spread[,error_rate]]"
+in seconds, see standins.Profile.
+
+    python -m benchmarks.bench_pipeline --requests 200 --concurrency 8 --llm 1.5,0.3,0.02 --out pipeline.json
+    python -m benchmarks.bench_pipeline --requests 200 --concurrency 8 --llm 1.5,0.3,0.02 --baseline pipeline.json
+
+With --baseline, stage percentiles and throughput are compared with an
+earlier --out file; anything worse by more than --tolerance is reported as
+a regression and the exit status is 1. p99 is only meaningful with a few
+hundred requests; with fewer it is close to the single slowest one.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit.logger
+
+from benchmarks import standins
+from benchmarks.report import PERCENTILES, header, summarize, write_json
+
+STAGES = ("generate", "images", "map", "total")
+
+
+def run_request(app, images, rng_seed, use_route_cache):
+    """One request through the pipeline; returns ({stage: seconds}, failed stage or None)."""
+    from constants import MOODS, START_LOCATIONS
+
+    rng = random.Random(rng_seed)
+    start_loc = rng.choice(list(START_LOCATIONS))
+    mood = rng.choice(MOODS)
+    duration = rng.choice([1.5, 2.0, 2.5, 3.0, 4.0])
+    times = {}
+
+    started = time.perf_counter()
+    stops, _ = app.generate_ai_route(start_loc, START_LOCATIONS[start_loc], mood, duration, False, "",
+                                     fresh=not use_route_cache)
+    times["generate"] = time.perf_counter() - started
+    if not stops:
+        return times, "generate"
+
+    t = time.perf_counter()
+    images.fetch_images_parallel(stops)
+    times["images"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    color = app.get_route_color(mood)
+    # The undecorated builder (it renders the map too): every request is a
+    # new route, so this is the cache-miss cost
+    app.build_route_map.__wrapped__(app.map_fingerprint(stops, color, None), stops, color, None)
+    times["map"] = time.perf_counter() - t
+
+    times["total"] = time.perf_counter() - started
+    return times, None
+
+
+def run(args):
+    chat = standins.Profile.parse(args.llm, seed=args.seed)
+    image_profile = standins.Profile.parse(args.images, seed=args.seed + 1)
+    with standins.StandIns(chat=chat, images=image_profile, places=args.places, seed=args.seed) as apis, \
+            tempfile.TemporaryDirectory() as tmp:
+        # The app reads these at import time
+        os.environ["OPENAI_BASE_URL"] = apis.openai_base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        os.environ["UNSPLASH_ACCESS_KEY"] = "bench"
+        import database
+        import images
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        images.UNSPLASH_SEARCH_URL = apis.unsplash_search_url
+        streamlit.logger.set_log_level("error") # No session here, so every st.* call would warn
+        import app
+        app.init_database()
+
+        samples = {stage: [] for stage in STAGES}
+        errors = dict.fromkeys(STAGES, 0)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for times, failed in pool.map(lambda i: run_request(app, images, args.seed * 100003 + i, args.route_cache),
+                                          range(args.requests)):
+                for stage, seconds in times.items():
+                    samples[stage].append(seconds)
+                if failed:
+                    errors[failed] += 1
+                    errors["total"] += 1
+        wall = time.perf_counter() - started
+        upstream = dict(apis.stats)
+        image_cache = images.cache_stats()
+        database.close_connections()
+
+    ok = args.requests - errors["total"]
+    return {
+        **header("pipeline"),
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "places": args.places,
+                   "route_cache": args.route_cache, "seed": args.seed,
+                   "llm": chat.describe(), "images": image_profile.describe()},
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 3),
+        "stages": {stage: summarize(samples[stage], errors[stage]) for stage in STAGES},
+        "upstream": upstream,
+        "image_cache": {k: round(v, 3) if isinstance(v, float) else v for k, v in image_cache.items()},
+    }
+
+
+def print_report(result):
+    cfg = result["config"]
+    print(f"{cfg['requests']} requests, concurrency {cfg['concurrency']}, "
+          f"LLM {cfg['llm']['median_s']}s/{cfg['llm']['error_rate']:.0%} errors, "
+          f"images {cfg['images']['median_s']}s/{cfg['images']['error_rate']:.0%} errors\n")
+    print(f"{'stage':<10}{'n':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in result["stages"].items():
+        if s["count"]:
+            print(f"{stage:<10}{s['count']:>6}{s['errors']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+                  f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    up, cache = result["upstream"], result["image_cache"]
+    print(f"\nthroughput {result['throughput_rps']:.2f} req/s over {result['wall_seconds']:.1f} s · "
+          f"upstream {up['chat_requests']} completions ({up['chat_errors']} failed), "
+          f"{up['image_requests']} image searches ({up['image_errors']} failed) · "
+          f"image cache hit ratio {cache['hit_ratio']:.0%}")
+
+
+def compare(result, baseline, tolerance):
+    """Print the change against `baseline`; returns the list of regressions."""
+    if result["config"] != baseline["config"]:
+        print("\nwarning: baseline was run with a different config, comparisons are rough")
+    print(f"\nvs baseline {baseline.get('git_rev') or '?'} ({baseline.get('timestamp')}):")
+    regressions = []
+    for stage, now in result["stages"].items():
+        before = baseline["stages"].get(stage, {})
+        for p in PERCENTILES:
+            key = f"p{p}_ms"
+            if key not in now or key not in before:
+                continue
+            change = now[key] / before[key] - 1 if before[key] else 0.0
+            # Sub-millisecond wobble isn't a regression however large in relative terms
+            flag = change > tolerance and now[key] - before[key] > 1.0
+            if flag:
+                regressions.append(f"{stage} {key}")
+            print(f"  {stage:<10}{key:<8}{before[key]:>10.1f} -> {now[key]:>10.1f}  {change:>+7.1%}{'  REGRESSION' if flag else ''}")
+    change = result["throughput_rps"] / baseline["throughput_rps"] - 1 if baseline["throughput_rps"] else 0.0
+    flag = change < -tolerance
+    if flag:
+        regressions.append("throughput")
+    print(f"  {'throughput':<18}{baseline['throughput_rps']:>10.2f} -> {result['throughput_rps']:>10.2f}  {change:>+7.1%}"
+          f"{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm", default="1.5,0.3,0.0", help="Completion latency profile")
+    parser.add_argument("--images", default="0.2,0.3,0.0", help="Unsplash search latency profile")
+    parser.add_argument("--places", type=int, default=50, help="Distinct places routes are drawn from")
+    parser.add_argument("--route-cache", action="store_true", help="Let repeated requests hit the route cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON from an earlier --out run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
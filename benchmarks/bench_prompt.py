@@ -0,0 +1,157 @@
+"""Prompt tokens and completion latency of route requests, before and after trimming.
+
+"Before" is the prompt generate_ai_route used to send: the whole
+TICKET_PRICES catalog and a long free-text schema in the user message.
+"After" is route_prompt: a constant system message with a compact schema
+and a short list of candidate attractions. Both are sent, one request at
+a time, to the local OpenAI stand-in for the same random mix of start
+locations, moods, durations, museum toggles and preferences.
+
+    python -m benchmarks.bench_prompt --requests 100 --prefill 0.05 --out prompt.json
+
+Token counts are the stand-in's estimate (see standins.estimate_tokens).
+The stand-in's latency is --llm plus --prefill seconds per 1000 prompt
+tokens, an assumed prefill cost; the real saving depends on the provider.
+"Shared prefix" is how many leading characters every request had in
+common, i.e. what provider prompt caching could reuse.
+"""
+import argparse
+import json
+import random
+import time
+
+from openai import OpenAI
+
+from benchmarks import standins
+from benchmarks.report import header, summarize, write_json
+from constants import MOODS, START_LOCATIONS, TICKET_PRICES
+import route_prompt
+
+PREFERENCES = ["", "", "", "我想吃鸡饭", "Quiet parks only", "适合带小孩", "想拍夜景", "少走路"]
+
+
+# --- "Before": the prompt as generate_ai_route used to build it ---
+
+LEGACY_SYSTEM_PROMPT = "You are a Singapore travel guide. Output valid JSON only."
+
+def legacy_user_prompt(start_loc, start_coords, mood, duration, include_museums, custom_pref):
+    museum_prompt = "Include at least one museum or heritage site." if include_museums else ""
+    custom_prompt = f"User Specific Preferences: {custom_pref}" if custom_pref else ""
+    prices_json = json.dumps(TICKET_PRICES)
+
+    return f"""
+    Plan a Singapore walking route.
+    Start: {start_loc} {start_coords}
+    Mood: {mood}
+    Duration: {duration} hours.
+    {museum_prompt}
+    {custom_prompt}
+
+    Reference Prices: {prices_json}
+
+    Return JSON with key "stops" (list of objects) and "summary":
+    - "stops": [
+        - "name": Place name
+        - "coords": [lat, lon] (Accurate GPS)
+        - "desc": Short engaging description in Chinese
+        - "price": "Free" or price from Reference Prices (e.g., "SGD $53"). Estimate if missing.
+        - "transport_from_prev": (Object, null for first stop) describing how to get here from the previous stop.
+            - "method": "Walk" / "Bus" / "MRT" / "Taxi" (in Chinese, e.g. 步行, 巴士, 地铁)
+            - "duration": e.g. "10 mins"
+            - "cost": e.g. "SGD $0" or "SGD $2.50"
+    ]
+    - "summary": One sentence summary of the experience/vibe in Chinese (e.g. "这是一趟充满历史感与美食的文化之旅").
+
+    Ensure 3-5 stops.
+    """
+
+
+VARIANTS = {
+    "before": (LEGACY_SYSTEM_PROMPT, legacy_user_prompt),
+    "after": (route_prompt.SYSTEM_PROMPT, route_prompt.build_user_prompt),
+}
+
+
+def make_requests(n, rng):
+    requests = []
+    for _ in range(n):
+        start_loc = rng.choice(list(START_LOCATIONS))
+        requests.append((start_loc, START_LOCATIONS[start_loc], rng.choice(MOODS), rng.choice([1.5, 2.0, 2.5, 3.0, 4.0]),
+                         rng.random() < 0.3, rng.choice(PREFERENCES)))
+    return requests
+
+
+def shared_prefix(texts):
+    first, last = min(texts), max(texts)
+    n = 0
+    while n < min(len(first), len(last)) and first[n] == last[n]:
+        n += 1
+    return n
+
+
+def run(args):
+    requests = make_requests(args.requests, random.Random(args.seed))
+    chat = standins.Profile.parse(args.llm, seed=args.seed)
+    results = {}
+    with standins.StandIns(chat=chat, seed=args.seed, prefill_per_token=args.prefill / 1000) as apis:
+        client = OpenAI(base_url=apis.openai_base_url, api_key="bench")
+        for variant, (system_prompt, build) in VARIANTS.items():
+            latencies, prompt_tokens, completion_tokens, texts, systems = [], [], [], [], set()
+            for request in requests:
+                messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": build(*request)}]
+                texts.append(system_prompt + "\n" + messages[1]["content"])
+                systems.add(messages[0]["content"])
+                t = time.perf_counter()
+                response = client.chat.completions.create(model="gpt-4o", messages=messages,
+                                                          response_format={"type": "json_object"})
+                latencies.append(time.perf_counter() - t)
+                prompt_tokens.append(response.usage.prompt_tokens)
+                completion_tokens.append(response.usage.completion_tokens)
+            results[variant] = {
+                "latency": summarize(latencies),
+                "prompt_tokens_mean": round(sum(prompt_tokens) / len(prompt_tokens), 1),
+                "prompt_tokens_max": max(prompt_tokens),
+                "completion_tokens_mean": round(sum(completion_tokens) / len(completion_tokens), 1),
+                "prompt_chars_mean": round(sum(map(len, texts)) / len(texts), 1),
+                "shared_prefix_chars": shared_prefix(texts),
+                "distinct_system_prompts": len(systems),
+            }
+    return {
+        **header("prompt"),
+        "config": {"requests": args.requests, "llm": chat.describe(), "prefill_s_per_1k_tokens": args.prefill,
+                   "seed": args.seed},
+        "variants": results,
+    }
+
+
+def print_report(result):
+    cfg = result["config"]
+    print(f"{cfg['requests']} requests per variant, LLM {cfg['llm']['median_s']}s + "
+          f"{cfg['prefill_s_per_1k_tokens']}s per 1k prompt tokens\n")
+    print(f"{'variant':<10}{'prompt tok':>12}{'max':>8}{'chars':>9}{'prefix':>9}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for variant, r in result["variants"].items():
+        lat = r["latency"]
+        print(f"{variant:<10}{r['prompt_tokens_mean']:>12.1f}{r['prompt_tokens_max']:>8}{r['prompt_chars_mean']:>9.0f}"
+              f"{r['shared_prefix_chars']:>9}{lat['p50_ms']:>10.1f}{lat['p95_ms']:>10.1f}{lat['mean_ms']:>10.1f}")
+    before, after = result["variants"]["before"], result["variants"]["after"]
+    print(f"\nprompt tokens {1 - after['prompt_tokens_mean'] / before['prompt_tokens_mean']:.0%} fewer, "
+          f"mean latency {1 - after['latency']['mean_ms'] / before['latency']['mean_ms']:.0%} lower")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--llm", default="0.5,0.0,0.0", help="Completion latency profile, see standins.Profile")
+    parser.add_argument("--prefill", type=float, default=0.05, help="Assumed seconds of latency per 1000 prompt tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
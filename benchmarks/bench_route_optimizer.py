@@ -0,0 +1,53 @@
+"""Benchmark for route_optimizer: path length and solve time vs. the given order.
+
+Stops are random points in central Singapore, taken in their original
+(unoptimized) order as the baseline, the way LLM output arrives.
+
+    python -m benchmarks.bench_route_optimizer --sizes 5 10 20 50 100 --trials 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+import route_optimizer
+
+ORIGIN = [1.2842, 103.8436] # Chinatown
+
+
+def random_points(rng, n):
+    return (rng.random((n, 2)) * [0.12, 0.20] + [1.26, 103.75]).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 50, 100])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'stops':>6}{'given km':>11}{'optimized km':>14}{'saved':>8}{'ms/solve':>10}{'insert µs':>11}")
+    for n in args.sizes:
+        given, optimized, solve_s, insert_s = [], [], [], []
+        for _ in range(args.trials):
+            points = random_points(rng, n)
+            dist = route_optimizer._augmented(points, ORIGIN)
+            given.append(route_optimizer.path_length(dist, list(range(n + 2))))
+
+            start = time.perf_counter()
+            order = route_optimizer.optimize_order(points, ORIGIN)
+            solve_s.append(time.perf_counter() - start)
+            optimized.append(route_optimizer.path_length(dist, [0] + [i + 1 for i in order] + [n + 1]))
+
+            new_point = random_points(rng, 1)[0]
+            start = time.perf_counter()
+            route_optimizer.cheapest_insertion([points[i] for i in order], new_point, ORIGIN)
+            insert_s.append(time.perf_counter() - start)
+
+        g, o = np.mean(given), np.mean(optimized)
+        print(f"{n:>6}{g:>11.1f}{o:>14.1f}{1 - o / g:>8.0%}{np.mean(solve_s) * 1e3:>10.2f}{np.mean(insert_s) * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark for database.search_plans (FTS5) on a synthetic community feed.
+
+Plans get random moods, start locations, stops and Chinese summaries, and a
+fraction of them a review, on a throwaway database.
+
+    python -m benchmarks.bench_search --plans 100000 --calls 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+from constants import MOODS, START_LOCATIONS, TICKET_PRICES
+
+SUMMARY_PARTS = ["轻松悠闲的旅程", "探索新加坡的独特文化", "享受宁静时光", "品尝地道美食", "欣赏滨海湾夜景",
+                 "在自然与文化遗产中漫步", "充满活力的一天", "适合拍照打卡"]
+REVIEWS = ["夜景太美了", "Amazing food, would go again", "有点累但很充实", "Too crowded on weekends", "值得一去"]
+QUERIES = [
+    ("rare place", "Bird Paradise"),
+    ("prefix", "garden"),
+    ("chinese 2 chars", "美食"),
+    ("chinese phrase", "滨海湾夜景"),
+    ("review word", "crowded"),
+    ("very common", "旅程"),
+]
+
+
+def seed(n_plans, rng):
+    database.init_db()
+    database.register_user("bench", "bench")
+    user_id = database.login_user("bench", "bench")[0]
+    places = list(TICKET_PRICES) + list(START_LOCATIONS)
+    rows = []
+    for i in range(n_plans):
+        route = [{"name": name, "coords": [1.3, 103.8], "desc": "...", "price": "Free"}
+                 for name in rng.sample(places, 4)]
+        summary = "这是一个" + "，".join(rng.sample(SUMMARY_PARTS, 2)) + "。"
+        review = rng.choice(REVIEWS) if rng.random() < 0.2 else None
+        rows.append((user_id, "bench", rng.choice(MOODS), rng.choice(list(START_LOCATIONS)),
+                     json.dumps(route, ensure_ascii=False), summary, review))
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO plans (user_id, username, mood, start_loc, route_json, summary, review_text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows)
+    database.import_route_blobs()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        seed(args.plans, rng)
+        print(f"Seeded {args.plans} plans in {time.perf_counter() - start:.1f} s")
+        # Bulk inserts are only queued for indexing; the first search flushes the queue
+        start = time.perf_counter()
+        database.search_plans("warm up")
+        print(f"Indexed them on the first search in {time.perf_counter() - start:.1f} s\n")
+
+        cases = [(label, q, None) for label, q in QUERIES]
+        cases.append(("common + mood filter", "旅程", {"mood": MOODS[0]}))
+        print(f"{'query':<24}{'hits':>6}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, query, filters in cases:
+            hits = len(database.search_plans(query, filters))
+            times = []
+            for _ in range(args.calls):
+                t = time.perf_counter()
+                database.search_plans(query, filters)
+                times.append((time.perf_counter() - t) * 1000)
+            times.sort()
+            print(f"{label:<24}{hits:>6}{statistics.median(times):>9.2f}{times[int(len(times) * 0.95) - 1]:>9.2f}")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
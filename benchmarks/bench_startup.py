@@ -0,0 +1,172 @@
+"""Cold start and per-rerun script time of app.py, per tab.
+
+"import" is `import app` in a fresh interpreter that already has Streamlit
+loaded: the module-level work every new server process pays before it
+can serve anyone. "first run" is a whole first script run under AppTest in
+another fresh interpreter, i.e. what the first visitor waits for. Both
+list which heavy SDKs they ended up importing.
+
+Reruns are timed under AppTest in this process, after a warm-up run, for
+an empty Generator tab and for one showing a 4-stop route. Time spent
+inside each st.tabs() tab is recorded separately (Streamlit runs every tab
+on every rerun; only the visible one is drawn). All runs use a copy of the
+bundled database.
+
+    python -m benchmarks.bench_startup --reruns 20 --out startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import streamlit as st
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.report import header, summarize, write_json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+HEAVY = ("openai", "folium", "streamlit_folium", "stripe", "requests")
+ROUTE = ["Chinatown Heritage Centre", "Gardens by the Bay", "Marina Bay Sands Skypark", "ArtScience Museum"]
+
+
+# --- Cold start, each in a fresh interpreter ---
+
+def child(kind):
+    """Runs in the subprocess; prints {"seconds", "heavy"} as JSON."""
+    streamlit.logger.set_log_level("error")
+    sys.path.insert(0, REPO_ROOT)
+    started = time.perf_counter()
+    if kind == "import":
+        import app # noqa: F401
+    else:
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+        at.run()
+        if at.exception:
+            sys.exit(at.exception[0].value)
+    print(json.dumps({"seconds": time.perf_counter() - started, "heavy": [m for m in HEAVY if m in sys.modules]}))
+
+
+def cold(kind, workdir, repeats):
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"), "PYTHONPATH": REPO_ROOT}
+    samples, heavy = [], None
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", kind], cwd=workdir,
+                             env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy = result["heavy"]
+    return {"time": summarize(samples), "heavy_modules": heavy}
+
+
+# --- Reruns, in this process ---
+
+class TimedTab:
+    """Wraps a tab container to add the time spent inside it to `times`."""
+
+    def __init__(self, tab, label, times):
+        self._tab, self._label, self._times = tab, label, times
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self._tab.__enter__()
+
+    def __exit__(self, *exc):
+        self._times[self._label] = self._times.get(self._label, 0.0) + time.perf_counter() - self._started
+        return self._tab.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._tab, name)
+
+
+def demo_route():
+    import gazetteer
+    import pricing
+    from constants import TICKET_PRICES
+
+    stops = []
+    for i, name in enumerate(ROUTE):
+        stops.append({"name": name, "coords": list(gazetteer.LANDMARK_COORDS.get(name, (1.29, 103.85))),
+                      "desc": "一个值得一去的地方。", "price": TICKET_PRICES.get(name, "Free"),
+                      "transport_from_prev": None if i == 0 else {"method": "步行", "duration": "10 mins", "cost": "SGD $0"}})
+    return pricing.price_route(stops), pricing.route_totals(stops)
+
+
+def reruns(scenario, n):
+    times = {}
+    tabs = st.tabs
+    st.tabs = lambda labels, *a, **kw: [TimedTab(tab, label, times) for tab, label in zip(tabs(labels, *a, **kw), labels)]
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+        if scenario == "route":
+            at.session_state["route"], at.session_state["route_totals"] = demo_route()
+        at.run() # Warm-up: caches, map, first feed page
+        if at.exception:
+            sys.exit(at.exception[0].value)
+        script, per_tab = [], {}
+        for _ in range(n):
+            times.clear()
+            started = time.perf_counter()
+            at.run()
+            script.append(time.perf_counter() - started)
+            for label, seconds in times.items():
+                per_tab.setdefault(label, []).append(seconds)
+    finally:
+        st.tabs = tabs
+    return {"script": summarize(script), "tabs": {label: summarize(s) for label, s in per_tab.items()}}
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        import database
+        db = os.path.join(REPO_ROOT, database.DB_NAME)
+        if os.path.exists(db):
+            shutil.copy(db, tmp)
+        result = {
+            **header("startup"),
+            "config": {"reruns": args.reruns, "cold_repeats": args.cold_repeats},
+            "import": cold("import", tmp, args.cold_repeats),
+            "first_run": cold("first-run", tmp, args.cold_repeats),
+        }
+        database.DB_NAME = os.path.join(tmp, os.path.basename(database.DB_NAME))
+        streamlit.logger.set_log_level("error")
+        result["reruns"] = {scenario: reruns(scenario, args.reruns) for scenario in ("empty", "route")}
+        database.close_connections()
+    return result
+
+
+def print_report(result):
+    for kind in ("import", "first_run"):
+        r = result[kind]
+        print(f"{kind:<10} p50 {r['time']['p50_ms']:>8.1f} ms  max {r['time']['max_ms']:>8.1f} ms  "
+              f"heavy SDKs loaded: {', '.join(r['heavy_modules']) or '-'}")
+    print(f"\n{'rerun':<8}{'part':<36}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for scenario, r in result["reruns"].items():
+        for part, s in [("whole script", r["script"])] + list(r["tabs"].items()):
+            print(f"{scenario:<8}{part:<36}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['mean_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--cold-repeats", type=int, default=3, help="Fresh interpreters per cold measurement")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    parser.add_argument("--child", choices=["import", "first-run"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Cost of getting several route options: one request per option vs one request for all.
+
+"Separate" is how a user got N options before: N fresh generate_ai_route
+calls one after another, each followed by its image lookups. "Combined"
+is generate_ai_route(variants=N): one completion returning N routes, a
+place repeated across them written out once, then one image fan-out over
+every stop, each distinct place looked up once. Both run against the
+local OpenAI/Unsplash stand-ins on a throwaway database, for the same
+random mix of start locations, moods and durations.
+
+    python -m benchmarks.bench_variants --requests 30 --variants 3 --out variants.json
+
+The stand-in's completion latency is --llm, plus --prefill seconds per
+1000 prompt tokens and --decode seconds per completion token; the defaults
+are rough GPT-4o figures. Token counts are standins.estimate_tokens. Each
+phase starts with empty image caches.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import streamlit.logger
+
+from benchmarks import standins
+from benchmarks.report import header, summarize, write_json
+
+DURATIONS = [1.5, 2.0, 2.5, 3.0, 4.0]
+
+
+def make_requests(n, rng):
+    from constants import MOODS, START_LOCATIONS
+
+    requests = []
+    for _ in range(n):
+        start_loc = rng.choice(list(START_LOCATIONS))
+        requests.append((start_loc, START_LOCATIONS[start_loc], rng.choice(MOODS), rng.choice(DURATIONS), False, ""))
+    return requests
+
+
+def separate(app, images, request, n):
+    routes = []
+    for _ in range(n):
+        stops, summary = app.generate_ai_route(*request, fresh=True)
+        if stops:
+            routes.append((images.fetch_images_parallel(stops), summary))
+    return routes
+
+
+def combined(app, images, request, n):
+    routes = app.generate_ai_route(*request, fresh=True, variants=n)
+    images.fetch_images_parallel([stop for stops, _ in routes for stop in stops])
+    return routes
+
+
+PHASES = {"separate": separate, "combined": combined}
+
+
+def run(args):
+    requests = make_requests(args.requests, random.Random(args.seed))
+    chat = standins.Profile.parse(args.llm, seed=args.seed)
+    image_profile = standins.Profile.parse(args.images, seed=args.seed + 1)
+    results = {}
+    with standins.StandIns(chat=chat, images=image_profile, places=args.places, seed=args.seed,
+                           prefill_per_token=args.prefill / 1000, decode_per_token=args.decode) as apis, \
+            tempfile.TemporaryDirectory() as tmp:
+        # The app reads these at import time
+        os.environ["OPENAI_BASE_URL"] = apis.openai_base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        os.environ["UNSPLASH_ACCESS_KEY"] = "bench"
+        import database
+        import images
+        images.UNSPLASH_SEARCH_URL = apis.unsplash_search_url
+        streamlit.logger.set_log_level("error") # No session here, so every st.* call would warn
+        import app
+
+        for phase, fetch in PHASES.items():
+            database.close_connections()
+            database.DB_NAME = os.path.join(tmp, f"{phase}.db")
+            database.init_db()
+            images._lru.clear()
+            before = dict(apis.stats)
+            latencies, shown = [], 0
+            for request in requests:
+                t = time.perf_counter()
+                routes = fetch(app, images, request, args.variants)
+                latencies.append(time.perf_counter() - t)
+                shown += len(routes)
+            used = {k: apis.stats[k] - before[k] for k in before}
+            results[phase] = {
+                "latency": summarize(latencies),
+                "routes_shown": shown,
+                **{k: used[k] for k in ("chat_requests", "chat_errors", "prompt_tokens", "completion_tokens",
+                                        "image_requests")},
+                "per_route": {k: round(used[k] / max(shown, 1), 2)
+                              for k in ("chat_requests", "prompt_tokens", "completion_tokens", "image_requests")},
+            }
+        database.close_connections()
+
+    return {
+        **header("variants"),
+        "config": {"requests": args.requests, "variants": args.variants, "places": args.places, "seed": args.seed,
+                   "llm": chat.describe(), "images": image_profile.describe(),
+                   "prefill_s_per_1k_tokens": args.prefill, "decode_s_per_token": args.decode},
+        "phases": results,
+    }
+
+
+def print_report(result):
+    cfg = result["config"]
+    print(f"{cfg['requests']} requests for {cfg['variants']} options each, LLM {cfg['llm']['median_s']}s + "
+          f"{cfg['prefill_s_per_1k_tokens']}s/1k prompt tokens + {cfg['decode_s_per_token']}s/completion token\n")
+    print(f"{'phase':<10}{'routes':>8}{'p50 ms':>10}{'p95 ms':>10}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}"
+          f"{'images':>8}   per route: calls, prompt, completion, images")
+    for phase, r in result["phases"].items():
+        lat, per = r["latency"], r["per_route"]
+        print(f"{phase:<10}{r['routes_shown']:>8}{lat['p50_ms']:>10.1f}{lat['p95_ms']:>10.1f}{r['chat_requests']:>7}"
+              f"{r['prompt_tokens']:>12}{r['completion_tokens']:>11}{r['image_requests']:>8}   "
+              f"{per['chat_requests']}, {per['prompt_tokens']}, {per['completion_tokens']}, {per['image_requests']}")
+    before, after = result["phases"]["separate"], result["phases"]["combined"]
+    print(f"\nper route shown: prompt tokens {1 - after['per_route']['prompt_tokens'] / before['per_route']['prompt_tokens']:.0%} fewer, "
+          f"completion tokens {1 - after['per_route']['completion_tokens'] / before['per_route']['completion_tokens']:.0%} fewer; "
+          f"p50 latency for all options {1 - after['latency']['p50_ms'] / before['latency']['p50_ms']:.0%} lower")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--places", type=int, default=200, help="Size of the stand-in's place pool")
+    parser.add_argument("--llm", default="0.5,0.1,0.0", help="Completion latency profile, see standins.Profile")
+    parser.add_argument("--images", default="0.15,0.3,0.0", help="Image search latency profile")
+    parser.add_argument("--prefill", type=float, default=0.05, help="Assumed seconds of latency per 1000 prompt tokens")
+    parser.add_argument("--decode", type=float, default=0.012, help="Assumed seconds of latency per completion token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Helpers shared by the benchmarks that write JSON results (--out)."""
+import json
+import math
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)), 1) - 1]
+
+
+def summarize(samples, errors=0):
+    """count/errors/p50/p95/p99/mean/max in ms for latencies in seconds."""
+    times = sorted(s * 1000 for s in samples)
+    summary = {"count": len(times), "errors": errors}
+    if times:
+        summary.update({f"p{p}_ms": round(percentile(times, p), 2) for p in PERCENTILES})
+        summary.update({"mean_ms": round(sum(times) / len(times), 2), "max_ms": round(times[-1], 2)})
+    return summary
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def header(benchmark):
+    """The fields every result file starts with."""
+    return {
+        "benchmark": benchmark,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": git_rev(),
+        "python": platform.python_version(),
+    }
+
+
+def write_json(path, result):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\nWrote {path}")
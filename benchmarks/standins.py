@@ -0,0 +1,317 @@
+"""Local stand-ins for the OpenAI chat completions, Unsplash search and Stripe Checkout APIs.
+
+Benchmarks point the app at these instead of the real services, so they
+measure our code against a latency and failure rate they choose:
+
+    with standins.StandIns(chat=Profile(1.5, 0.3, 0.02)) as apis:
+        os.environ["OPENAI_BASE_URL"] = apis.openai_base_url
+        images.UNSPLASH_SEARCH_URL = apis.unsplash_search_url
+        stripe.api_base = apis.stripe_api_base
+
+Route completions are made up from a pool of places: the known landmarks,
+padded with made-up ones scattered over central Singapore. Checkout
+sessions honour Idempotency-Key the way Stripe does: the same key with the
+same parameters replays the first response, with other parameters it is
+an error.
+"""
+import contextlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from gazetteer import LANDMARK_COORDS
+
+STREAM_CHUNK_CHARS = 12
+FIRST_TOKEN_SHARE = 0.2 # Part of a streamed completion's latency spent before the first chunk
+
+_CJK = re.compile("[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """Rough GPT-4o token count: ~1 per CJK character, ~4 characters per token otherwise."""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class Profile:
+    """Latency and error profile of one stand-in endpoint.
+
+    Latency is lognormal around `median` seconds; `spread` is the sigma of
+    its log (0 for a fixed delay). A share `error_rate` of requests fail
+    with HTTP `error_status` after the delay.
+    """
+
+    def __init__(self, median=0.0, spread=0.0, error_rate=0.0, error_status=500, seed=0):
+        self.median = median
+        self.spread = spread
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, text, seed=0):
+        """Profile from "median[,spread[,error_rate]]", as given on the command line."""
+        values = [float(v) for v in text.split(",")]
+        return cls(*values[:3], seed=seed)
+
+    def sample(self):
+        """(delay seconds, fail?) for the next request."""
+        with self._lock:
+            delay = self.median * math.exp(self._rng.gauss(0, self.spread)) if self.spread else self.median
+            return delay, self._rng.random() < self.error_rate
+
+    def describe(self):
+        return {"median_s": self.median, "spread": self.spread, "error_rate": self.error_rate,
+                "error_status": self.error_status}
+
+
+def place_pool(size, seed=0):
+    """[(name, [lat, lon])]: the landmarks, then made-up places up to `size`."""
+    rng = random.Random(seed)
+    pool = list(LANDMARK_COORDS.items())
+    for i in range(len(pool), size):
+        pool.append((f"Bench Place {i}", [round(1.27 + rng.random() * 0.08, 4), round(103.78 + rng.random() * 0.12, 4)]))
+    return pool[:size]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass # Clients dropping keep-alive connections at exit isn't news
+
+
+class StandIns:
+    """All stand-ins on one local HTTP server, for use as a context manager."""
+
+    def __init__(self, chat=None, images=None, places=50, seed=0, prefill_per_token=0.0, decode_per_token=0.0,
+                 stripe=None):
+        self.chat = chat or Profile()
+        self.prefill_per_token = prefill_per_token # Extra completion latency per prompt token
+        self.decode_per_token = decode_per_token # ... and per completion token
+        self.images = images or Profile()
+        self.stripe = stripe or Profile()
+        self.checkout_sessions = {} # id -> session
+        self._idempotent = {} # Idempotency-Key -> (params, session)
+        self.places = place_pool(places, seed)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._inflight = {"chat": 0, "image": 0}
+        self.stats = {"connections": 0,
+                      "chat_requests": 0, "chat_errors": 0, "chat_peak_inflight": 0,
+                      "prompt_chars": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                      "image_requests": 0, "image_errors": 0, "image_peak_inflight": 0,
+                      "stripe_requests": 0, "stripe_errors": 0, "checkout_sessions": 0, "idempotent_replays": 0}
+        self._server = None
+
+    def __enter__(self):
+        self._server = _Server(("127.0.0.1", 0), _handler(self))
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def openai_base_url(self):
+        return self.base_url + "/v1"
+
+    @property
+    def unsplash_search_url(self):
+        return self.base_url + "/search/photos"
+
+    @property
+    def stripe_api_base(self):
+        return self.base_url
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    @contextlib.contextmanager
+    def _in_flight(self, kind):
+        """Counts a request of `kind` as in flight, keeping the peak in stats."""
+        with self._lock:
+            self._inflight[kind] += 1
+            peak = f"{kind}_peak_inflight"
+            self.stats[peak] = max(self.stats[peak], self._inflight[kind])
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight[kind] -= 1
+
+    def completion(self, prompt):
+        """JSON content of a reply to `prompt`: one place, a 3-5 stop route,
+        or several routes if the prompt asks for "Routes: N"."""
+        with self._lock:
+            if "Recommend ONE" in prompt:
+                name, coords = self._rng.choice(self.places)
+                return json.dumps({"name": name, "coords": coords, "desc": "安静舒适，适合放松。"}, ensure_ascii=False)
+            wanted = re.search(r"Routes: (\d+)", prompt)
+            picks = [self._rng.sample(self.places, self._rng.randint(3, 5)) for _ in range(int(wanted.group(1)) if wanted else 1)]
+        routes, written = [], set()
+        for route in picks:
+            stops = []
+            for i, (name, coords) in enumerate(route):
+                leg = None if i == 0 else {"method": "步行", "duration": "10 mins", "cost": "SGD $0"}
+                if name in written:
+                    # As the prompt allows: places from an earlier route by name only
+                    stops.append({"name": name, "transport_from_prev": leg})
+                    continue
+                written.add(name)
+                stops.append({"name": name, "coords": coords, "desc": "一个值得一去的地方，适合慢慢逛。",
+                              "price": "Free" if i % 2 else "SGD $12", "transport_from_prev": leg})
+            routes.append({"stops": stops, "summary": "这是一段轻松愉快的城市漫步。"})
+        return json.dumps({"routes": routes} if wanted else routes[0], ensure_ascii=False)
+
+
+    def create_checkout_session(self, params, idempotency_key):
+        """(HTTP status, body) for a POST /v1/checkout/sessions with form `params`."""
+        with self._lock:
+            if idempotency_key in self._idempotent:
+                first_params, session = self._idempotent[idempotency_key]
+                if first_params != params:
+                    return 400, {"error": {"type": "idempotency_error",
+                                           "message": "Keys for idempotent requests can only be used with the same parameters"}}
+                self.stats["idempotent_replays"] += 1
+                return 200, session
+            n = self.stats["checkout_sessions"] = self.stats["checkout_sessions"] + 1
+            items = {} # Form keys like line_items[0][price_data][unit_amount]
+            for key, value in params.items():
+                if key.startswith("line_items["):
+                    index, *path = re.findall(r"\[(\w+)\]", key)
+                    items.setdefault(index, {})["/".join(path)] = value
+            session_id = f"cs_test_standin{n:06d}"
+            session = {
+                "id": session_id, "object": "checkout.session", "mode": params.get("mode"), "status": "open",
+                "url": f"{self.base_url}/pay/{session_id}", "expires_at": int(params.get("expires_at") or time.time() + 86400),
+                "amount_total": sum(int(item.get("price_data/unit_amount", 0)) * int(item.get("quantity", 1))
+                                    for item in items.values()),
+                "line_items_count": len(items),
+                "success_url": params.get("success_url"), "cancel_url": params.get("cancel_url"),
+            }
+            self.checkout_sessions[session_id] = session
+            if idempotency_key:
+                self._idempotent[idempotency_key] = (params, session)
+            return 200, session
+
+
+def _handler(apis):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            apis._count("connections") # One handler per TCP connection, however many requests it carries
+
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _fail(self, profile):
+            self._send(profile.error_status, {"error": {"message": "stand-in failure", "type": "server_error"}})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/search/photos":
+                return self._send(404, {"error": "not found"})
+            apis._count("image_requests")
+            delay, fail = apis.images.sample()
+            with apis._in_flight("image"):
+                time.sleep(delay)
+            if fail:
+                apis._count("image_errors")
+                return self._fail(apis.images)
+            query = parse_qs(url.query).get("query", [""])[0]
+            self._send(200, {"results": [{"urls": {"small": f"https://images.invalid/{quote(query)}.jpg"}}]})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/v1/checkout/sessions":
+                return self._checkout(raw)
+            if self.path != "/v1/chat/completions":
+                return self._send(404, {"error": "not found"})
+            with apis._in_flight("chat"):
+                self._chat(json.loads(raw))
+
+        def _chat(self, body):
+            prompt = "\n".join(m["content"] for m in body.get("messages", []))
+            apis._count("chat_requests")
+            prompt_tokens = estimate_tokens(prompt)
+            apis._count("prompt_chars", len(prompt))
+            apis._count("prompt_tokens", prompt_tokens)
+            delay, fail = apis.chat.sample()
+            delay += prompt_tokens * apis.prefill_per_token
+            if fail:
+                time.sleep(delay)
+                apis._count("chat_errors")
+                return self._fail(apis.chat)
+            content = apis.completion(prompt)
+            completion_tokens = estimate_tokens(content)
+            apis._count("completion_tokens", completion_tokens)
+            delay += completion_tokens * apis.decode_per_token
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            if body.get("stream"):
+                # Like the real API, usage only comes as a last chunk when asked for
+                return self._stream(content, delay, usage if (body.get("stream_options") or {}).get("include_usage") else None)
+            time.sleep(delay)
+            self._send(200, {
+                "id": "chatcmpl-standin", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def _checkout(self, raw):
+            apis._count("stripe_requests")
+            delay, fail = apis.stripe.sample()
+            time.sleep(delay)
+            if fail:
+                apis._count("stripe_errors")
+                return self._send(apis.stripe.error_status, {"error": {"type": "api_error", "message": "stand-in failure"}})
+            params = {key: values[-1] for key, values in parse_qs(raw.decode(), keep_blank_values=True).items()}
+            self._send(*apis.create_checkout_session(params, self.headers.get("Idempotency-Key")))
+
+        def _stream(self, content, delay, usage=None):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(data):
+                payload = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                self.wfile.flush()
+
+            pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+            time.sleep(delay * FIRST_TOKEN_SHARE)
+            for piece in pieces:
+                event(json.dumps({"id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()),
+                                  "model": "gpt-4o", "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}))
+                time.sleep(delay * (1 - FIRST_TOKEN_SHARE) / len(pieces))
+            if usage:
+                event(json.dumps({"id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()),
+                                  "model": "gpt-4o", "choices": [], "usage": usage}))
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
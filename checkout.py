@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+import metrics
+import pricing
+
+# --- Ticket Cart ---
+# All paid stops of the current route go into one Stripe Checkout session,
+# a line item each, instead of one session per stop. Sessions are kept per
+# (owner, cart hash) and handed out again until they are close to expiring,
+# so repeated clicks, reruns and a second tab cost no Stripe call. The cart
+# hash covers only the set of paid stops and their prices, so reordering the
+# route or adding, moving or dropping a free stop keeps the same session.
+#
+# Each create carries an idempotency key that is fixed for the cart entry,
+# together with the other parameters (expires_at included): a retried or
+# concurrent create of the same cart gets the same session back from
+# Stripe instead of a second one. Kept in process memory; a session a
+# restart forgets just expires unused.
+
+SESSION_TTL = 3600 # expires_at asked of Stripe (it allows 30 min to 24 h)
+MIN_TIME_TO_PAY = 600 # Sessions with less time left than this aren't handed out again
+
+_lock = threading.Lock()
+_carts = {} # (owner, cart hash) -> _Cart
+
+
+class _Cart:
+    __slots__ = ("key", "expires_at", "session_id", "url", "lock")
+
+    def __init__(self, digest):
+        self.key = f"cart-{digest[:16]}-{uuid.uuid4().hex}"
+        self.expires_at = int(time.time()) + SESSION_TTL
+        self.session_id = None
+        self.url = None
+        self.lock = threading.Lock() # Held while creating, so concurrent clicks wait for one create
+
+    def live(self):
+        return self.expires_at - MIN_TIME_TO_PAY > time.time()
+
+
+def cart_items(stops):
+    """[(name, cents)] of the stops with a ticket price in pricing.CURRENCY."""
+    return [(stop.get("name", ""), stop["price_cents"]) for stop in stops or []
+            if stop.get("price_cents") and stop.get("currency") == pricing.CURRENCY]
+
+
+def cart_hash(items):
+    """Hash of the cart's contents, whatever order the stops come in."""
+    return hashlib.sha1(json.dumps(sorted(items), ensure_ascii=False).encode()).hexdigest()
+
+
+def line_items(items):
+    return [{
+        "price_data": {
+            "currency": pricing.CURRENCY.lower(),
+            "product_data": {"name": f"Ticket for {name}"},
+            "unit_amount": cents,
+        },
+        "quantity": 1,
+    } for name, cents in items]
+
+
+def cached_url(owner, items):
+    """Checkout URL of a live session for this cart, without calling Stripe."""
+    with _lock:
+        cart = _carts.get((owner, cart_hash(items)))
+    return cart.url if cart and cart.url and cart.live() else None
+
+
+def checkout_url(stripe, owner, items, success_url, cancel_url):
+    """Checkout URL for all `items`, creating the session only if this
+    (owner, cart) has no live one. Stripe errors are raised."""
+    # Line items in a fixed order too: a create retried under the entry's
+    # idempotency key must send the same parameters
+    items = sorted(items)
+    digest = cart_hash(items)
+    with _lock:
+        cart = _carts.get((owner, digest))
+        if cart is None or not cart.live():
+            for key in [key for key, other in _carts.items() if not other.live()]:
+                del _carts[key]
+            cart = _carts[(owner, digest)] = _Cart(digest)
+    with cart.lock:
+        if cart.url:
+            metrics.incr("checkout_sessions_total", result="reused")
+            return cart.url
+        try:
+            with metrics.span("stripe.checkout"):
+                session = stripe.checkout.Session.create(
+                    idempotency_key=cart.key,
+                    payment_method_types=["card"],
+                    mode="payment",
+                    line_items=line_items(items),
+                    expires_at=cart.expires_at,
+                    success_url=success_url,
+                    cancel_url=cancel_url,
+                )
+        except Exception:
+            with _lock:
+                if _carts.get((owner, digest)) is cart:
+                    del _carts[(owner, digest)] # Next attempt starts over with a new key
+            raise
+        metrics.incr("checkout_sessions_total", result="created")
+        cart.session_id, cart.url = session.id, session.url
+        return cart.url
+
+
+def forget(session_id):
+    """Drop the cart a (now paid) session belongs to, so buying the same
+    tickets again opens a new session."""
+    if not session_id:
+        return
+    with _lock:
+        for key in [key for key, cart in _carts.items() if cart.session_id == session_id]:
+            del _carts[key]
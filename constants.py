@@ -0,0 +1,31 @@
+# Shared data used by the app and the offline tools (gazetteer, travel matrix).
+
+# Real Ticket Prices (2025 Estimates)
+TICKET_PRICES = {
+    "Gardens by the Bay": "SGD $53",
+    "Flower Dome": "SGD $32",
+    "Cloud Forest": "SGD $32",
+    "Marina Bay Sands Skypark": "SGD $32",
+    "ArtScience Museum": "SGD $25",
+    "National Museum of Singapore": "SGD $15",
+    "National Gallery Singapore": "SGD $20",
+    "Singapore Flyer": "SGD $40",
+    "Singapore Zoo": "SGD $48",
+    "Night Safari": "SGD $55",
+    "River Wonders": "SGD $42",
+    "Bird Paradise": "SGD $48",
+    "S.E.A. Aquarium": "SGD $44",
+    "Universal Studios Singapore": "SGD $88",
+    "Asian Civilisations Museum": "SGD $15"
+}
+
+# Key Locations for Start Points
+START_LOCATIONS = {
+    "NUS (National University of Singapore)": [1.2966, 103.7764],
+    "MBS (Marina Bay Sands)": [1.2847, 103.8610],
+    "Changi Airport": [1.3644, 103.9915],
+    "Orchard Road": [1.3048, 103.8318],
+    "Chinatown": [1.2842, 103.8436]
+}
+
+MOODS = ["Chill (休闲)", "Energetic (活力)", "Foodie (美食)", "Melancholy (忧郁)", "Cultural (文化)"]
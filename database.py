@@ -1,14 +1,161 @@
 import sqlite3
 import json
 import hashlib
+import queue
+import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+import gazetteer
+import metrics
+import pricing
+
 DB_NAME = "vibe_navigator_v2.db"
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+# --- Connection Pool ---
+# Streamlit reruns the whole script on every interaction, so opening a fresh
+# connection per query adds up fast. Connections are kept open in a small pool
+# and configured once: WAL lets readers proceed while a writer commits, and the
+# busy timeout makes concurrent writers wait instead of failing immediately.
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # Safe with WAL, avoids an fsync per commit
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size=-8000",  # ~8 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=67108864",  # 64 MB
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of SQLite connections to a single database file."""
+
+    def __init__(self, db_name, size=POOL_SIZE):
+        self.db_name = db_name
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _get_pool():
+    global _pool
+    pool = _pool
+    if pool is None or pool.db_name != DB_NAME:
+        with _pool_lock:
+            if _pool is None or _pool.db_name != DB_NAME:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_NAME)
+            pool = _pool
+    return pool
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+
+def close_connections():
+    """Close every idle pooled connection (e.g. before swapping DB_NAME)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+# --- Full-Text Search ---
+# plans_fts indexes each plan's summary, review, start location, mood and stop
+# names with FTS5's unicode61 tokenizer. That tokenizer splits on spaces and
+# punctuation, which Chinese doesn't have, so CJK runs are rewritten as
+# overlapping character bigrams before indexing ("滨海湾" -> "滨海 海湾 湾"; the
+# trailing single character lets one-character queries match as a prefix). A
+# Chinese query term is matched as the phrase of its bigrams.
+#
+# Segmenting happens in Python, so the plans triggers only queue changed plans
+# in plans_fts_pending (plain SQL, nothing for other clients to register) and
+# _flush_fts() indexes the queue. Every write to plans is therefore covered,
+# including raw SQL and bulk loads: save_plan and add_review flush in their own
+# transaction, init_db flushes after migrating, and search_plans flushes
+# whatever else is queued before it searches.
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_RUN = re.compile(f"[{_CJK}]+")
+_QUERY_PART = re.compile(f"[{_CJK}]+|[^{_CJK}\\W]+")
+
+def _bigrams(run):
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def fts_segment(text):
+    if not text:
+        return text
+    return _CJK_RUN.sub(lambda m: " " + " ".join(_bigrams(m.group()) + [m.group()[-1]]) + " ", text)
+
+def fts_query(text):
+    """An FTS5 MATCH expression for free text typed by a user (None if empty).
+
+    Every word must match: CJK runs as a phrase of bigrams, other words (and
+    single CJK characters) as a prefix.
+    """
+    terms = []
+    for part in _QUERY_PART.findall(text or ""):
+        if _CJK_RUN.match(part) and len(part) > 1:
+            terms.append('"' + " ".join(_bigrams(part)) + '"')
+        else:
+            terms.append(f'"{part}"*')
+    return " ".join(terms) or None
+
+# --- Schema Migrations ---
+# Each step upgrades the schema by one version and PRAGMA user_version
+# records how far a database file has got, so init_db() only runs the steps
+# that are still pending. Steps must tolerate databases created before
+# versioning existed (user_version 0 with some tables already present).
+
+def _columns(c, table):
+    return {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+
+def _migration_base_tables(c):
     # Users Table
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -36,17 +183,6 @@ def init_db():
         )
     ''')
     
-    # Try to add columns if they don't exist (Migration)
-    try:
-        c.execute("ALTER TABLE plans ADD COLUMN post_mood TEXT")
-    except: pass
-    try:
-        c.execute("ALTER TABLE plans ADD COLUMN review_text TEXT")
-    except: pass
-    try:
-        c.execute("ALTER TABLE plans ADD COLUMN rating INTEGER")
-    except: pass
-    
     # Meetups Table
     c.execute('''
         CREATE TABLE IF NOT EXISTS meetups (
@@ -55,64 +191,581 @@ def init_db():
             host_id INTEGER,
             host_name TEXT,
             meetup_time TEXT,
-            participants TEXT, -- JSON list of usernames
+            participants TEXT, -- Legacy JSON list of usernames, see meetup_participants
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(plan_id) REFERENCES plans(id),
             FOREIGN KEY(host_id) REFERENCES users(id)
         )
     ''')
+
+def _migration_plan_columns(c):
+    # Columns added to plans after the first release
+    existing = _columns(c, "plans")
+    for name, col_type in [("summary", "TEXT"), ("post_mood", "TEXT"), ("review_text", "TEXT"), ("rating", "INTEGER")]:
+        if name not in existing:
+            c.execute(f"ALTER TABLE plans ADD COLUMN {name} {col_type}")
+
+def _migration_feed_indexes(c):
+    # Keyset pagination on (created_at, id), see get_plans_page
+    c.execute("CREATE INDEX IF NOT EXISTS idx_plans_feed ON plans(created_at DESC, id DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_plans_mood_feed ON plans(mood, created_at DESC, id DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_plans_start_feed ON plans(start_loc, created_at DESC, id DESC)")
+
+def _migration_meetup_participants(c):
+    # Meetup Participants Table (one row per user per meetup). Legacy
+    # participants without a user account are kept by name as guests.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS meetup_participants (
+            meetup_id INTEGER NOT NULL,
+            user_id INTEGER,
+            guest_name TEXT,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (user_id IS NOT NULL OR guest_name IS NOT NULL),
+            UNIQUE(meetup_id, user_id),
+            UNIQUE(meetup_id, guest_name),
+            FOREIGN KEY(meetup_id) REFERENCES meetups(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
     
-    conn.commit()
-    conn.close()
+    # Move legacy meetups.participants JSON lists over. Names that no longer
+    # match a user account are kept as guest_name.
+    rows = c.execute("SELECT id, participants, created_at FROM meetups WHERE participants IS NOT NULL").fetchall()
+    for meetup_id, participants, created_at in rows:
+        for username in json.loads(participants or "[]"):
+            c.execute('''
+                INSERT OR IGNORE INTO meetup_participants (meetup_id, user_id, guest_name, joined_at)
+                SELECT ?, u.id, CASE WHEN u.id IS NULL THEN ? END, ?
+                FROM (SELECT ? AS name) LEFT JOIN users u ON u.username = name
+            ''', (meetup_id, username, created_at, username))
+    c.execute("UPDATE meetups SET participants = NULL WHERE participants IS NOT NULL")
 
+def _migration_image_cache(c):
+    # Unsplash lookups keyed by normalized place name, see images.py.
+    # url is NULL for a negative entry (the search found nothing).
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache (
+            place_key TEXT PRIMARY KEY,
+            url TEXT,
+            fetched_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_route_cache(c):
+    # Generated routes keyed by normalized request parameters, see route_cache.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS route_cache (
+            cache_key TEXT PRIMARY KEY,
+            stops_json TEXT NOT NULL,
+            summary TEXT,
+            gen_seconds REAL, -- How long the original generation took
+            created_at REAL NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_route_cache_created ON route_cache(created_at)")
+
+def _migration_meetup_feed_index(c):
+    # Keyset pagination of the meetups tab, see get_meetups_page
+    c.execute("CREATE INDEX IF NOT EXISTS idx_meetups_feed ON meetups(created_at DESC, id DESC)")
+
+def _migration_plans_fts(c):
+    # Full-text index over plans, see search_plans. The triggers only queue
+    # plans for _flush_fts(); init_db indexes the backfilled queue.
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS plans_fts USING fts5(
+            summary, review_text, start_loc, mood, stops
+        )
+    ''')
+    c.execute("CREATE TABLE IF NOT EXISTS plans_fts_pending (plan_id INTEGER PRIMARY KEY)")
+    enqueue = "INSERT OR IGNORE INTO plans_fts_pending (plan_id) VALUES (new.id);"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS plans_fts_insert AFTER INSERT ON plans BEGIN {enqueue} END")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS plans_fts_update
+        AFTER UPDATE OF summary, review_text, start_loc, mood, route_json ON plans
+        BEGIN {enqueue} END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS plans_fts_delete AFTER DELETE ON plans BEGIN
+            DELETE FROM plans_fts WHERE rowid = old.id;
+            DELETE FROM plans_fts_pending WHERE plan_id = old.id;
+        END
+    ''')
+    
+    c.execute("DELETE FROM plans_fts")
+    c.execute("INSERT OR IGNORE INTO plans_fts_pending (plan_id) SELECT id FROM plans")
+
+# Trigger bodies keeping mood_transitions / rating_stats in step with a plan's review
+_REVIEW_STATS_ADD = '''
+    INSERT INTO mood_transitions (mood, post_mood, count)
+    SELECT ifnull(new.mood, ''), new.post_mood, 1 WHERE new.post_mood IS NOT NULL
+    ON CONFLICT(mood, post_mood) DO UPDATE SET count = count + 1;
+    INSERT INTO rating_stats (mood, start_loc, rating_sum, rating_count)
+    SELECT ifnull(new.mood, ''), ifnull(new.start_loc, ''), new.rating, 1 WHERE new.rating IS NOT NULL
+    ON CONFLICT(mood, start_loc) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum,
+                                               rating_count = rating_count + 1;
+'''
+_REVIEW_STATS_REMOVE = '''
+    UPDATE mood_transitions SET count = count - 1
+    WHERE mood = ifnull(old.mood, '') AND post_mood = old.post_mood;
+    UPDATE rating_stats SET rating_sum = rating_sum - old.rating, rating_count = rating_count - 1
+    WHERE mood = ifnull(old.mood, '') AND start_loc = ifnull(old.start_loc, '') AND old.rating IS NOT NULL;
+'''
+
+def _migration_stats_tables(c):
+    # Running aggregates over plans, see get_mood_transitions / get_rating_stats /
+    # get_popular_places. Missing moods and start locations are stored as ''
+    # so they still take part in the primary keys.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS mood_transitions (
+            mood TEXT NOT NULL,
+            post_mood TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (mood, post_mood)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rating_stats (
+            mood TEXT NOT NULL,
+            start_loc TEXT NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL,
+            PRIMARY KEY (mood, start_loc)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS place_usage (
+            place TEXT PRIMARY KEY,
+            uses INTEGER NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_place_usage_uses ON place_usage(uses DESC)")
+
+    # Each plan counts once per distinct stop name
+    places = '''
+        SELECT DISTINCT json_extract(value, '$.name') AS place
+        FROM json_each(CASE WHEN json_valid({row}.route_json) THEN {row}.route_json ELSE '[]' END)
+        WHERE place IS NOT NULL
+    '''
+    # ("WHERE true" keeps the upsert's ON from parsing as a join constraint)
+    add_places = f'''
+        INSERT INTO place_usage (place, uses) SELECT place, 1 FROM ({places.format(row='new')}) WHERE true
+        ON CONFLICT(place) DO UPDATE SET uses = uses + 1;
+    '''
+    remove_places = f"UPDATE place_usage SET uses = uses - 1 WHERE place IN ({places.format(row='old')});"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS plans_stats_insert AFTER INSERT ON plans BEGIN {add_places} {_REVIEW_STATS_ADD} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS plans_stats_delete AFTER DELETE ON plans BEGIN {remove_places} {_REVIEW_STATS_REMOVE} END")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS plans_stats_route_update AFTER UPDATE OF route_json ON plans
+        BEGIN {remove_places} {add_places} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS plans_stats_review_update AFTER UPDATE OF mood, start_loc, post_mood, rating ON plans
+        BEGIN {_REVIEW_STATS_REMOVE} {_REVIEW_STATS_ADD} END
+    ''')
+
+    for table in ("mood_transitions", "rating_stats", "place_usage"):
+        c.execute(f"DELETE FROM {table}")
+    c.execute('''
+        INSERT INTO mood_transitions (mood, post_mood, count)
+        SELECT ifnull(mood, ''), post_mood, COUNT(*) FROM plans WHERE post_mood IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    c.execute('''
+        INSERT INTO rating_stats (mood, start_loc, rating_sum, rating_count)
+        SELECT ifnull(mood, ''), ifnull(start_loc, ''), SUM(rating), COUNT(*) FROM plans WHERE rating IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    c.execute('''
+        INSERT INTO place_usage (place, uses)
+        SELECT place, COUNT(*) FROM (
+            SELECT DISTINCT p.id, json_extract(s.value, '$.name') AS place
+            FROM plans p, json_each(CASE WHEN json_valid(p.route_json) THEN p.route_json ELSE '[]' END) s
+            WHERE place IS NOT NULL
+        )
+        GROUP BY place
+    ''')
+
+IMPORT_BATCH = 500 # Routes decoded (or plans looked up) at a time in bulk rewrites and reads
+
+def _migration_plan_totals(c):
+    # Trip cost stored with the plan, see pricing.route_totals. Keyset
+    # batches, so only IMPORT_BATCH routes are decoded at a time.
+    existing = _columns(c, "plans")
+    for name, col_type in [("total_cents", "INTEGER"), ("currency", "TEXT")]:
+        if name not in existing:
+            c.execute(f"ALTER TABLE plans ADD COLUMN {name} {col_type}")
+    last_id = 0
+    while True:
+        rows = c.execute(
+            "SELECT id, route_json FROM plans WHERE id > ? AND total_cents IS NULL ORDER BY id LIMIT ?",
+            (last_id, IMPORT_BATCH)).fetchall()
+        if not rows:
+            return
+        updates = []
+        for plan_id, route_json in rows:
+            try:
+                stops = json.loads(route_json or "[]")
+            except json.JSONDecodeError:
+                continue
+            totals = pricing.route_totals(pricing.price_route(stops))
+            updates.append((totals["total_cents"], totals["currency"], plan_id))
+        c.executemany("UPDATE plans SET total_cents = ?, currency = ? WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+def _migration_plan_stops(c):
+    # Routes as rows instead of plans.route_json blobs, see save_plan / _load_routes.
+    # A place is shared by every stop with the same normalized name nearby.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS places (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL, -- gazetteer.normalize_name(name)
+            lat REAL,
+            lon REAL,
+            description TEXT,
+            image TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_places_name_key ON places(name_key)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plan_stops (
+            plan_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            place_id INTEGER NOT NULL,
+            description TEXT, -- This plan's own text and image for the place; places
+            image TEXT,       -- keeps the first ones seen
+            price TEXT, -- As written by the LLM, price_cents is the parsed amount
+            price_cents INTEGER,
+            currency TEXT,
+            geo TEXT,
+            leg_method TEXT, -- transport_from_prev, NULL for the first stop
+            leg_duration TEXT,
+            leg_cost TEXT,
+            leg_cost_cents INTEGER,
+            extra TEXT, -- JSON object of any other stop keys
+            PRIMARY KEY (plan_id, seq),
+            FOREIGN KEY(plan_id) REFERENCES plans(id),
+            FOREIGN KEY(place_id) REFERENCES places(id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_plan_stops_place ON plan_stops(place_id)")
+
+    # The route_json triggers from step 9 move over to plan_stops. Step 8's
+    # plans_fts triggers stay: they only queue plans, and _FTS_SOURCE reads
+    # stop names from plan_stops now.
+    for trigger in ("plans_stats_insert", "plans_stats_delete", "plans_stats_route_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute(f"CREATE TRIGGER plans_stats_insert AFTER INSERT ON plans BEGIN {_REVIEW_STATS_ADD} END")
+    c.execute(f'''
+        CREATE TRIGGER plans_stats_delete AFTER DELETE ON plans
+        BEGIN {_REVIEW_STATS_REMOVE} DELETE FROM plan_stops WHERE plan_id = old.id; END
+    ''')
+
+    # Move the blobs over before the place_usage triggers exist, it is recounted below
+    _import_route_blobs(c)
+
+    # A plan counts once per distinct place name, however many stops share it.
+    # Stop changes also queue the plan for plans_fts (unless it was deleted).
+    other_stop = '''
+        SELECT 1 FROM plan_stops s JOIN places pl ON pl.id = s.place_id
+        WHERE s.plan_id = {row}.plan_id AND s.seq != {row}.seq
+          AND pl.name = (SELECT name FROM places WHERE id = {row}.place_id)
+    '''
+    c.execute(f'''
+        CREATE TRIGGER plan_stops_insert AFTER INSERT ON plan_stops
+        BEGIN
+            INSERT INTO place_usage (place, uses)
+            SELECT name, 1 FROM places WHERE id = new.place_id AND NOT EXISTS ({other_stop.format(row='new')})
+            ON CONFLICT(place) DO UPDATE SET uses = uses + 1;
+            INSERT OR IGNORE INTO plans_fts_pending (plan_id) VALUES (new.plan_id);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER plan_stops_delete AFTER DELETE ON plan_stops
+        BEGIN
+            UPDATE place_usage SET uses = uses - 1
+            WHERE place = (SELECT name FROM places WHERE id = old.place_id)
+              AND NOT EXISTS ({other_stop.format(row='old')});
+            INSERT OR IGNORE INTO plans_fts_pending (plan_id)
+            SELECT old.plan_id WHERE EXISTS (SELECT 1 FROM plans WHERE id = old.plan_id);
+        END
+    ''')
+
+    c.execute("INSERT OR IGNORE INTO plans_fts_pending (plan_id) SELECT id FROM plans")
+    c.execute("DELETE FROM place_usage")
+    c.execute('''
+        INSERT INTO place_usage (place, uses)
+        SELECT pl.name, COUNT(DISTINCT s.plan_id) FROM plan_stops s JOIN places pl ON pl.id = s.place_id
+        GROUP BY pl.name
+    ''')
+
+# Append only: the position of a step is its schema version.
+MIGRATIONS = [
+    _migration_base_tables,         # 1
+    _migration_plan_columns,        # 2
+    _migration_feed_indexes,        # 3
+    _migration_meetup_participants, # 4
+    _migration_image_cache,         # 5
+    _migration_route_cache,         # 6
+    _migration_meetup_feed_index,   # 7
+    _migration_plans_fts,           # 8
+    _migration_stats_tables,        # 9
+    _migration_plan_totals,         # 10
+    _migration_plan_stops,          # 11
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_migrated = set() # DB files already brought up to date by this process
+_migrate_lock = threading.Lock()
+
+@metrics.timed()
+def get_schema_version():
+    with get_connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@metrics.timed()
+def init_db():
+    """Apply pending schema migrations. After the first call it is a no-op."""
+    if DB_NAME in _migrated:
+        return
+    with _migrate_lock, get_connection() as conn:
+        while True:
+            # BEGIN IMMEDIATE takes the write lock before reading the
+            # version, so two processes can't both apply the same step.
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        _flush_fts(conn)
+        conn.commit()
+        _migrated.add(DB_NAME)
+
+FTS_FLUSH_BATCH = 500
+
+# Text indexed in plans_fts for a plan. Stop names come from plan_stops in
+# route order, or from a route_json blob import_route_blobs hasn't moved yet.
+_FTS_SOURCE = '''
+    SELECT plans.id, summary, review_text, start_loc, mood,
+           ifnull((SELECT group_concat(name, ' ') FROM (
+               SELECT pl.name FROM plan_stops s JOIN places pl ON pl.id = s.place_id
+               WHERE s.plan_id = plans.id ORDER BY s.seq
+           )), CASE WHEN json_valid(route_json) THEN
+               (SELECT group_concat(json_extract(value, '$.name'), ' ') FROM json_each(route_json))
+           END)
+    FROM plans
+'''
+
+def _flush_fts(conn):
+    """Index the plans queued in plans_fts_pending, FTS_FLUSH_BATCH at a time."""
+    if conn.execute("SELECT 1 FROM plans_fts_pending LIMIT 1").fetchone() is None:
+        return
+    if not conn.in_transaction:
+        # Hold the write lock from reading the queue to emptying it, so a
+        # concurrent flush can't index an older version of the same plan
+        conn.execute("BEGIN IMMEDIATE")
+    while True:
+        ids = [r[0] for r in conn.execute("SELECT plan_id FROM plans_fts_pending LIMIT ?", (FTS_FLUSH_BATCH,))]
+        if not ids:
+            return
+        marks = ", ".join("?" * len(ids))
+        rows = conn.execute(f"{_FTS_SOURCE} WHERE plans.id IN ({marks})", ids).fetchall()
+        conn.execute(f"DELETE FROM plans_fts WHERE rowid IN ({marks})", ids)
+        conn.executemany("INSERT INTO plans_fts (rowid, summary, review_text, start_loc, mood, stops) VALUES (?, ?, ?, ?, ?, ?)",
+                         [(r[0], *map(fts_segment, r[1:])) for r in rows])
+        conn.execute(f"DELETE FROM plans_fts_pending WHERE plan_id IN ({marks})", ids)
+
+@metrics.timed()
 def register_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     hashed_pw = hashlib.sha256(password.encode()).hexdigest()
     
     try:
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_pw))
-        conn.commit()
+        with get_connection() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_pw))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
+@metrics.timed()
 def login_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     hashed_pw = hashlib.sha256(password.encode()).hexdigest()
     
-    c.execute("SELECT id, username FROM users WHERE username = ? AND password = ?", (username, hashed_pw))
-    user = c.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        user = conn.execute("SELECT id, username FROM users WHERE username = ? AND password = ?", (username, hashed_pw)).fetchone()
     return user # (id, username) or None
 
-def save_plan(user_id, username, mood, start_loc, route_data, summary):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    route_json = json.dumps(route_data)
-    
-    c.execute("INSERT INTO plans (user_id, username, mood, start_loc, route_json, summary) VALUES (?, ?, ?, ?, ?, ?)",
-              (user_id, username, mood, start_loc, route_json, summary))
-    conn.commit()
-    conn.close()
+# --- Routes ---
+# A route is stored as plan_stops rows pointing at shared places rows. Stops
+# read back as the same dicts the generator produced; keys without a column
+# of their own travel in plan_stops.extra.
+
+PLACE_MERGE_KM = 0.5 # Same normalized name within this distance is the same place
+
+_STOP_KEYS = {"name", "coords", "desc", "image", "price", "price_cents", "currency", "geo", "transport_from_prev"}
+
+def _place(conn, stop):
+    """(id, description, image) of the places row for a stop, added if no
+    known place matches it."""
+    name = str(stop.get("name") or "")
+    key = gazetteer.normalize_name(name)
+    coords = stop.get("coords") if gazetteer.valid_coords(stop.get("coords")) else None
+    desc, image = stop.get("desc"), stop.get("image")
+    best = None
+    for place_id, lat, lon, known_desc, known_image in conn.execute(
+            "SELECT id, lat, lon, description, image FROM places WHERE name_key = ?", (key,)):
+        km = gazetteer.haversine_km(coords, (lat, lon)) if coords and lat is not None else 0.0
+        if km <= PLACE_MERGE_KM and (best is None or km < best[0]):
+            best = (km, place_id, lat, known_desc, known_image)
+    if best is None:
+        return conn.execute(
+            "INSERT INTO places (name, name_key, lat, lon, description, image) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, key, *(coords or (None, None)), desc, image)).lastrowid, desc, image
+    _, place_id, lat, known_desc, known_image = best
+    # Fill in what the place was first saved without
+    if (coords and lat is None) or (desc and not known_desc) or (image and not known_image):
+        conn.execute('''
+            UPDATE places SET lat = ifnull(lat, ?), lon = ifnull(lon, ?),
+                              description = ifnull(description, ?), image = ifnull(image, ?)
+            WHERE id = ?
+        ''', (*(coords or (None, None)), desc, image, place_id))
+        known_desc = desc if known_desc is None else known_desc
+        known_image = image if known_image is None else known_image
+    return place_id, known_desc, known_image
+
+def _override(value, known):
+    # A stop's own description or image: NULL when it is the place's, '' when
+    # the stop has none (even if the place has one, now or later)
+    if value is None:
+        return ""
+    return None if value == known else value
+
+def _insert_stops(conn, plan_id, stops):
+    rows = []
+    for seq, stop in enumerate(s for s in stops if isinstance(s, dict)):
+        pricing.price_stop(stop)
+        leg = stop.get("transport_from_prev") if isinstance(stop.get("transport_from_prev"), dict) else {}
+        extra = {k: v for k, v in stop.items() if k not in _STOP_KEYS}
+        place_id, place_desc, place_image = _place(conn, stop)
+        rows.append((plan_id, seq, place_id, _override(stop.get("desc"), place_desc),
+                     _override(stop.get("image"), place_image), stop.get("price"), stop.get("price_cents"),
+                     stop.get("currency"), stop.get("geo"), leg.get("method"), leg.get("duration"),
+                     leg.get("cost"), leg.get("cost_cents"), json.dumps(extra, ensure_ascii=False) if extra else None))
+    conn.executemany('''
+        INSERT INTO plan_stops (plan_id, seq, place_id, description, image, price, price_cents, currency, geo,
+                                leg_method, leg_duration, leg_cost, leg_cost_cents, extra)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+def _import_route_blobs(conn):
+    # Keyset batches, so only IMPORT_BATCH blobs are decoded at a time.
+    # Blobs that aren't a JSON list are left in place.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, route_json FROM plans WHERE id > ? AND route_json IS NOT NULL ORDER BY id LIMIT ?",
+            (last_id, IMPORT_BATCH)).fetchall()
+        if not rows:
+            return
+        for plan_id, route_json in rows:
+            try:
+                stops = json.loads(route_json)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(stops, list):
+                conn.execute("DELETE FROM plan_stops WHERE plan_id = ?", (plan_id,))
+                _insert_stops(conn, plan_id, stops)
+                conn.execute("UPDATE plans SET route_json = NULL WHERE id = ?", (plan_id,))
+        last_id = rows[-1][0]
+
+@metrics.timed()
+def import_route_blobs():
+    """Move routes written straight into plans.route_json (bulk loads) into plan_stops."""
+    with get_connection() as conn:
+        _import_route_blobs(conn)
 
+_STOP_SELECT = '''
+    SELECT plan_id, place_id, description, image, price, price_cents, currency, geo,
+           leg_method, leg_duration, leg_cost, leg_cost_cents, extra
+    FROM plan_stops
+'''
+_PLACE_SELECT = "SELECT id, name, lat, lon, description, image FROM places"
+
+def _stop(r, place):
+    name, lat, lon, desc, image = place
+    # See _override: NULL falls back to the place, '' means none
+    stop = {
+        "name": name,
+        "coords": [lat, lon] if lat is not None else None,
+        "desc": desc if r[2] is None else (r[2] or None),
+        "price": r[4],
+        "price_cents": r[5],
+        "currency": r[6] or pricing.CURRENCY,
+        "transport_from_prev": None
+    }
+    image = image if r[3] is None else r[3]
+    if image:
+        stop["image"] = image
+    if r[7]:
+        stop["geo"] = r[7]
+    if any(v is not None for v in r[8:12]):
+        stop["transport_from_prev"] = {"method": r[8], "duration": r[9], "cost": r[10], "cost_cents": r[11]}
+    if r[12]:
+        stop.update(json.loads(r[12]))
+    return stop
+
+def _chunks(ids):
+    ids = list(ids)
+    return (ids[i:i + IMPORT_BATCH] for i in range(0, len(ids), IMPORT_BATCH))
+
+def _load_routes(conn, plan_ids=None):
+    """{plan_id: [stop, ...]} for the given plans (all plans if None), in route order.
+
+    Places are joined in here rather than in SQL, so each one is decoded once
+    however many stops visit it.
+    """
+    routes = {plan_id: [] for plan_id in plan_ids or ()}
+    if plan_ids is None:
+        rows = conn.execute(f"{_STOP_SELECT} ORDER BY plan_id, seq").fetchall()
+        places = {r[0]: r[1:] for r in conn.execute(_PLACE_SELECT)}
+    else:
+        rows = [r for chunk in _chunks(plan_ids) for r in conn.execute(
+            f"{_STOP_SELECT} WHERE plan_id IN ({','.join('?' * len(chunk))}) ORDER BY plan_id, seq", chunk)]
+        places = {r[0]: r[1:] for chunk in _chunks({r[1] for r in rows}) for r in conn.execute(
+            f"{_PLACE_SELECT} WHERE id IN ({','.join('?' * len(chunk))})", chunk)}
+    for r in rows:
+        routes.setdefault(r[0], []).append(_stop(r, places[r[1]]))
+    return routes
+
+@metrics.timed()
+def save_plan(user_id, username, mood, start_loc, route_data, summary, totals=None):
+    """Save a route; `totals` is pricing.route_totals() for it, computed here if not given."""
+    if totals is None:
+        totals = pricing.route_totals(pricing.price_route(route_data))
+
+    with get_connection() as conn:
+        plan_id = conn.execute('''
+            INSERT INTO plans (user_id, username, mood, start_loc, summary, total_cents, currency)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, username, mood, start_loc, summary, totals["total_cents"], totals["currency"])).lastrowid
+        _insert_stops(conn, plan_id, route_data)
+        _flush_fts(conn)
+    return plan_id
+
+@metrics.timed()
 def add_review(plan_id, post_mood, review_text, rating):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE plans SET post_mood = ?, review_text = ?, rating = ? WHERE id = ?",
-              (post_mood, review_text, rating, plan_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        conn.execute("UPDATE plans SET post_mood = ?, review_text = ?, rating = ? WHERE id = ?",
+                     (post_mood, review_text, rating, plan_id))
+        _flush_fts(conn)
 
+@metrics.timed()
 def get_all_plans():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, username, mood, start_loc, route_json, summary, created_at, post_mood, review_text, rating FROM plans ORDER BY created_at DESC")
-    plans = c.fetchall()
-    conn.close()
+    with get_connection() as conn:
+        plans = conn.execute("SELECT id, username, mood, start_loc, summary, created_at, post_mood, review_text, rating FROM plans ORDER BY created_at DESC").fetchall()
+        routes = _load_routes(conn)
     
     # Convert back to list of dicts
     results = []
@@ -122,73 +775,301 @@ def get_all_plans():
             "username": p[1],
             "mood": p[2],
             "start_loc": p[3],
-            "route": json.loads(p[4]),
-            "summary": p[5],
-            "created_at": p[6],
-            "post_mood": p[7],
-            "review_text": p[8],
-            "rating": p[9]
+            "route": routes.get(p[0], []),
+            "summary": p[4],
+            "created_at": p[5],
+            "post_mood": p[6],
+            "review_text": p[7],
+            "rating": p[8]
         })
     return results
 
-def create_meetup(plan_id, host_id, host_name, meetup_time):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Initial participants list contains only the host
-    participants = json.dumps([host_name])
-    
-    c.execute("INSERT INTO meetups (plan_id, host_id, host_name, meetup_time, participants) VALUES (?, ?, ?, ?, ?)",
-              (plan_id, host_id, host_name, meetup_time, participants))
-    conn.commit()
-    conn.close()
+FEED_PAGE_SIZE = 20
 
-def join_meetup(meetup_id, username):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Get current participants
-    c.execute("SELECT participants FROM meetups WHERE id = ?", (meetup_id,))
-    row = c.fetchone()
-    
-    if row:
-        current_list = json.loads(row[0])
-        if username not in current_list:
-            current_list.append(username)
-            new_list_json = json.dumps(current_list)
-            c.execute("UPDATE meetups SET participants = ? WHERE id = ?", (new_list_json, meetup_id))
-            conn.commit()
-            conn.close()
-            return True
+# Only stop names are joined in, the rest of the route stays in plan_stops.
+# char(31) (unit separator) won't appear in place names.
+_FEED_SELECT = '''
+    SELECT id, username, mood, start_loc, summary, created_at, post_mood, review_text, rating,
+           (SELECT group_concat(name, char(31)) FROM (
+                SELECT pl.name FROM plan_stops s JOIN places pl ON pl.id = s.place_id
+                WHERE s.plan_id = plans.id ORDER BY s.seq
+           )) AS stop_names,
+           total_cents, currency
+    FROM plans
+'''
+
+def _feed_plan(p):
+    return {
+        "id": p[0],
+        "username": p[1],
+        "mood": p[2],
+        "start_loc": p[3],
+        "summary": p[4],
+        "created_at": p[5],
+        "post_mood": p[6],
+        "review_text": p[7],
+        "rating": p[8],
+        "stops": p[9].split("\x1f") if p[9] else [],
+        "total_cents": p[10],
+        "currency": p[11]
+    }
+
+@metrics.timed()
+def get_plans_page(cursor=None, limit=FEED_PAGE_SIZE, mood=None, start_loc=None):
+    """One page of the community feed, newest first.
+
+    `cursor` is the (created_at, id) of the last plan on the previous page, or
+    None for the first page. Returns (plans, next_cursor); next_cursor is None
+    once there is nothing left. Routes are not decoded here: each plan only
+    carries its stop names, use get_plan_route() to load the full route.
+    """
+    where, params = [], []
+    if mood:
+        where.append("mood = ?")
+        params.append(mood)
+    if start_loc:
+        where.append("start_loc = ?")
+        params.append(start_loc)
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(cursor)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
     
-    conn.close()
-    return False
+    query = f'''
+        {_FEED_SELECT}
+        {where_sql}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    '''
+    with get_connection() as conn:
+        rows = conn.execute(query, (*params, limit + 1)).fetchall()
 
-def get_all_meetups():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Join with plans to get route info
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1][5], rows[-1][0]) if has_more else None
+    return [_feed_plan(p) for p in rows], next_cursor
+
+@metrics.timed()
+def get_plan(plan_id):
+    """A single plan in get_plans_page() format (None if it doesn't exist)."""
+    with get_connection() as conn:
+        row = conn.execute(f"{_FEED_SELECT} WHERE id = ?", (plan_id,)).fetchone()
+    return _feed_plan(row) if row else None
+
+SEARCH_CANDIDATES = 500 # Most recent matches ranked per search
+
+@metrics.timed()
+def search_plans(query, filters=None, limit=FEED_PAGE_SIZE):
+    """Plans matching free-text `query`, best match first, in get_plans_page() format.
+
+    `filters` takes the same mood/start_loc keys as get_plans_page(). Stop
+    names and start locations weigh more than the summary and review text.
+    For very common terms only the newest SEARCH_CANDIDATES matches compete.
+    """
+    match = fts_query(query)
+    if match is None:
+        return []
+    filters = filters or {}
+    where, params = ["plans_fts MATCH ?"], [match]
+    for column in ("mood", "start_loc"):
+        if filters.get(column):
+            where.append(f"plans.{column} = ?")
+            params.append(filters[column])
+    join_sql = "JOIN plans ON plans.id = plans_fts.rowid" if len(where) > 1 else ""
+
+    # FTS5 walks matches in rowid order cheaply but has to score every one of
+    # them to sort by rank, so only the newest SEARCH_CANDIDATES matches are
+    # ranked. Stop names are then only pulled for the final hits.
+    query = f'''
+        WITH candidates AS (
+            SELECT plans_fts.rowid AS hit_id,
+                   bm25(plans_fts, 1.0, 1.0, 2.0, 1.0, 2.0) AS score
+            FROM plans_fts {join_sql}
+            WHERE {' AND '.join(where)}
+            ORDER BY plans_fts.rowid DESC
+            LIMIT ?
+        ), hits AS (
+            SELECT hit_id, score FROM candidates ORDER BY score LIMIT ?
+        )
+        {_FEED_SELECT}
+        JOIN hits ON hits.hit_id = plans.id
+        ORDER BY hits.score
+    '''
+    with get_connection() as conn:
+        _flush_fts(conn)
+        conn.commit()
+        rows = conn.execute(query, (*params, SEARCH_CANDIDATES, limit)).fetchall()
+    return [_feed_plan(p) for p in rows]
+
+@metrics.timed()
+def get_plan_route(plan_id):
+    """The full route of a single plan (None if it doesn't exist)."""
+    with get_connection() as conn:
+        if not conn.execute("SELECT 1 FROM plans WHERE id = ?", (plan_id,)).fetchone():
+            return None
+        return _load_routes(conn, [plan_id])[plan_id]
+
+@metrics.timed()
+def get_place_locations():
+    """Every stop name found in saved routes, with its average coordinates.
+
+    Returns rows of (name, lat, lon, desc, uses), used to seed the gazetteer.
+    """
     query = '''
-        SELECT m.id, m.host_name, m.meetup_time, m.participants, m.created_at,
-               p.mood, p.start_loc, p.route_json, p.summary
-        FROM meetups m
-        JOIN plans p ON m.plan_id = p.id
-        ORDER BY m.created_at DESC
+        SELECT pl.name, AVG(pl.lat), AVG(pl.lon), MAX(ifnull(s.description, pl.description)), COUNT(*)
+        FROM plan_stops s
+        JOIN places pl ON pl.id = s.place_id
+        WHERE pl.name != '' AND pl.lat IS NOT NULL
+        GROUP BY pl.name
     '''
-    c.execute(query)
-    rows = c.fetchall()
-    conn.close()
-    
-    results = []
-    for r in rows:
-        results.append({
-            "id": r[0],
-            "host_name": r[1],
-            "meetup_time": r[2],
-            "participants": json.loads(r[3]),
-            "created_at": r[4],
-            "mood": r[5],
-            "start_loc": r[6],
-            "route": json.loads(r[7]),
-            "summary": r[8]
-        })
-    return results
+    with get_connection() as conn:
+        return conn.execute(query).fetchall()
+
+# Community stats come from the aggregate tables kept up to date by the
+# plans_stats_* triggers, so none of these scan plans.
+
+@metrics.timed()
+def get_mood_transitions(mood=None, limit=10):
+    """Most common review outcomes as (mood, post_mood, count), optionally for one mood."""
+    where_sql, params = ("AND mood = ?", [mood]) if mood else ("", [])
+    query = f"SELECT mood, post_mood, count FROM mood_transitions WHERE count > 0 {where_sql} ORDER BY count DESC LIMIT ?"
+    with get_connection() as conn:
+        return conn.execute(query, (*params, limit)).fetchall()
+
+@metrics.timed()
+def get_rating_stats(mood=None, start_loc=None):
+    """(average rating, number of ratings) for reviewed plans, optionally
+    narrowed to a mood and/or start location. The average is None without ratings."""
+    where, params = [], []
+    if mood:
+        where.append("mood = ?")
+        params.append(mood)
+    if start_loc:
+        where.append("start_loc = ?")
+        params.append(start_loc)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    with get_connection() as conn:
+        total, count = conn.execute(f"SELECT SUM(rating_sum), SUM(rating_count) FROM rating_stats {where_sql}",
+                                    params).fetchone()
+    return (total / count if count else None), count or 0
+
+@metrics.timed()
+def get_popular_places(limit=10):
+    """(place, uses) for the stops that appear in the most saved plans."""
+    with get_connection() as conn:
+        return conn.execute("SELECT place, uses FROM place_usage WHERE uses > 0 ORDER BY uses DESC LIMIT ?",
+                            (limit,)).fetchall()
+
+@metrics.timed()
+def create_meetup(plan_id, host_id, host_name, meetup_time):
+    with get_connection() as conn:
+        c = conn.execute("INSERT INTO meetups (plan_id, host_id, host_name, meetup_time) VALUES (?, ?, ?, ?)",
+                         (plan_id, host_id, host_name, meetup_time))
+        # Initial participants list contains only the host
+        conn.execute("INSERT OR IGNORE INTO meetup_participants (meetup_id, user_id) VALUES (?, ?)",
+                     (c.lastrowid, host_id))
+
+@metrics.timed()
+def join_meetup(meetup_id, username):
+    # A single statement, so concurrent joins can't lose each other's writes;
+    # the UNIQUE(meetup_id, user_id) constraint turns repeat joins into no-ops.
+    with get_connection() as conn:
+        c = conn.execute('''
+            INSERT OR IGNORE INTO meetup_participants (meetup_id, user_id)
+            SELECT m.id, u.id FROM meetups m, users u
+            WHERE m.id = ? AND u.username = ?
+        ''', (meetup_id, username))
+    return c.rowcount > 0
+
+# Participants come from the normalized table, in join order
+_MEETUP_SELECT = '''
+    SELECT m.id, m.host_name, m.meetup_time, m.created_at,
+           p.mood, p.start_loc, p.summary,
+           (SELECT COUNT(*) FROM meetup_participants mp WHERE mp.meetup_id = m.id),
+           (SELECT group_concat(username, char(31)) FROM (
+                SELECT ifnull(u.username, mp.guest_name) AS username FROM meetup_participants mp
+                LEFT JOIN users u ON u.id = mp.user_id
+                WHERE mp.meetup_id = m.id
+                ORDER BY mp.joined_at, mp.rowid
+           )),
+           m.plan_id
+    FROM meetups m
+    JOIN plans p ON m.plan_id = p.id
+'''
+
+def _meetup(r, routes=None):
+    meetup = {
+        "id": r[0],
+        "host_name": r[1],
+        "meetup_time": r[2],
+        "created_at": r[3],
+        "mood": r[4],
+        "start_loc": r[5],
+        "summary": r[6],
+        "participant_count": r[7],
+        "participants": r[8].split("\x1f") if r[8] else []
+    }
+    if routes is not None:
+        meetup["route"] = routes.get(r[9], [])
+    return meetup
+
+@metrics.timed()
+def get_all_meetups():
+    with get_connection() as conn:
+        rows = conn.execute(f"{_MEETUP_SELECT} ORDER BY m.created_at DESC").fetchall()
+        routes = _load_routes(conn, {r[9] for r in rows})
+    return [_meetup(r, routes) for r in rows]
+
+@metrics.timed()
+def get_meetups_page(cursor=None, limit=FEED_PAGE_SIZE):
+    """One page of meetups, newest first, with the same cursor contract as
+    get_plans_page(). Routes are not decoded here."""
+    where_sql, params = "", []
+    if cursor:
+        where_sql, params = "WHERE (m.created_at, m.id) < (?, ?)", list(cursor)
+    query = f"{_MEETUP_SELECT} {where_sql} ORDER BY m.created_at DESC, m.id DESC LIMIT ?"
+    with get_connection() as conn:
+        rows = conn.execute(query, (*params, limit + 1)).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1][3], rows[-1][0]) if has_more else None
+    return [_meetup(r) for r in rows], next_cursor
+
+@metrics.timed()
+def get_meetup(meetup_id):
+    """A single meetup in get_meetups_page() format (None if it doesn't exist)."""
+    with get_connection() as conn:
+        row = conn.execute(f"{_MEETUP_SELECT} WHERE m.id = ?", (meetup_id,)).fetchone()
+    return _meetup(row) if row else None
+
+@metrics.timed()
+def get_cached_image(place_key):
+    """Returns (url, fetched_at) from the image cache, or None if absent."""
+    with get_connection() as conn:
+        return conn.execute("SELECT url, fetched_at FROM image_cache WHERE place_key = ?", (place_key,)).fetchone()
+
+@metrics.timed()
+def put_cached_image(place_key, url, fetched_at):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO image_cache (place_key, url, fetched_at) VALUES (?, ?, ?)",
+                     (place_key, url, fetched_at))
+
+@metrics.timed()
+def get_cached_route(cache_key):
+    """Returns (stops_json, summary, gen_seconds, created_at), or None if absent."""
+    with get_connection() as conn:
+        return conn.execute("SELECT stops_json, summary, gen_seconds, created_at FROM route_cache WHERE cache_key = ?",
+                            (cache_key,)).fetchone()
+
+@metrics.timed()
+def put_cached_route(cache_key, stops_json, summary, gen_seconds, created_at, max_entries):
+    with get_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO route_cache (cache_key, stops_json, summary, gen_seconds, created_at) VALUES (?, ?, ?, ?, ?)",
+                     (cache_key, stops_json, summary, gen_seconds, created_at))
+        # Size bound: drop the oldest entries beyond max_entries
+        conn.execute('''
+            DELETE FROM route_cache WHERE cache_key IN (
+                SELECT cache_key FROM route_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
@@ -0,0 +1,198 @@
+import math
+import re
+from collections import defaultdict
+
+# --- Local Gazetteer ---
+# An in-memory index of known Singapore places, so that a name lookup doesn't
+# need a GPT-4o round trip and LLM coordinates can be checked against what we
+# already know. Names are matched by exact normalized form first, then by
+# trigram similarity; coordinates live in a fixed-size lat/lon grid so
+# "what's near here" only looks at neighbouring cells.
+
+# Coordinates for the attractions in TICKET_PRICES (which has no locations)
+LANDMARK_COORDS = {
+    "Gardens by the Bay": [1.2816, 103.8636],
+    "Flower Dome": [1.2840, 103.8646],
+    "Cloud Forest": [1.2839, 103.8658],
+    "Marina Bay Sands Skypark": [1.2834, 103.8607],
+    "ArtScience Museum": [1.2863, 103.8593],
+    "National Museum of Singapore": [1.2966, 103.8485],
+    "National Gallery Singapore": [1.2903, 103.8515],
+    "Singapore Flyer": [1.2893, 103.8631],
+    "Singapore Zoo": [1.4043, 103.7930],
+    "Night Safari": [1.4022, 103.7881],
+    "River Wonders": [1.4039, 103.7903],
+    "Bird Paradise": [1.4034, 103.7851],
+    "S.E.A. Aquarium": [1.2583, 103.8205],
+    "Universal Studios Singapore": [1.2540, 103.8238],
+    "Asian Civilisations Museum": [1.2875, 103.8514],
+}
+
+SG_BOUNDS = (1.15, 1.48, 103.59, 104.10) # lat_min, lat_max, lon_min, lon_max
+GRID_DEG = 0.01 # ~1.1 km grid cells
+MATCH_THRESHOLD = 0.9 # Name similarity needed to trust a local match
+SNAP_KM = 1.0 # LLM coords further than this from a known place get snapped
+NEARBY_KM = 2.0 # Unknown places with no known place this close get flagged
+
+
+def normalize_name(name):
+    return " ".join(re.findall(r"\w+", (name or "").lower()))
+
+
+def _trigrams(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_keys(name):
+    """Normalized lookup keys for a name, including its aliases:
+    "NUS (National University of Singapore)" is also known by either part."""
+    names = [name]
+    match = re.match(r"^(.*?)\s*\((.*)\)\s*$", name or "")
+    if match:
+        names.extend(part for part in match.groups() if part)
+    return [k for k in dict.fromkeys(normalize_name(n) for n in names) if k]
+
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def in_singapore(coords):
+    lat_min, lat_max, lon_min, lon_max = SG_BOUNDS
+    return lat_min <= coords[0] <= lat_max and lon_min <= coords[1] <= lon_max
+
+
+def valid_coords(coords):
+    return (isinstance(coords, (list, tuple)) and len(coords) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in coords))
+
+
+def _cell(coords):
+    return int(math.floor(coords[0] / GRID_DEG)), int(math.floor(coords[1] / GRID_DEG))
+
+
+class NameIndex:
+    """Exact and trigram-similarity lookup of values by name (and aliases)."""
+
+    def __init__(self):
+        self._by_name = {} # normalized name/alias -> value
+        self._alias_grams = [] # alias id -> (value, trigram count)
+        self._trigram_index = defaultdict(list) # trigram -> [alias id]
+
+    def __contains__(self, name):
+        return any(k in self._by_name for k in name_keys(name))
+
+    def add(self, name, value):
+        """Index value under name and its aliases; returns False (and adds
+        nothing) if the name is empty or any of its keys is already taken."""
+        keys = name_keys(name)
+        if not keys or any(k in self._by_name for k in keys):
+            return False
+        for key in keys:
+            self._by_name[key] = value
+            grams = _trigrams(key)
+            alias_id = len(self._alias_grams)
+            self._alias_grams.append((value, len(grams)))
+            for gram in grams:
+                self._trigram_index[gram].append(alias_id)
+        return True
+
+    def lookup(self, name):
+        """Best match for `name` as (value, score in 0..1), or (None, 0.0)."""
+        key = normalize_name(name)
+        if not key:
+            return None, 0.0
+        if key in self._by_name:
+            return self._by_name[key], 1.0
+
+        # Dice coefficient over trigrams, best alias per value
+        grams = _trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for alias_id in self._trigram_index.get(gram, ()):
+                shared[alias_id] += 1
+        best, best_score = None, 0.0
+        for alias_id, count in shared.items():
+            value, n_grams = self._alias_grams[alias_id]
+            score = 2 * count / (len(grams) + n_grams)
+            if score > best_score:
+                best, best_score = value, score
+        return best, best_score
+
+
+class Gazetteer:
+    """Known places with a fuzzy name index and a spatial grid index."""
+
+    def __init__(self):
+        self.places = [] # {"name", "coords", "desc"}
+        self._names = NameIndex() # -> place index
+        self._grid = defaultdict(list) # grid cell -> [place index]
+
+    def __len__(self):
+        return len(self.places)
+
+    def add(self, name, coords, desc=None):
+        """Add a place; names already known (incl. aliases) are ignored, so
+        earlier sources take precedence over later ones."""
+        if not coords or not self._names.add(name, len(self.places)):
+            return
+        coords = [float(coords[0]), float(coords[1])]
+        self._grid[_cell(coords)].append(len(self.places))
+        self.places.append({"name": name, "coords": coords, "desc": desc})
+
+    def lookup(self, name):
+        """Best match for `name` as (place, score in 0..1), or (None, 0.0)."""
+        idx, score = self._names.lookup(name)
+        return (self.places[idx], score) if idx is not None else (None, 0.0)
+
+    def nearby(self, coords, radius_km=1.0):
+        """Places within radius_km of coords, nearest first, as (place, km)."""
+        reach = int(math.ceil(radius_km / (GRID_DEG * 111.0)))
+        ci, cj = _cell(coords)
+        found = []
+        for i in range(ci - reach, ci + reach + 1):
+            for j in range(cj - reach, cj + reach + 1):
+                for idx in self._grid.get((i, j), ()):
+                    dist = haversine_km(coords, self.places[idx]["coords"])
+                    if dist <= radius_km:
+                        found.append((self.places[idx], dist))
+        return sorted(found, key=lambda item: item[1])
+
+    def check_stop(self, stop):
+        """Validate an LLM stop's coords in place.
+
+        Coords far from a confidently matched known place are snapped to it
+        (stop["geo"] = "snapped"). For an unknown place, coords outside
+        Singapore or with no known place within NEARBY_KM are flagged
+        (stop["geo"] = "flagged"). Returns the stop.
+        """
+        coords = stop.get("coords") if valid_coords(stop.get("coords")) else None
+        place, score = self.lookup(stop.get("name"))
+        if place and score >= MATCH_THRESHOLD:
+            if not coords or haversine_km(coords, place["coords"]) > SNAP_KM:
+                stop["coords"] = list(place["coords"])
+                stop["geo"] = "snapped"
+        elif not coords or not in_singapore(coords) or not self.nearby(coords, NEARBY_KM):
+            stop["geo"] = "flagged"
+        return stop
+
+
+def build(ticket_prices, start_locations, place_locations=()):
+    """Build the gazetteer from curated data and places seen in saved plans.
+
+    place_locations are (name, lat, lon, desc, uses) rows as returned by
+    database.get_place_locations(); the most used come first.
+    """
+    gaz = Gazetteer()
+    for name, coords in start_locations.items():
+        gaz.add(name, coords)
+    for name in ticket_prices:
+        if name in LANDMARK_COORDS:
+            gaz.add(name, LANDMARK_COORDS[name])
+    for name, lat, lon, desc, _ in sorted(place_locations, key=lambda row: -row[4]):
+        if lat is not None and lon is not None and in_singapore((lat, lon)):
+            gaz.add(name, (lat, lon), desc)
+    return gaz
@@ -0,0 +1,260 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import database
+import metrics
+
+# --- Image Cache ---
+# Two tiers in front of the Unsplash search API: a small in-process LRU and
+# the image_cache table in SQLite, which survives restarts and is shared by
+# every worker. Both are keyed by normalized place name, so "Gardens by the
+# Bay" and "gardens by the bay!" share one entry. Searches that find nothing
+# are cached too (negative entries), so we don't keep paying for them.
+
+UNSPLASH_SEARCH_URL = "https://api.unsplash.com/search/photos"
+
+IMAGE_TTL = 7 * 24 * 3600  # Found images
+MISS_TTL = 6 * 3600        # Searches with no results
+ERROR_TTL = 60             # Failed requests, memory tier only
+LRU_SIZE = 512
+
+_lru = OrderedDict() # place_key -> (url or None, expires_at)
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0, "api_errors": 0}
+
+# --- Shared Resolver ---
+# One HTTP session (keep-alive, bounded connection pool) and one bounded
+# executor for the whole process instead of a new TLS connection per lookup
+# and a new thread pool per route. Concurrent lookups of the same place are
+# coalesced: the first caller fetches, the others wait on its result.
+
+MAX_WORKERS = 8
+HTTP_POOL_SIZE = 8
+PER_HOST_LIMIT = 4 # Concurrent requests to any single API host
+
+_session = None
+_executor = None
+_inflight = {} # place_key -> Future of the lookup in progress
+_host_slots = {} # netloc -> BoundedSemaphore
+_resolver_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _resolver_lock:
+        if _session is None:
+            # Imported on the first lookup, not when the app starts
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_executor():
+    global _executor
+    with _resolver_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="images")
+        return _executor
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _resolver_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return _host_slots[host]
+
+
+def normalize_place_name(name):
+    return " ".join(re.findall(r"\w+", (name or "").lower()))
+
+
+def placeholder_url(place_name):
+    return f"https://via.placeholder.com/400x300?text={place_name.replace(' ', '+')}"
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+    metrics.incr("image_lookups_total", result=counter)
+
+
+def cache_stats():
+    """Hit/miss counters for this process, plus the overall hit ratio."""
+    with _lock:
+        stats = dict(_stats)
+    hits = stats["memory_hits"] + stats["db_hits"]
+    lookups = hits + stats["misses"]
+    stats["hit_ratio"] = hits / lookups if lookups else 0.0
+    stats["lru_size"] = len(_lru)
+    return stats
+
+
+def _lru_get(key):
+    with _lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return entry
+
+
+def _lru_put(key, url, ttl):
+    with _lock:
+        _lru[key] = (url, time.time() + ttl)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _db_get(key):
+    try:
+        row = database.get_cached_image(key)
+    except sqlite3.Error as e:
+        print(f"Image cache read error: {e}")
+        return None
+    if row is None:
+        return None
+    url, fetched_at = row
+    ttl = IMAGE_TTL if url else MISS_TTL
+    if fetched_at + ttl < time.time():
+        return None
+    return url, fetched_at + ttl
+
+
+def _db_put(key, url):
+    try:
+        database.put_cached_image(key, url, time.time())
+    except sqlite3.Error as e:
+        print(f"Image cache write error: {e}")
+
+
+def search_unsplash(place_name, unsplash_key):
+    """One Unsplash search. Returns the image URL, or None if nothing matched."""
+    params = {
+        "query": f"{place_name} Singapore",
+        "per_page": 1,
+        "orientation": "landscape"
+    }
+    headers = {
+        "Authorization": f"Client-ID {unsplash_key}"
+    }
+    with _host_slot(UNSPLASH_SEARCH_URL), metrics.span("unsplash.search"):
+        resp = _get_session().get(UNSPLASH_SEARCH_URL, params=params, headers=headers, timeout=5).json()
+    if resp.get("results"):
+        # Return small URL for speed
+        return resp["results"][0]["urls"]["small"]
+    return None
+
+
+@metrics.timed()
+def get_place_image(place_name):
+    """Fetch image from Unsplash API, through the memory and SQLite caches."""
+    unsplash_key = os.getenv("UNSPLASH_ACCESS_KEY")
+    if not unsplash_key:
+        return placeholder_url(place_name)
+
+    key = normalize_place_name(place_name)
+    entry = _lru_get(key)
+    if entry is not None:
+        _count("memory_hits")
+    else:
+        entry = _db_get(key)
+        if entry is not None:
+            _count("db_hits")
+            _lru_put(key, entry[0], entry[1] - time.time())
+
+    if entry is not None:
+        url = entry[0]
+        if url is None:
+            _count("negative_hits")
+    else:
+        url = _resolve_once(key, place_name, unsplash_key)
+
+    # Fallback to Placeholder if Unsplash has nothing
+    return url or placeholder_url(place_name)
+
+
+def _resolve_once(key, place_name, unsplash_key):
+    """Single-flight lookup: only one request per place_key is in flight."""
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        _count("coalesced")
+        return future.result()
+
+    try:
+        # Another leader may have finished between our cache check and now
+        entry = _lru_get(key)
+        url = entry[0] if entry is not None else _fetch(key, place_name, unsplash_key)
+        future.set_result(url)
+        return url
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+
+
+def _fetch(key, place_name, unsplash_key):
+    _count("misses")
+    try:
+        url = search_unsplash(place_name, unsplash_key)
+    except Exception as e:
+        print(f"Unsplash Error: {e}")
+        _count("api_errors")
+        # Back off briefly, but don't persist a transient failure
+        _lru_put(key, None, ERROR_TTL)
+        return None
+    _lru_put(key, url, IMAGE_TTL if url else MISS_TTL)
+    _db_put(key, url)
+    return url
+
+
+class ImageLookups:
+    """Image lookups for one request on the shared executor. Each distinct
+    place name is looked up once, starting as soon as a stop is added, so a
+    caller can add stops while it is still receiving them."""
+
+    def __init__(self):
+        self._futures = {} # place name -> Future of its image URL
+
+    def add(self, stops):
+        executor = get_executor()
+        for stop in stops:
+            name = stop.get("name", "")
+            if name not in self._futures:
+                self._futures[name] = executor.submit(get_place_image, name)
+
+    def fill(self, stops):
+        """Set each stop's "image", waiting for lookups still in progress."""
+        for stop in stops:
+            stop["image"] = self._futures[stop.get("name", "")].result()
+        return stops
+
+
+@metrics.timed()
+def fetch_images_parallel(route_data):
+    """Fetch images for all stops in parallel on the shared executor."""
+    lookups = ImageLookups()
+    lookups.add(route_data)
+    return lookups.fill(route_data)
@@ -0,0 +1,149 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Job Queue ---
+# Route generation and AI search wait seconds on GPT-4o. Run inline, that
+# wait holds the session's script thread, so they are submitted here instead:
+# a process-wide pool with a fixed number of workers. The script keeps the
+# job id and polls the Job on later reruns. Identical requests that are
+# already queued or running are coalesced onto one job, and each user can
+# only have a few jobs in flight at a time.
+
+MAX_WORKERS = 4 # Jobs running at once, i.e. concurrent GPT-4o calls
+MAX_QUEUED = 32 # Jobs waiting for a worker, across all users
+MAX_PER_USER = 2 # Jobs one user may have queued or running
+FINISHED_TTL = 600 # Seconds a finished job can still be polled
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    """submit() refused a job: the user or the whole queue is at its limit."""
+
+
+class Job:
+    """Handle on a submitted job.
+
+    `status` goes queued -> running -> done or failed. A running job may
+    publish partial results by appending to `progress`; once finished,
+    `result` or `error` is set.
+    """
+
+    def __init__(self, key, kind=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        self.status = "queued"
+        self.progress = []
+        self.result = None
+        self.error = None
+        self.users = set()
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout."""
+        return self._finished.wait(timeout)
+
+
+class JobQueue:
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED, max_per_user=MAX_PER_USER):
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._lock = threading.Lock()
+        self._jobs = {} # id -> Job, in flight or finished less than FINISHED_TTL ago
+        self._inflight = {} # key -> queued or running Job
+        self._queued = OrderedDict() # id -> Job waiting for a worker, oldest first
+        self._stats = {"submitted": 0, "coalesced": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    def submit(self, key, fn, *args, user=None, kind=None):
+        """Run fn(job, *args) on the pool and return its Job.
+
+        If a job with the same `key` is still queued or running, that job is
+        returned instead and `user` shares its result. Raises QueueFull if
+        `user` already has max_per_user jobs in flight or the queue is full.
+        """
+        with self._lock:
+            self._expire()
+            job = self._inflight.get(key)
+            if job is not None:
+                job.users.add(user)
+                self._stats["coalesced"] += 1
+                return job
+            if user is not None and sum(user in j.users for j in self._inflight.values()) >= self.max_per_user:
+                self._stats["rejected"] += 1
+                raise QueueFull(f"最多同时进行 {self.max_per_user} 个任务，请稍候 (Too many requests in progress)")
+            if len(self._queued) >= self.max_queued:
+                self._stats["rejected"] += 1
+                raise QueueFull("服务器繁忙，请稍后再试 (Server busy, try again shortly)")
+
+            job = Job(key, kind)
+            job.users.add(user)
+            self._jobs[job.id] = self._inflight[key] = self._queued[job.id] = job
+            self._stats["submitted"] += 1
+            self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        with self._lock:
+            self._queued.pop(job.id, None)
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result, error = fn(job, *args), None
+        except Exception as e:
+            result, error = None, e
+        with self._lock:
+            job.result, job.error = result, error
+            job.status = "failed" if error else "done"
+            job.finished_at = time.time()
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            self._stats[job.status] += 1
+        job._finished.set()
+
+    def _expire(self):
+        cutoff = time.time() - FINISHED_TTL
+        for job_id in [i for i, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """The Job with this id, or None if it is unknown or expired."""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """How many queued jobs are ahead of `job` (None once it has started)."""
+        with self._lock:
+            for ahead, job_id in enumerate(self._queued):
+                if job_id == job.id:
+                    return ahead
+        return None
+
+    def stats(self):
+        """Submitted/coalesced/rejected/done/failed counters plus current queue depth."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queued)
+            stats["running"] = len(self._inflight) - len(self._queued)
+        return stats
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
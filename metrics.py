@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter_ns
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Instrumentation ---
+# Timing spans and counters for the slow parts of a request: OpenAI,
+# Unsplash, SQLite and rendering. Span durations go into one histogram per
+# stage (stage_duration_seconds{stage="..."}), failures into
+# stage_errors_total. Everything is in process memory; it can be scraped in
+# Prometheus text format from METRICS_PORT, read with snapshot(), and each
+# span can also be logged as a JSON line.
+#
+# Off unless METRICS_ENABLED is set. Disabled, timed() returns the function
+# itself and span() a shared no-op, so instrumented code costs nothing extra.
+
+ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0) # 0: no endpoint
+
+# Upper bounds in seconds, from a SQLite point query to a slow completion
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DURATION = "stage_duration_seconds"
+ERRORS = "stage_errors_total"
+
+log = logging.getLogger("vibe.metrics")
+if os.getenv("METRICS_LOG"):
+    # One JSON object per line on stderr: {"ts", "stage", "ms", "ok", ...}
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+_log_spans = log.isEnabledFor(logging.INFO) # Checked once, not per span
+
+_BOUNDS_NS = tuple(round(b * 1e9) for b in BUCKETS)
+
+_lock = threading.Lock()
+_histograms = {} # (name, labels) -> Histogram, from observe()
+_counters = {} # (name, labels) -> value
+_server = None
+
+# Span durations don't take _lock: each thread records into its own
+# {stage: Histogram} shard, and export adds the shards up. Shards of threads
+# that have ended are folded into _retired, so Streamlit's new script thread
+# per rerun doesn't pile them up.
+_local = threading.local()
+_shards = [] # (thread, {stage: Histogram}) per thread that has recorded a span
+_retired = {} # stage -> Histogram, from ended threads and stages declared by timed()
+
+
+class Histogram:
+    """Counts per BUCKETS bound (non-cumulative, last slot is +Inf) and the sum, in nanoseconds."""
+
+    __slots__ = ("counts", "sum_ns")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum_ns = 0
+
+    def observe_ns(self, ns):
+        self.counts[bisect_left(_BOUNDS_NS, ns)] += 1
+        self.sum_ns += ns
+
+    def add(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum_ns += other.sum_ns
+
+
+def _quantile(counts, q):
+    """Upper bound of the bucket the q-quantile falls in (None if empty)."""
+    total, seen = sum(counts), 0
+    for bound, n in zip(BUCKETS + (float("inf"),), counts):
+        seen += n
+        if total and seen >= q * total:
+            return bound
+    return None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Add `value` (seconds) to histogram `name`. No-op while disabled."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe_ns(round(value * 1e9))
+
+
+def incr(name, amount=1, **labels):
+    """Add to counter `name`. No-op while disabled."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def _fold_ended():
+    """Move the shards of threads that have ended into _retired. Call with _lock held."""
+    live = []
+    for thread, stages in _shards:
+        if thread.is_alive():
+            live.append((thread, stages))
+            continue
+        for stage, hist in stages.items():
+            _retired.setdefault(stage, Histogram()).add(hist)
+    _shards[:] = live
+
+
+def _thread_histogram(stage):
+    """This thread's Histogram for `stage`, created on first use."""
+    with _lock: # Export iterates the shards under _lock, so they only grow under it too
+        stages = getattr(_local, "stages", None)
+        if stages is None:
+            _fold_ended()
+            stages = _local.stages = {}
+            _shards.append((threading.current_thread(), stages))
+        return stages.setdefault(stage, Histogram())
+
+
+def _log_span(stage, ns, error):
+    entry = {"ts": round(time.time(), 3), "stage": stage, "ms": round(ns / 1e6, 3), "ok": error is None,
+             "thread": threading.current_thread().name}
+    if error is not None:
+        entry["error"] = type(error).__name__
+    log.info(json.dumps(entry, ensure_ascii=False))
+
+
+def _record(stage, ns, error):
+    try:
+        hist = _local.stages[stage]
+    except (AttributeError, KeyError):
+        hist = _thread_histogram(stage)
+    hist.observe_ns(ns)
+    if not isinstance(error, Exception):
+        error = None # st.rerun()/st.stop() and GeneratorExit are control flow, not failures
+    if error is not None:
+        err_key = (ERRORS, (("error", type(error).__name__), ("stage", stage)))
+        with _lock:
+            _counters[err_key] = _counters.get(err_key, 0) + 1
+    if _log_spans:
+        _log_span(stage, ns, error)
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.stage, perf_counter_ns() - self.started, exc)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage):
+    """Context manager timing a block as `stage`."""
+    return _Span(stage) if ENABLED else _NO_SPAN
+
+
+def timed(stage=None):
+    """Decorator timing every call as `stage` (default "module.function").
+
+    Decided when the function is defined: with metrics disabled the
+    function is returned undecorated.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        name = stage or f"{fn.__module__}.{fn.__name__}"
+        with _lock: # Listed from the start, even before the first call
+            _retired.setdefault(name, Histogram())
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = perf_counter_ns()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                _record(name, perf_counter_ns() - started, e)
+                raise
+            # _record's success path, inlined: this runs on every database.py call
+            ns = perf_counter_ns() - started
+            try:
+                hist = _local.stages[name]
+            except (AttributeError, KeyError):
+                hist = _thread_histogram(name)
+            hist.counts[bisect_left(_BOUNDS_NS, ns)] += 1
+            hist.sum_ns += ns
+            if _log_spans:
+                _log_span(name, ns, None)
+            return result
+        return wrapper
+    return decorate
+
+
+# --- Export ---
+
+def _collect():
+    """[(name, labels, counts, sum_ns)] for every histogram, span shards added up."""
+    with _lock:
+        _fold_ended()
+        merged = {key: (list(h.counts), h.sum_ns) for key, h in _histograms.items()}
+        for stages in [_retired] + [stages for _, stages in _shards]:
+            for stage, hist in stages.items():
+                key = (DURATION, (("stage", stage),))
+                counts, total = merged.get(key, ([0] * (len(BUCKETS) + 1), 0))
+                merged[key] = ([a + b for a, b in zip(counts, hist.counts)], total + hist.sum_ns)
+    return sorted((name, labels, counts, total) for (name, labels), (counts, total) in merged.items())
+
+
+def snapshot():
+    """Every histogram and counter as plain data, for JSON."""
+    histograms = _collect()
+    with _lock:
+        counters = [(name, labels, value) for (name, labels), value in _counters.items()]
+    result = {"ts": round(time.time(), 3), "histograms": [], "counters": []}
+    for name, labels, counts, total_ns in histograms:
+        count, total = sum(counts), total_ns / 1e9
+        result["histograms"].append({
+            "name": name, "labels": dict(labels), "count": count, "sum": round(total, 6),
+            "mean_ms": round(total / count * 1000, 3) if count else None,
+            "p50_le": _quantile(counts, 0.5), "p95_le": _quantile(counts, 0.95), "p99_le": _quantile(counts, 0.99),
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], counts)),
+        })
+    for name, labels, value in sorted(counters):
+        result["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    return result
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """Everything in the Prometheus text exposition format (0.0.4)."""
+    histograms = _collect()
+    with _lock:
+        counters = sorted(_counters.items())
+    lines, typed = [], set()
+    for name, labels, counts, total_ns in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total_ns / 1e9:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Zero everything (histograms stay registered, so decorated functions keep recording)."""
+    with _lock:
+        shards = [_histograms, _retired] + [stages for _, stages in _shards]
+        for hist in (hist for stages in shards for hist in stages.values()):
+            hist.counts = [0] * len(hist.counts)
+            hist.sum_ns = 0
+        _counters.clear()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot(), ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics and /metrics.json on a daemon thread, once per process.
+
+    Streamlit owns the app's HTTP server, so the endpoint gets its own port.
+    Returns the port, or None if metrics are disabled or no port is set.
+    """
+    global _server
+    if not ENABLED or not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server.server_address[1]
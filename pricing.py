@@ -0,0 +1,116 @@
+import functools
+import re
+from collections import namedtuple
+
+import gazetteer
+
+# --- Price Model ---
+# Stop prices and leg costs arrive as free text from the LLM ("SGD $2.50",
+# "Free", "Est. S$12"). They are parsed once, when a route is created or
+# loaded, into integer cents: stop["price_cents"] / stop["currency"] and
+# leg["cost_cents"], with None for "unknown". The text is kept for display.
+# Attractions in TICKET_PRICES are priced from the catalog rather than from
+# whatever the LLM copied.
+
+CURRENCY = "SGD"
+CURRENCIES = ("SGD", "USD", "MYR", "EUR", "GBP", "CNY")
+
+Money = namedtuple("Money", "cents currency")
+
+_AMOUNT = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?")
+_FREE = re.compile(r"\bfree\b|免费", re.IGNORECASE)
+_CODE = re.compile(r"\b(" + "|".join(CURRENCIES) + r")\b|\b(RMB)\b", re.IGNORECASE)
+
+
+def parse_money(text):
+    """Money for a price string, or None if it names no amount ("Check On-site").
+
+    Only the first amount counts, so a range like "SGD $10-15" is its low end.
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return Money(round(text * 100), CURRENCY)
+    text = str(text)
+    match = _AMOUNT.search(text)
+    if not match:
+        return Money(0, CURRENCY) if _FREE.search(text) else None
+    cents = int(match.group(1).replace(",", "")) * 100 + int((match.group(2) or "0").ljust(2, "0"))
+    code = _CODE.search(text)
+    currency = CURRENCY if not code else ("CNY" if code.group(2) else code.group(1).upper())
+    return Money(cents, currency)
+
+
+def format_cents(cents, currency=CURRENCY):
+    """"SGD $53" / "SGD $2.50", the way TICKET_PRICES writes prices."""
+    if cents % 100:
+        return f"{currency} ${cents / 100:.2f}"
+    return f"{currency} ${cents // 100}"
+
+
+class PriceCatalog:
+    """Known ticket prices, parsed once, looked up by fuzzy stop name."""
+
+    def __init__(self, ticket_prices):
+        self._names = gazetteer.NameIndex()
+        for name, price in ticket_prices.items():
+            money = parse_money(price)
+            if money is not None:
+                self._names.add(name, (price, money))
+
+    def lookup(self, name):
+        """(price text, Money) for a confidently matched attraction, or None."""
+        value, score = self._names.lookup(name)
+        return value if score >= gazetteer.MATCH_THRESHOLD else None
+
+
+@functools.lru_cache(maxsize=1)
+def default_catalog():
+    from constants import TICKET_PRICES
+    return PriceCatalog(TICKET_PRICES)
+
+
+def price_stop(stop, catalog=None):
+    """Fill in stop["price_cents"] and its leg's "cost_cents" in place.
+
+    Fields that are already there are left alone, so this is cheap to call
+    again on a route that was priced before. Returns the stop.
+    """
+    if "price_cents" not in stop:
+        known = (catalog or default_catalog()).lookup(stop.get("name"))
+        if known:
+            stop["price"], money = known
+        else:
+            money = parse_money(stop.get("price"))
+        stop["price_cents"] = money.cents if money else None
+        stop["currency"] = money.currency if money else CURRENCY
+    leg = stop.get("transport_from_prev")
+    if isinstance(leg, dict) and "cost_cents" not in leg:
+        money = parse_money(leg.get("cost"))
+        leg["cost_cents"] = money.cents if money and money.currency == CURRENCY else None
+    return stop
+
+
+def price_route(stops, catalog=None):
+    for stop in stops:
+        price_stop(stop, catalog)
+    return stops
+
+
+def route_totals(stops):
+    """Ticket, transport and overall totals in cents for a priced route.
+
+    Prices in another currency or without an amount aren't added up; they
+    are counted in "unpriced" instead.
+    """
+    tickets = transport = unpriced = 0
+    for stop in stops:
+        if stop.get("price_cents") is not None and stop.get("currency", CURRENCY) == CURRENCY:
+            tickets += stop["price_cents"]
+        else:
+            unpriced += 1
+        leg = stop.get("transport_from_prev")
+        if isinstance(leg, dict) and leg.get("cost_cents"):
+            transport += leg["cost_cents"]
+    return {"tickets_cents": tickets, "transport_cents": transport, "total_cents": tickets + transport,
+            "currency": CURRENCY, "unpriced": unpriced}
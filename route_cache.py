@@ -0,0 +1,80 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import database
+
+# --- Route Cache ---
+# Most route requests are the same few combinations of start location, mood,
+# duration and museum toggle with no custom preference, so finished routes are
+# kept in the route_cache table and served again instead of calling GPT-4o.
+# Durations are bucketed to the nearest half hour so the slider doesn't
+# fragment the cache.
+
+ROUTE_TTL = 24 * 3600
+MAX_ENTRIES = 500
+DURATION_BUCKET = 0.5 # hours
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0}
+
+
+def normalize_pref(custom_pref):
+    return " ".join((custom_pref or "").lower().split())
+
+
+def make_key(start_loc, mood, duration, include_museums, custom_pref, variants=1):
+    bucket = round(float(duration) / DURATION_BUCKET) * DURATION_BUCKET
+    parts = [start_loc, mood, bucket, bool(include_museums), normalize_pref(custom_pref)]
+    if variants > 1:
+        parts.append(variants) # Single routes keep the keys they always had
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+def _count(counter, amount=1):
+    with _lock:
+        _stats[counter] += amount
+
+
+def cache_stats():
+    """Hit/miss counters for this process, the hit ratio and GPT time saved."""
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def get(cache_key):
+    """Returns (stops, summary) for a fresh cache entry, or None. Entries for
+    several variants hold ([{"stops", "summary"}, ...], None)."""
+    started = time.perf_counter()
+    try:
+        row = database.get_cached_route(cache_key)
+    except sqlite3.Error as e:
+        print(f"Route cache read error: {e}")
+        row = None
+    if row is None or row[3] + ROUTE_TTL < time.time():
+        _count("misses")
+        return None
+
+    stops_json, summary, gen_seconds, _ = row
+    _count("hits")
+    _count("saved_seconds", max((gen_seconds or 0) - (time.perf_counter() - started), 0))
+    # Decoded fresh on every hit, so callers can mutate the stops freely
+    return json.loads(stops_json), summary
+
+
+def put(cache_key, stops, summary, gen_seconds):
+    try:
+        database.put_cached_route(cache_key, json.dumps(stops, ensure_ascii=False), summary,
+                                  gen_seconds, time.time(), MAX_ENTRIES)
+    except sqlite3.Error as e:
+        print(f"Route cache write error: {e}")
+
+
+def bypass():
+    """Record a request that skipped the cache lookup ("fresh" generation)."""
+    _count("bypassed")
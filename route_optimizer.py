@@ -0,0 +1,215 @@
+import numpy as np
+
+# --- Route Optimizer ---
+# The stop order from the LLM (and stops appended from search) often zig-zags
+# across the island. This reorders stops to shorten the total path from the
+# start location: nearest neighbour for a first tour, then 2-opt and Or-opt
+# moves until nothing improves. All distances come from one NumPy haversine
+# matrix and each improvement pass is evaluated as a whole array at once, so
+# 50+ stops take milliseconds.
+#
+# The path is open (it doesn't return to the start). Internally a dummy end
+# node at zero distance from everything turns it into a path with two fixed
+# endpoints, which keeps the 2-opt/Or-opt bookkeeping uniform.
+
+EARTH_RADIUS_KM = 6371.0
+MAX_PASSES = 200
+
+# Rough leg estimates for reordered stops, whose LLM-written legs no longer apply
+WALK_MAX_KM = 1.2
+WALK_KMH = 4.5
+MRT_MAX_KM = 8.0
+
+
+def distance_matrix(points):
+    """Pairwise haversine distances (km) between [lat, lon] points."""
+    pts = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lat, lon = pts[:, 0], pts[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def path_length(dist, path):
+    path = np.asarray(path)
+    return float(dist[path[:-1], path[1:]].sum())
+
+
+def _augmented(points, origin):
+    # Node 0 is the origin (or a free dummy start), nodes 1..n the stops and
+    # node n+1 a dummy end; dummies are zero distance from everything.
+    n = len(points)
+    dist = np.zeros((n + 2, n + 2))
+    if origin is not None:
+        dist[:n + 1, :n + 1] = distance_matrix([origin] + list(points))
+    else:
+        dist[1:n + 1, 1:n + 1] = distance_matrix(points)
+    return dist
+
+
+def _nearest_neighbour(dist, n):
+    path, unvisited = [0], np.ones(n + 2, dtype=bool)
+    unvisited[[0, n + 1]] = False
+    for _ in range(n):
+        row = np.where(unvisited, dist[path[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        path.append(nxt)
+        unvisited[nxt] = False
+    return np.array(path + [n + 1])
+
+
+def _two_opt_pass(dist, path):
+    # Reversing path[i..j] swaps edges (a,b),(c,d) for (a,c),(b,d)
+    m = len(path) - 2
+    if m < 2:
+        return path, False
+    a, b = path[:-2], path[1:-1] # i = 1..m
+    c, d = path[1:-1], path[2:]  # j = 1..m
+    delta = (dist[a[:, None], c[None, :]] + dist[b[:, None], d[None, :]]
+             - dist[a, b][:, None] - dist[c, d][None, :])
+    delta[np.tril_indices(m)] = 0.0
+    i, j = np.unravel_index(np.argmin(delta), delta.shape)
+    if delta[i, j] >= -1e-9:
+        return path, False
+    i, j = i + 1, j + 1
+    path = path.copy()
+    path[i:j + 1] = path[i:j + 1][::-1]
+    return path, True
+
+
+def _or_opt_pass(dist, path):
+    # Move a segment of 1-3 stops (optionally reversed) to its best other gap
+    n_inner = len(path) - 2
+    best = (-1e-9, None)
+    for seg_len in (1, 2, 3):
+        for i in range(1, n_inner - seg_len + 2):
+            seg_start, seg_end = path[i], path[i + seg_len - 1]
+            prev, nxt = path[i - 1], path[i + seg_len]
+            removal_gain = dist[prev, seg_start] + dist[seg_end, nxt] - dist[prev, nxt]
+            rest = np.concatenate([path[:i], path[i + seg_len:]])
+            left, right = rest[:-1], rest[1:]
+            forward = dist[left, seg_start] + dist[seg_end, right] - dist[left, right]
+            backward = dist[left, seg_end] + dist[seg_start, right] - dist[left, right]
+            for reverse, cost in ((False, forward), (True, backward)):
+                k = int(np.argmin(cost))
+                delta = cost[k] - removal_gain
+                if delta < best[0]:
+                    best = (delta, (i, seg_len, k, reverse))
+    if best[1] is None:
+        return path, False
+    i, seg_len, k, reverse = best[1]
+    segment = path[i:i + seg_len]
+    if reverse:
+        segment = segment[::-1]
+    rest = np.concatenate([path[:i], path[i + seg_len:]])
+    return np.concatenate([rest[:k + 1], segment, rest[k + 1:]]), True
+
+
+def optimize_order(points, origin=None):
+    """Order `points` ([lat, lon] each) to shorten the open path from origin.
+
+    Returns a list of indices into points. With origin=None the path may
+    start at whichever point is best.
+    """
+    n = len(points)
+    if n < 2:
+        return list(range(n))
+    dist = _augmented(points, origin)
+    path = _nearest_neighbour(dist, n)
+    for _ in range(MAX_PASSES):
+        path, improved = _two_opt_pass(dist, path)
+        if improved:
+            continue
+        path, improved = _or_opt_pass(dist, path)
+        if not improved:
+            break
+    return [int(node) - 1 for node in path[1:-1]]
+
+
+def cheapest_insertion(points, new_point, origin=None):
+    """Index in points at which inserting new_point adds the least distance."""
+    if not points:
+        return 0
+    nodes = ([origin] if origin is not None else []) + list(points) + [new_point]
+    dist = distance_matrix(nodes)
+    new = len(nodes) - 1
+    # costs[k]: insert right after path node k (the last one means append)
+    k = np.arange(new - 1)
+    costs = np.append(dist[k, new] + dist[new, k + 1] - dist[k, k + 1], dist[new - 1, new])
+    if origin is None:
+        # Without an origin the new point may also become the first stop
+        costs = np.insert(costs, 0, dist[new, 0])
+    # Either way costs[i] now means "insert at points[i]"
+    return int(np.argmin(costs))
+
+
+def estimate_leg(km):
+    """A rough transport_from_prev for a leg of `km`, in the LLM's format."""
+    if km <= WALK_MAX_KM:
+        return {"method": "步行", "duration": f"{max(1, round(km / WALK_KMH * 60))} mins", "cost": "SGD $0"}
+    if km <= MRT_MAX_KM:
+        return {"method": "地铁", "duration": f"{round(8 + km / 30 * 60)} mins", "cost": f"SGD ${1.2 + 0.1 * km:.2f}"}
+    return {"method": "Taxi/Grab", "duration": f"{round(5 + km / 35 * 60)} mins", "cost": f"SGD ${4 + 0.7 * km:.2f}"}
+
+
+def _coords_ok(stop):
+    coords = stop.get("coords")
+    return isinstance(coords, (list, tuple)) and len(coords) == 2
+
+
+def optimize_route(stops, origin=None, leg_for=None):
+    """Reorder route stops in place of the LLM order.
+
+    Stops without coordinates keep their relative order at the end. Legs
+    whose previous stop changed are replaced with leg_for(prev, stop) (e.g. a
+    travel matrix lookup) or, failing that, estimate_leg(). Returns
+    (new_stops, km_before, km_after).
+    """
+    located = [s for s in stops if _coords_ok(s)]
+    unlocated = [s for s in stops if not _coords_ok(s)]
+    if len(located) < 2:
+        return list(stops), 0.0, 0.0
+
+    points = [s["coords"] for s in located]
+    dist = _augmented(points, origin)
+    n = len(located)
+    before = path_length(dist, [0] + list(range(1, n + 1)) + [n + 1])
+    order = optimize_order(points, origin)
+    after = path_length(dist, [0] + [i + 1 for i in order] + [n + 1])
+    if after >= before - 1e-9:
+        return list(stops), before, before
+
+    new_stops = [dict(located[i]) for i in order] + unlocated
+    _refresh_legs(new_stops, stops, leg_for)
+    return new_stops, before, after
+
+
+def insert_stop(stops, new_stop, origin=None, leg_for=None):
+    """Insert new_stop at its cheapest position; returns the new stop list."""
+    located = [s for s in stops if _coords_ok(s)]
+    if not _coords_ok(new_stop) or len(located) != len(stops):
+        return list(stops) + [new_stop]
+    pos = cheapest_insertion([s["coords"] for s in stops], new_stop["coords"], origin)
+    new_stops = [dict(s) for s in stops[:pos]] + [dict(new_stop)] + [dict(s) for s in stops[pos:]]
+    _refresh_legs(new_stops, stops, leg_for)
+    return new_stops
+
+
+def _refresh_legs(new_stops, old_stops, leg_for=None):
+    # Keep the LLM's leg where the predecessor is unchanged, estimate the rest
+    old_prev = {s.get("name"): (old_stops[i - 1].get("name") if i else None) for i, s in enumerate(old_stops)}
+    for i, stop in enumerate(new_stops):
+        if i == 0:
+            stop["transport_from_prev"] = None
+            continue
+        prev = new_stops[i - 1]
+        name = stop.get("name")
+        if name in old_prev and old_prev[name] == prev.get("name") and stop.get("transport_from_prev"):
+            continue
+        leg = leg_for(prev, stop) if leg_for else None
+        if leg is None and _coords_ok(stop) and _coords_ok(prev):
+            km = float(distance_matrix([prev["coords"], stop["coords"]])[0, 1])
+            leg = estimate_leg(km)
+        if leg is not None:
+            stop["transport_from_prev"] = leg
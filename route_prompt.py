@@ -0,0 +1,128 @@
+import gazetteer
+from constants import TICKET_PRICES
+
+# --- Route Prompt ---
+# The route request is split in two messages. The system message holds the
+# instructions and a compact JSON schema; it is a constant, so it is the
+# same bytes on every call and provider-side prompt caching can reuse it.
+# Everything that varies goes in the user message: the request itself and a
+# short list of candidate attractions with their ticket prices, picked for
+# the start location, mood and museum toggle instead of the whole
+# TICKET_PRICES catalog. Prices of known attractions are overwritten from
+# the catalog afterwards anyway (see pricing.price_stop), so the list only
+# has to steer the choice of stops. Several route variants can be asked for
+# in one completion; a place repeated in a later variant is only named, and
+# expand_repeats() copies its details back in.
+
+SYSTEM_PROMPT = (
+    "You are a Singapore travel guide. Reply with JSON only, shaped like:\n"
+    '{"stops":[{"name":"","coords":[lat,lon],"desc":"","price":"",'
+    '"transport_from_prev":{"method":"","duration":"","cost":""}}],"summary":""}\n'
+    "- 3-5 stops in visiting order, with accurate GPS coords.\n"
+    "- desc: short and engaging, in Chinese. summary: one sentence on the vibe, in Chinese.\n"
+    '- price: "Free" or "SGD $N"; use the listed ticket price for candidates, estimate otherwise.\n'
+    '- transport_from_prev: null for the first stop; method in Chinese (步行/巴士/地铁/打车), '
+    'duration like "10 mins", cost like "SGD $2.50".\n'
+    '- If asked for several routes, reply {"routes":[route, ...]} with routes shaped as above and clearly different. '
+    'A place already written out in an earlier route may be given as just {"name":"","transport_from_prev":...}.'
+)
+
+MAX_CANDIDATES = 5
+EXTRA_CANDIDATES_PER_VARIANT = 2 # Room for the variants to differ
+KM_PER_HOUR = 3.0 # How far a route may reach from its start per hour of duration
+MIN_REACH_KM = 4.0
+MUSEUM_TAGS = {"museum", "heritage"}
+
+# What each ticketed attraction is good for, matched against MOOD_TAGS
+PLACE_TAGS = {
+    "Gardens by the Bay": {"nature", "views", "calm", "iconic"},
+    "Flower Dome": {"nature", "indoor", "calm"},
+    "Cloud Forest": {"nature", "indoor", "calm"},
+    "Marina Bay Sands Skypark": {"views", "iconic", "night"},
+    "ArtScience Museum": {"museum", "art", "indoor"},
+    "National Museum of Singapore": {"museum", "heritage", "indoor"},
+    "National Gallery Singapore": {"museum", "art", "indoor", "calm"},
+    "Singapore Flyer": {"views", "night", "iconic"},
+    "Singapore Zoo": {"nature", "family", "active"},
+    "Night Safari": {"nature", "night", "family"},
+    "River Wonders": {"nature", "family", "calm"},
+    "Bird Paradise": {"nature", "family", "active"},
+    "S.E.A. Aquarium": {"indoor", "family", "calm"},
+    "Universal Studios Singapore": {"thrill", "family", "active"},
+    "Asian Civilisations Museum": {"museum", "heritage", "indoor"},
+}
+
+MOOD_TAGS = {
+    "Chill (休闲)": {"nature", "calm", "views"},
+    "Energetic (活力)": {"active", "thrill", "views"},
+    "Foodie (美食)": {"night", "iconic"},
+    "Melancholy (忧郁)": {"calm", "art", "heritage"},
+    "Cultural (文化)": {"museum", "heritage", "art"},
+}
+
+
+def candidates(start_coords, mood, duration, include_museums, limit=MAX_CANDIDATES):
+    """[(name, price, km from start)] of ticketed attractions worth offering
+    for this request, best match first.
+
+    An attraction qualifies if it is within reach for the duration and has
+    a tag the mood (or the museum toggle) asks for. With the toggle on, the
+    nearest museum is always offered, even out of reach.
+    """
+    wanted = set(MOOD_TAGS.get(mood, ()))
+    if include_museums:
+        wanted |= MUSEUM_TAGS
+    reach = max(MIN_REACH_KM, float(duration) * KM_PER_HOUR)
+    scored, museums = [], []
+    for name, price in TICKET_PRICES.items():
+        coords = gazetteer.LANDMARK_COORDS.get(name)
+        if coords is None:
+            continue
+        km = gazetteer.haversine_km(start_coords, coords)
+        tags = PLACE_TAGS.get(name, set())
+        if tags & MUSEUM_TAGS:
+            museums.append((km, name, price))
+        matches = len(tags & wanted)
+        if matches and km <= reach:
+            scored.append((-matches, km, name, price))
+    picked = [(name, price, km) for _, km, name, price in sorted(scored)[:limit]]
+    if include_museums and museums and not any(PLACE_TAGS[name] & MUSEUM_TAGS for name, _, _ in picked):
+        km, name, price = min(museums)
+        picked = picked[:limit - 1] + [(name, price, km)]
+    return picked
+
+
+def build_user_prompt(start_loc, start_coords, mood, duration, include_museums, custom_pref, variants=1):
+    """The per-request message that goes after SYSTEM_PROMPT."""
+    lines = [
+        f"Start: {start_loc} {list(start_coords)}",
+        f"Mood: {mood}",
+        f"Duration: {duration} hours",
+    ]
+    if include_museums:
+        lines.append("Include at least one museum or heritage site.")
+    if custom_pref:
+        lines.append(f"Preferences: {custom_pref}")
+    if variants > 1:
+        lines.append(f"Routes: {variants} different options")
+    picked = candidates(start_coords, mood, duration, include_museums,
+                        MAX_CANDIDATES + EXTRA_CANDIDATES_PER_VARIANT * (variants - 1))
+    if picked:
+        lines.append("Candidate attractions (name | ticket | km from start):")
+        lines.extend(f"- {name} | {price} | {km:.1f}" for name, price, km in picked)
+    return "\n".join(lines)
+
+
+def expand_repeats(stops, seen):
+    """Fill in stops given by name only from the first full stop of that name.
+
+    `seen` maps names to full stops across the variants read so far; new
+    full stops are added to it. Returns the stops.
+    """
+    for i, stop in enumerate(stops):
+        name = stop.get("name")
+        if stop.get("coords") or stop.get("desc"):
+            seen.setdefault(name, stop)
+        elif name in seen:
+            stops[i] = {**seen[name], "transport_from_prev": stop.get("transport_from_prev")}
+    return stops
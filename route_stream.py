@@ -0,0 +1,70 @@
+import json
+
+# --- Incremental Route Parser ---
+# With streaming completions the route JSON arrives a few characters at a
+# time. StopStreamParser scans each chunk once and hands back every object of
+# the top-level "stops" array as soon as its closing brace arrives, so the UI
+# (and image lookups) can start on stop 1 while the model is still writing
+# stop 3.
+
+
+class StopStreamParser:
+    """Pulls completed stops out of a streaming {"stops": [...], ...} document."""
+
+    def __init__(self, key="stops"):
+        self.key = key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None # Most recent string at depth 1 (candidate key)
+        self._in_stops = False
+        self._stop_start = None
+
+    def feed(self, chunk):
+        """Consume the next chunk of text; returns the stops it completed."""
+        self._text += chunk
+        completed = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._last_string == self.key:
+                    self._in_stops = True
+                elif ch == "{" and self._in_stops and self._depth == 2:
+                    self._stop_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if ch == "}" and self._in_stops and self._depth == 2 and self._stop_start is not None:
+                    try:
+                        completed.append(json.loads(text[self._stop_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass # Malformed stop, the full document parse decides
+                    self._stop_start = None
+                elif ch == "]" and self._in_stops and self._depth == 1:
+                    self._in_stops = False
+            elif ch == "," and self._depth == 1:
+                self._last_string = None
+        self._pos = len(text)
+        return completed
+
+    def document(self):
+        """Parse everything received so far as one JSON document."""
+        return json.loads(self._text)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def use_db(monkeypatch):
+    """Point the database module at `path` for the rest of the test."""
+    def use(path):
+        database.close_connections()
+        monkeypatch.setattr(database, "DB_NAME", str(path))
+        monkeypatch.setattr(database, "_migrated", set())
+        return str(path)
+
+    yield use
+    database.close_connections()
+
+
+@pytest.fixture
+def fresh_db(tmp_path, use_db):
+    """An empty, fully migrated database of its own."""
+    use_db(tmp_path / "test.db")
+    database.init_db()
+    return database.DB_NAME
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+import stripe
+
+import checkout
+from benchmarks import standins
+
+SUCCESS_URL = "http://localhost:8501/?success=true&session_id={CHECKOUT_SESSION_ID}"
+CANCEL_URL = "http://localhost:8501/?canceled=true"
+ITEMS = [("Gardens by the Bay", 2800), ("Singapore Zoo", 4800)]
+
+
+@pytest.fixture
+def apis(monkeypatch):
+    """The Stripe stand-in, taking 50 ms per create, with no carts remembered."""
+    with standins.StandIns(stripe=standins.Profile(0.05)) as apis:
+        monkeypatch.setattr(stripe, "api_base", apis.stripe_api_base)
+        monkeypatch.setattr(stripe, "api_key", "sk_test_checkout")
+        monkeypatch.setattr(checkout, "_carts", {})
+        yield apis
+
+
+def url(owner="user:1", items=ITEMS):
+    return checkout.checkout_url(stripe, owner, items, SUCCESS_URL, CANCEL_URL)
+
+
+def test_cart_is_reused(apis):
+    first = url()
+    assert url() == first
+    assert url(items=ITEMS[::-1]) == first # Same tickets, other route order
+    assert checkout.cached_url("user:1", ITEMS[::-1]) == first
+    assert url(owner="user:2") != first
+    assert url(items=ITEMS[:1]) != first
+    assert apis.stats["stripe_requests"] == apis.stats["checkout_sessions"] == 3
+
+
+def test_retried_create_replays_the_session(apis):
+    first = url()
+    # As if Stripe's response had been lost: the entry keeps its idempotency key
+    cart = checkout._carts[("user:1", checkout.cart_hash(ITEMS))]
+    cart.session_id = cart.url = None
+    assert url(items=ITEMS[::-1]) == first
+    assert apis.stats["stripe_requests"] == 2
+    assert apis.stats["idempotent_replays"] == 1
+    assert apis.stats["checkout_sessions"] == 1
+
+
+def test_concurrent_clicks_make_one_request(apis):
+    barrier = threading.Barrier(5)
+    urls = []
+
+    def click():
+        barrier.wait()
+        urls.append(url())
+
+    threads = [threading.Thread(target=click) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(urls) == 5 and len(set(urls)) == 1
+    assert apis.stats["stripe_requests"] == 1
+
+
+def test_expiring_session_is_replaced(apis):
+    first = url()
+    # Less than MIN_TIME_TO_PAY left on the session
+    checkout._carts[("user:1", checkout.cart_hash(ITEMS))].expires_at = int(time.time()) + checkout.MIN_TIME_TO_PAY - 1
+    assert checkout.cached_url("user:1", ITEMS) is None
+    second = url()
+    assert second != first
+    assert apis.stats["checkout_sessions"] == 2
+    assert apis.stats["idempotent_replays"] == 0
+
+
+def test_forget_paid_session(apis):
+    first = url()
+    checkout.forget(None) # No session_id in the return URL
+    assert url() == first
+    (paid,) = apis.checkout_sessions
+    checkout.forget(paid)
+    assert checkout.cached_url("user:1", ITEMS) is None
+    assert url() != first
+    assert apis.stats["checkout_sessions"] == 2
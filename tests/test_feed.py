@@ -0,0 +1,63 @@
+import database
+
+MOODS = ["Chill (休闲)", "Foodie (美食)"]
+STARTS = ["MBS (Marina Bay Sands)", "Changi Airport"]
+
+
+def seed(n, created_at=None):
+    """n plans alternating moods and start locations; all saved in the same
+    second unless `created_at` maps a plan number to a timestamp."""
+    for i in range(n):
+        route = [{"name": f"Stop {i}.{j}", "coords": [1.28, 103.85], "desc": "", "price": "Free"} for j in range(3)]
+        database.save_plan(1, "tester", MOODS[i % 2], STARTS[i // 2 % 2], route, f"Plan {i}")
+    with database.get_connection() as conn:
+        ids = [plan_id for (plan_id,) in conn.execute("SELECT id FROM plans ORDER BY id")]
+        conn.execute("UPDATE plans SET created_at = '2025-01-01 12:00:00'")
+        for i, ts in (created_at or {}).items():
+            conn.execute("UPDATE plans SET created_at = ? WHERE id = ?", (ts, ids[i]))
+    return ids
+
+
+def all_pages(limit, **filters):
+    pages, cursor = [], None
+    while True:
+        plans, cursor = database.get_plans_page(cursor, limit=limit, **filters)
+        pages.append([p["id"] for p in plans])
+        if cursor is None:
+            return pages
+
+
+def test_pages_split_ties_on_created_at(fresh_db):
+    ids = seed(7)
+    pages = all_pages(3)
+    assert pages == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+
+
+def test_pages_newest_first(fresh_db):
+    ids = seed(5, created_at={1: "2025-01-02 09:00:00", 3: "2024-12-31 23:00:00"})
+    order = [i for page in all_pages(2) for i in page]
+    assert order == [ids[1], ids[4], ids[2], ids[0], ids[3]]
+
+
+def test_filters_page_through_matching_plans_only(fresh_db):
+    ids = seed(9)
+    foodie = [i for page in all_pages(2, mood=MOODS[1]) for i in page]
+    assert foodie == [ids[i] for i in (7, 5, 3, 1)]
+    both = [i for page in all_pages(1, mood=MOODS[0], start_loc=STARTS[1]) for i in page]
+    assert both == [ids[i] for i in (6, 2)]
+
+
+def test_page_carries_stop_names_not_routes(fresh_db):
+    ids = seed(2)
+    plans, cursor = database.get_plans_page()
+    assert cursor is None
+    assert plans[0]["stops"] == ["Stop 1.0", "Stop 1.1", "Stop 1.2"]
+    assert "route" not in plans[0]
+    assert [s["name"] for s in database.get_plan_route(ids[0])] == ["Stop 0.0", "Stop 0.1", "Stop 0.2"]
+
+
+def test_exact_multiple_of_page_size(fresh_db):
+    ids = seed(4)
+    assert all_pages(2) == [ids[3:1:-1], ids[1::-1]]
+    plans, cursor = database.get_plans_page(limit=4)
+    assert len(plans) == 4 and cursor is None
@@ -0,0 +1,53 @@
+import pytest
+
+from gazetteer import Gazetteer, haversine_km
+
+MAXWELL = [1.2803, 103.8448]
+GARDENS = [1.2816, 103.8636]
+TUAS = [1.3000, 103.6400] # Nothing known out here
+
+
+@pytest.fixture
+def gaz():
+    gaz = Gazetteer()
+    gaz.add("Maxwell Food Centre", MAXWELL)
+    gaz.add("Gardens by the Bay", GARDENS)
+    gaz.add("NUS (National University of Singapore)", [1.2966, 103.7764])
+    return gaz
+
+
+def test_lookup_exact_alias_and_fuzzy(gaz):
+    assert gaz.lookup("maxwell food centre") == (gaz.places[0], 1.0)
+    assert gaz.lookup("NUS")[0]["name"] == "NUS (National University of Singapore)"
+    place, score = gaz.lookup("Maxwell Food Center")
+    assert place["name"] == "Maxwell Food Centre" and 0.5 < score < 1.0
+    assert gaz.lookup("") == (None, 0.0)
+
+
+def test_nearby_is_nearest_first(gaz):
+    found = gaz.nearby([1.2810, 103.8500], radius_km=3.0)
+    assert [place["name"] for place, _ in found] == ["Maxwell Food Centre", "Gardens by the Bay"]
+    assert gaz.nearby(TUAS, radius_km=3.0) == []
+
+
+def test_known_place_far_away_is_snapped(gaz):
+    stop = gaz.check_stop({"name": "Gardens by the Bay", "coords": MAXWELL})
+    assert stop["coords"] == GARDENS and stop["geo"] == "snapped"
+
+
+def test_known_place_close_enough_is_kept(gaz):
+    coords = [GARDENS[0] + 0.002, GARDENS[1]]
+    stop = gaz.check_stop({"name": "Gardens by the Bay", "coords": coords})
+    assert stop["coords"] == coords and "geo" not in stop
+    assert haversine_km(coords, GARDENS) < 1.0
+
+
+def test_unknown_place_near_known_places_is_kept(gaz):
+    stop = gaz.check_stop({"name": "Some Hawker Stall", "coords": [MAXWELL[0] + 0.005, MAXWELL[1]]})
+    assert "geo" not in stop
+
+
+@pytest.mark.parametrize("coords", [TUAS, [35.68, 139.69], None, ["1.3", 103.8]])
+def test_unknown_place_with_unverifiable_coords_is_flagged(gaz, coords):
+    stop = gaz.check_stop({"name": "Some Hawker Stall", "coords": coords})
+    assert stop["geo"] == "flagged"
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import images
+from benchmarks import standins
+
+
+@pytest.fixture
+def unsplash(fresh_db, monkeypatch):
+    """The Unsplash stand-in, answering each search after 50 ms, with empty image caches."""
+    with standins.StandIns(images=standins.Profile(0.05)) as apis:
+        monkeypatch.setenv("UNSPLASH_ACCESS_KEY", "test")
+        monkeypatch.setattr(images, "UNSPLASH_SEARCH_URL", apis.unsplash_search_url)
+        images._lru.clear()
+        yield apis
+
+
+def test_concurrent_lookups_of_one_place_make_one_request(unsplash):
+    barrier = threading.Barrier(20)
+    urls = []
+
+    def lookup():
+        barrier.wait()
+        urls.append(images.get_place_image("Gardens by the Bay"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert unsplash.stats["image_requests"] == 1
+    assert len(urls) == 20 and len(set(urls)) == 1
+    assert "images.invalid" in urls[0]
+
+
+def test_routes_share_host_limit_and_connections(unsplash):
+    first = [{"name": f"Place {i}"} for i in range(12)]
+    images.fetch_images_parallel(first)
+    assert unsplash.stats["image_requests"] == 12
+    assert unsplash.stats["image_peak_inflight"] == images.PER_HOST_LIMIT
+    connections = unsplash.stats["connections"]
+    assert connections <= images.PER_HOST_LIMIT
+
+    second = [{"name": f"Other Place {i}"} for i in range(12)] + [{"name": "Place 0"}]
+    images.fetch_images_parallel(second)
+    assert unsplash.stats["image_requests"] == 24
+    assert unsplash.stats["image_peak_inflight"] == images.PER_HOST_LIMIT
+    assert unsplash.stats["connections"] == connections # Kept alive from the first route
+    assert all("images.invalid" in stop["image"] for stop in first + second)
+
+
+def test_each_place_is_looked_up_once_per_request(unsplash):
+    lookups = images.ImageLookups()
+    first = [{"name": "Haji Lane"}, {"name": "Merlion Park"}, {"name": "Haji Lane"}]
+    second = [{"name": "Merlion Park"}, {"name": "Fort Canning Park"}]
+    lookups.add(first)
+    lookups.add(second) # e.g. the next variant streaming in
+    lookups.fill(first)
+    lookups.fill(second)
+    assert unsplash.stats["image_requests"] == 3
+    assert first[0]["image"] == first[2]["image"] and second[0]["image"] == first[1]["image"]
+
+
+def test_route_repeating_a_place_looks_it_up_once(unsplash):
+    route = [{"name": "Haji Lane"}, {"name": "Merlion Park"}, {"name": "Haji Lane"}]
+    images.fetch_images_parallel(route)
+    assert unsplash.stats["image_requests"] == 2
+    assert route[0]["image"] == route[2]["image"] != route[1]["image"]
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+import streamlit.logger
+
+import jobs
+import route_cache
+from benchmarks import standins
+from constants import MOODS
+
+START = "MBS (Marina Bay Sands)"
+
+
+class Upstream:
+    """A fake job function: counts calls and peak concurrency, answers after `delay`."""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job, value):
+        with self._lock:
+            self.calls += 1
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            time.sleep(self.delay)
+            job.progress.append(value)
+            if self.fail:
+                raise RuntimeError("upstream failed")
+            return value * 2
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+
+def test_identical_submits_share_one_call():
+    queue, upstream = jobs.JobQueue(), Upstream()
+    submitted = [queue.submit("same", upstream, 21, user=f"user:{i}") for i in range(5)]
+    assert len({job.id for job in submitted}) == 1
+    job = submitted[0]
+    assert job.wait(5)
+    assert (job.status, job.result, job.progress) == ("done", 42, [21])
+    assert job.users == {f"user:{i}" for i in range(5)}
+    assert upstream.calls == 1
+    assert queue.stats()["coalesced"] == 4
+
+
+def test_per_user_limit():
+    queue, upstream = jobs.JobQueue(), Upstream()
+    submitted = [queue.submit(i, upstream, i, user="user:1") for i in range(jobs.MAX_PER_USER)]
+    with pytest.raises(jobs.QueueFull):
+        queue.submit("one more", upstream, 0, user="user:1")
+    queue.submit("one more", upstream, 0, user="user:2") # Other users aren't affected
+    for job in submitted:
+        assert job.wait(5)
+    queue.submit("again", upstream, 0, user="user:1") # Finished jobs no longer count
+    assert queue.stats()["rejected"] == 1
+
+
+def test_backlog_limit():
+    queue, upstream = jobs.JobQueue(max_workers=1, max_queued=2), Upstream(delay=0.2)
+    running = queue.submit("running", upstream, 0)
+    while running.status == "queued":
+        time.sleep(0.01)
+    queued = [queue.submit(i, upstream, i) for i in range(2)]
+    assert [queue.position(job) for job in queued] == [0, 1]
+    with pytest.raises(jobs.QueueFull):
+        queue.submit("overflow", upstream, 0)
+    assert queue.position(running) is None
+
+
+def test_workers_bound_concurrency():
+    queue, upstream = jobs.JobQueue(), Upstream()
+    submitted = [queue.submit(i, upstream, i, user=f"user:{i}") for i in range(3 * jobs.MAX_WORKERS)]
+    for job in submitted:
+        assert job.wait(5) and job.status == "done"
+    assert upstream.calls == len(submitted)
+    assert upstream.peak_inflight == jobs.MAX_WORKERS
+
+
+def test_failure_fails_the_job():
+    queue, upstream = jobs.JobQueue(), Upstream(fail=True)
+    job = queue.submit("key", upstream, 1, user="user:1")
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert isinstance(job.error, RuntimeError) and job.result is None
+    assert queue.stats()["failed"] == 1
+    # The key is free again, so retrying makes a new job
+    upstream.fail = False
+    retry = queue.submit("key", upstream, 1, user="user:1")
+    assert retry.id != job.id
+    assert retry.wait(5) and retry.result == 2
+    assert queue.get(job.id) is job
+
+
+def test_finished_jobs_expire(monkeypatch):
+    queue, upstream = jobs.JobQueue(), Upstream(delay=0)
+    job = queue.submit("key", upstream, 1)
+    assert job.wait(5)
+    monkeypatch.setattr(jobs, "FINISHED_TTL", -1)
+    assert queue.get(job.id) is None
+
+
+# --- route_job against the OpenAI stand-in ---
+
+@pytest.fixture
+def openai(fresh_db, monkeypatch):
+    """The OpenAI stand-in, answering each completion after 100 ms, and the app pointed at it."""
+    with standins.StandIns(chat=standins.Profile(0.1)) as apis:
+        monkeypatch.setenv("OPENAI_BASE_URL", apis.openai_base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.delenv("UNSPLASH_ACCESS_KEY", raising=False)
+        streamlit.logger.set_log_level("error") # No session here, so every st.* call would warn
+        import app
+        app.get_openai_client.clear()
+        yield apis
+        app.get_openai_client.clear()
+
+
+def submit_route(queue, user, mood=MOODS[0], duration=2.0, variants=1):
+    import app
+    key = ("route", route_cache.make_key(START, mood, duration, False, "", variants), True)
+    return queue.submit(key, app.route_job, START, mood, duration, False, "", True, variants, user=user, kind="route_job")
+
+
+def test_identical_routes_share_one_upstream_call(openai):
+    queue = jobs.JobQueue()
+    submitted = [submit_route(queue, f"user:{i}") for i in range(5)]
+    assert len({job.id for job in submitted}) == 1
+    job = submitted[0]
+    assert job.wait(10)
+    assert job.status == "done", job.error
+    assert openai.stats["chat_requests"] == 1
+    assert job.result["variants"][0]["stops"] == job.progress
+
+
+def test_variants_come_from_one_upstream_call(openai):
+    job = submit_route(jobs.JobQueue(), "user:1", variants=3)
+    assert job.wait(10)
+    assert job.status == "done", job.error
+    assert openai.stats["chat_requests"] == 1
+    variants = job.result["variants"]
+    assert 1 < len(variants) <= 3
+    assert [(v["stops"], v["summary"]) for v in variants] == job.progress
+    assert all("image" in stop for v in variants for stop in v["stops"])
+
+
+def test_workers_bound_upstream_concurrency(openai):
+    queue = jobs.JobQueue()
+    submitted = [submit_route(queue, f"user:{i}", mood=mood, duration=duration)
+                 for i, (mood, duration) in enumerate((m, d) for m in MOODS for d in (1.5, 2.0))]
+    assert len(submitted) > jobs.MAX_WORKERS
+    for job in submitted:
+        assert job.wait(10)
+        assert job.status == "done", job.error
+    assert openai.stats["chat_requests"] == len(submitted)
+    assert openai.stats["chat_peak_inflight"] == jobs.MAX_WORKERS
+
+
+def test_upstream_error_fails_route_job(openai):
+    openai.chat.error_rate, openai.chat.error_status = 1.0, 400 # 4xx, so the SDK doesn't retry
+    queue = jobs.JobQueue()
+    job = submit_route(queue, "user:1")
+    assert job.wait(10)
+    assert job.status == "failed"
+    assert job.error is not None and job.result is None
@@ -0,0 +1,50 @@
+import json
+
+import database
+
+
+def user(name):
+    database.register_user(name, "pw")
+    return database.login_user(name, "pw")[0]
+
+
+def plan():
+    database.save_plan(1, "host", "Chill (休闲)", "MBS (Marina Bay Sands)", [{"name": "Merlion Park"}], "summary")
+    with database.get_connection() as conn:
+        return conn.execute("SELECT max(id) FROM plans").fetchone()[0]
+
+
+def meetup(meetup_id):
+    return next(m for m in database.get_all_meetups() if m["id"] == meetup_id)
+
+
+def test_join_meetup(fresh_db):
+    host = user("host")
+    user("alice")
+    database.create_meetup(plan(), host, "host", "明天上午10点")
+    (m,) = database.get_all_meetups()
+    assert database.join_meetup(m["id"], "alice")
+    assert not database.join_meetup(m["id"], "alice") # Already in
+    assert not database.join_meetup(m["id"], "nobody") # No such user
+    assert not database.join_meetup(m["id"] + 1, "alice") # No such meetup
+    m = meetup(m["id"])
+    assert m["participants"] == ["host", "alice"] and m["participant_count"] == 2
+
+
+def test_legacy_participants_are_kept(fresh_db):
+    host = user("host")
+    user("alice")
+    plan_id = plan()
+    with database.get_connection() as conn:
+        meetup_id = conn.execute(
+            "INSERT INTO meetups (plan_id, host_id, host_name, meetup_time, participants) VALUES (?, ?, ?, ?, ?)",
+            (plan_id, host, "host", "周六", json.dumps(["host", "ghost", "alice", "ghost"]))).lastrowid
+        database._migration_meetup_participants(conn.cursor())
+
+    m = meetup(meetup_id)
+    # "ghost" has no account, but stays a participant
+    assert m["participants"] == ["host", "ghost", "alice"] and m["participant_count"] == 3
+    with database.get_connection() as conn:
+        assert conn.execute("SELECT participants FROM meetups WHERE id = ?", (meetup_id,)).fetchone()[0] is None
+        guests = conn.execute("SELECT guest_name FROM meetup_participants WHERE user_id IS NULL").fetchall()
+    assert guests == [("ghost",)]
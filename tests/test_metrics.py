@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    """Metrics on for functions decorated during the test, starting from zero."""
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def stage(name):
+    """The snapshot entry of stage `name`'s duration histogram."""
+    for hist in metrics.snapshot()["histograms"]:
+        if hist["name"] == metrics.DURATION and hist["labels"] == {"stage": name}:
+            return hist
+    return None
+
+
+def test_timed_stage_is_listed_before_any_call(enabled):
+    metrics.timed("test.idle")(lambda: None)
+    assert stage("test.idle")["count"] == 0
+
+
+def test_calls_from_many_threads_add_up(enabled):
+    noop = metrics.timed("test.noop")(lambda: None)
+    threads = [threading.Thread(target=lambda: [noop() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(500):
+        noop()
+    assert stage("test.noop")["count"] >= 500 # Threads still running are counted so far
+    for thread in threads:
+        thread.join()
+    assert stage("test.noop")["count"] == 4500
+    assert 'stage_duration_seconds_count{stage="test.noop"} 4500' in metrics.prometheus_text()
+
+
+def test_ended_threads_are_folded(enabled):
+    noop = metrics.timed("test.folded")(lambda: None)
+    for _ in range(20):
+        thread = threading.Thread(target=noop)
+        thread.start()
+        thread.join()
+    metrics.snapshot()
+    assert all(thread.is_alive() for thread, _ in metrics._shards)
+    assert stage("test.folded")["count"] == 20
+
+
+def test_errors_are_counted_and_reraised(enabled):
+    @metrics.timed("test.fails")
+    def fails():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        fails()
+    with pytest.raises(ValueError), metrics.span("test.fails"):
+        raise ValueError("boom")
+    counters = {(c["name"], c["labels"]["error"]): c["value"] for c in metrics.snapshot()["counters"]}
+    assert counters[(metrics.ERRORS, "ValueError")] == 2
+    assert stage("test.fails")["count"] == 2
+
+
+def test_buckets_and_sum(enabled):
+    metrics.observe("test_seconds", 0.001)
+    metrics.observe("test_seconds", 0.003)
+    metrics.observe("test_seconds", 60)
+    [hist] = [h for h in metrics.snapshot()["histograms"] if h["name"] == "test_seconds"]
+    assert hist["count"] == 3 and hist["sum"] == pytest.approx(60.004)
+    assert hist["buckets"]["0.001"] == 1 and hist["buckets"]["0.005"] == 1 and hist["buckets"]["+Inf"] == 1
+
+
+def test_reset_zeroes_live_shards(enabled):
+    noop = metrics.timed("test.reset")(lambda: None)
+    noop()
+    metrics.reset()
+    assert stage("test.reset")["count"] == 0
+    noop()
+    assert stage("test.reset")["count"] == 1
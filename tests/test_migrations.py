@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import database
+from conftest import REPO_ROOT
+
+BUNDLED = ["vibe_navigator.db", "vibe_navigator_v2.db"]
+
+
+def legacy_participants(path):
+    """(meetup id, name) pairs stored in the legacy meetups.participants JSON."""
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'meetups'").fetchone():
+            return set()
+        return {(meetup_id, name)
+                for meetup_id, blob in conn.execute("SELECT id, participants FROM meetups WHERE participants IS NOT NULL")
+                for name in json.loads(blob)}
+    finally:
+        conn.close()
+
+
+def legacy_routes(path):
+    """{plan id: [(name, desc, image)]} from the legacy plans.route_json blobs."""
+    conn = sqlite3.connect(path)
+    try:
+        return {plan_id: [(stop["name"], stop.get("desc"), stop.get("image")) for stop in json.loads(blob)]
+                for plan_id, blob in conn.execute("SELECT id, route_json FROM plans WHERE route_json IS NOT NULL")}
+    finally:
+        conn.close()
+
+
+def snapshot(path):
+    conn = sqlite3.connect(path)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'plans_fts%' ORDER BY name")]
+        return {
+            "schema": conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall(),
+            "rows": {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall(), key=repr) for table in tables},
+        }
+    finally:
+        conn.close()
+
+
+@pytest.fixture(params=BUNDLED)
+def bundled_db(request, tmp_path, use_db):
+    """A copy of a bundled database, not yet migrated."""
+    path = tmp_path / request.param
+    shutil.copy(os.path.join(REPO_ROOT, request.param), path)
+    return use_db(path)
+
+
+def test_bundled_db_migrates(bundled_db):
+    participants = legacy_participants(bundled_db)
+    routes = legacy_routes(bundled_db)
+    database.init_db()
+
+    conn = sqlite3.connect(bundled_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+        assert conn.execute("SELECT count(*) FROM meetups WHERE participants IS NOT NULL").fetchone()[0] == 0
+        moved = set(conn.execute('''
+            SELECT mp.meetup_id, ifnull(u.username, mp.guest_name)
+            FROM meetup_participants mp LEFT JOIN users u ON u.id = mp.user_id
+        ''').fetchall())
+        assert conn.execute("SELECT count(*) FROM plans WHERE route_json IS NOT NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT count(*) FROM plans_fts_pending").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert moved == participants
+    assert {plan_id: [(stop["name"], stop["desc"], stop.get("image")) for stop in database.get_plan_route(plan_id)]
+            for plan_id in routes} == routes
+
+
+def test_second_init_db_does_nothing(bundled_db, monkeypatch):
+    database.init_db()
+    before = snapshot(bundled_db)
+
+    def step(c):
+        raise AssertionError("migration step ran again")
+
+    # Forget this process already migrated the file, so init_db has to
+    # read user_version again
+    monkeypatch.setattr(database, "_migrated", set())
+    monkeypatch.setattr(database, "MIGRATIONS", [step] * database.SCHEMA_VERSION)
+    database.init_db()
+    assert snapshot(bundled_db) == before
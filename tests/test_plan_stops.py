@@ -0,0 +1,69 @@
+import sqlite3
+
+import database
+
+GARDENS = {"name": "Gardens by the Bay", "coords": [1.2816, 103.8636], "desc": "超级树灯光秀",
+           "image": "https://images.invalid/gardens.jpg", "price": "SGD $28"}
+HAWKER = {"name": "Maxwell Food Centre", "coords": [1.2804, 103.8448], "desc": "海南鸡饭", "price": "Free",
+          "transport_from_prev": {"method": "地铁", "duration": "15 mins", "cost": "SGD $1.50"}, "tip": "早点去"}
+
+
+def save(*stops):
+    return database.save_plan(1, "tester", "Chill (休闲)", "MBS (Marina Bay Sands)", [dict(s) for s in stops], "summary")
+
+
+def stored(plan_id):
+    # plan_stops is WITHOUT ROWID, so sort by seq in Python
+    conn = sqlite3.connect(database.DB_NAME)
+    try:
+        rows = conn.execute("SELECT seq, description, image FROM plan_stops WHERE plan_id = ?", (plan_id,)).fetchall()
+    finally:
+        conn.close()
+    return [row[1:] for row in sorted(rows)]
+
+
+def test_stop_text_matching_the_place_is_not_stored_again(fresh_db):
+    first = save(GARDENS, HAWKER)
+    again = save(HAWKER, GARDENS)
+    own = save({**GARDENS, "desc": "傍晚去看", "image": None})
+    assert stored(first) == [(None, None), (None, "")]
+    assert stored(again) == [(None, ""), (None, None)]
+    assert stored(own) == [("傍晚去看", "")]
+
+    assert [s["name"] for s in database.get_plan_route(again)] == ["Maxwell Food Centre", "Gardens by the Bay"]
+    routes = {plan["id"]: plan["route"] for plan in database.get_all_plans()}
+    gardens, hawker = routes[first]
+    assert gardens["desc"] == "超级树灯光秀" and gardens["image"] == GARDENS["image"]
+    assert gardens["coords"] == [1.2816, 103.8636] and gardens["transport_from_prev"] is None
+    assert hawker["desc"] == "海南鸡饭" and "image" not in hawker
+    assert hawker["transport_from_prev"]["method"] == "地铁" and hawker["tip"] == "早点去"
+    assert routes[own][0]["desc"] == "傍晚去看" and "image" not in routes[own][0]
+    assert routes == {plan_id: database.get_plan_route(plan_id) for plan_id in routes}
+
+
+def test_stop_without_text_reads_back_without_it(fresh_db):
+    full = save(GARDENS)
+    bare = save({**GARDENS, "desc": None, "image": None})
+    stop = database.get_plan_route(bare)[0]
+    assert stop["desc"] is None and "image" not in stop
+    assert database.get_plan_route(full)[0]["desc"] == GARDENS["desc"]
+
+
+def test_place_filled_in_later(fresh_db):
+    bare = save({**GARDENS, "desc": None, "image": None})
+    full = save(GARDENS)
+    assert stored(bare) == [("", "")]
+    assert stored(full) == [(None, None)]
+    assert database.get_plan_route(bare)[0]["desc"] is None
+    assert database.get_plan_route(full)[0]["image"] == GARDENS["image"]
+
+
+def test_bulk_loaded_routes_are_searchable_before_and_after_import(fresh_db):
+    route = '[{"name": "Haw Par Villa", "coords": [1.2830, 103.7820]}]'
+    with database.get_connection() as conn:
+        plan_id = conn.execute("INSERT INTO plans (user_id, username, route_json) VALUES (1, 'bulk', ?)",
+                               (route,)).lastrowid
+    assert [p["id"] for p in database.search_plans("villa")] == [plan_id]
+    database.import_route_blobs()
+    assert [p["id"] for p in database.search_plans("villa")] == [plan_id]
+    assert database.get_plan_route(plan_id)[0]["name"] == "Haw Par Villa"
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import database
+import pricing
+from pricing import Money, parse_money
+
+
+@pytest.mark.parametrize("text, money", [
+    ("SGD $2.50", Money(250, "SGD")),
+    ("SGD $53", Money(5300, "SGD")),
+    ("Est. S$12", Money(1200, "SGD")),
+    ("SGD $10-15", Money(1000, "SGD")),
+    ("$1,200.5", Money(120050, "SGD")),
+    ("USD 20", Money(2000, "USD")),
+    ("RMB 30", Money(3000, "CNY")),
+    ("Free", Money(0, "SGD")),
+    ("免费", Money(0, "SGD")),
+    (4.5, Money(450, "SGD")),
+])
+def test_parse_money(text, money):
+    assert parse_money(text) == money
+
+
+@pytest.mark.parametrize("text", ["Check On-site", "", None, "freedom"])
+def test_unknown_prices_are_none(text):
+    assert parse_money(text) is None
+
+
+def test_format_cents():
+    assert pricing.format_cents(5300) == "SGD $53"
+    assert pricing.format_cents(250, "USD") == "USD $2.50"
+
+
+def test_catalog_overrides_the_llm_price():
+    catalog = pricing.PriceCatalog({"Gardens by the Bay": "SGD $28"})
+    stop = pricing.price_stop({"name": "gardens by the bay", "price": "SGD $5"}, catalog)
+    assert (stop["price"], stop["price_cents"], stop["currency"]) == ("SGD $28", 2800, "SGD")
+
+
+def test_route_totals():
+    stops = pricing.price_route([
+        {"name": "A", "price": "SGD $10", "transport_from_prev": None},
+        {"name": "B", "price": "Free", "transport_from_prev": {"cost": "SGD $1.20"}},
+        {"name": "C", "price": "USD 5", "transport_from_prev": {"cost": "MYR 3"}},
+        {"name": "D", "price": "Check On-site"},
+    ], pricing.PriceCatalog({}))
+    assert pricing.route_totals(stops) == {"tickets_cents": 1000, "transport_cents": 120, "total_cents": 1120,
+                                           "currency": "SGD", "unpriced": 2}
+
+
+def test_migration_backfills_totals_in_batches(fresh_db, monkeypatch):
+    monkeypatch.setattr(database, "IMPORT_BATCH", 2)
+    route = [{"name": "A", "price": "SGD $3"}, {"name": "B", "price": "SGD $4.50"}]
+    with database.get_connection() as conn:
+        conn.executemany("INSERT INTO plans (user_id, username, route_json) VALUES (1, 't', ?)",
+                         [(json.dumps(route),)] * 5 + [("not json",)])
+        conn.execute("UPDATE plans SET total_cents = NULL")
+        database._migration_plan_totals(conn.cursor())
+        totals = [r[0] for r in conn.execute("SELECT total_cents FROM plans ORDER BY id")]
+    assert totals == [750] * 5 + [None]
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+import route_optimizer as ro
+
+ORIGIN = [1.3000, 103.8000]
+
+
+def random_points(seed, n):
+    rng = random.Random(seed)
+    return [[1.27 + rng.random() * 0.08, 103.80 + rng.random() * 0.10] for _ in range(n)]
+
+
+def open_length(points, order, origin=ORIGIN):
+    path = [origin] + [points[i] for i in order]
+    dist = ro.distance_matrix(path)
+    return ro.path_length(dist, list(range(len(path))))
+
+
+def test_distance_matrix_is_haversine():
+    dist = ro.distance_matrix([[1.3, 103.8], [1.3, 103.9], [1.4, 103.8]])
+    assert dist.shape == (3, 3) and np.allclose(dist, dist.T) and np.allclose(np.diag(dist), 0.0)
+    assert dist[0, 2] == pytest.approx(11.12, abs=0.01) # 0.1° of latitude
+
+
+def test_two_opt_uncrosses_a_crossing():
+    # 0 -> 1 -> 2 -> 3 -> end, where the legs 0-1 and 2-3 cross
+    dist = ro._augmented([[0.0, 1.0], [1.0, 0.0], [1.0, 1.0]], [0.0, 0.0])
+    crossed = np.array([0, 3, 2, 1, 4])
+    path, improved = ro._two_opt_pass(dist, crossed)
+    assert improved and ro.path_length(dist, path) < ro.path_length(dist, crossed)
+    assert path[0] == 0 and path[-1] == 4
+
+
+def test_or_opt_moves_a_stop_into_its_gap():
+    # Stops on a line with one pulled out of place: moving it is the only fix
+    points = [[1.30, 103.80 + 0.01 * i] for i in range(1, 6)]
+    dist = ro._augmented(points, [1.30, 103.80])
+    path = np.array([0, 1, 3, 4, 2, 5, 6])
+    new, improved = ro._or_opt_pass(dist, path)
+    assert improved and list(new) == [0, 1, 2, 3, 4, 5, 6]
+
+
+def test_passes_report_no_improvement_at_a_local_optimum():
+    points = [[1.30, 103.80 + 0.01 * i] for i in range(1, 6)]
+    dist = ro._augmented(points, [1.30, 103.80])
+    path = np.arange(7)
+    assert not ro._two_opt_pass(dist, path)[1]
+    assert not ro._or_opt_pass(dist, path)[1]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_optimize_order_never_lengthens_the_path(seed):
+    points = random_points(seed, 12)
+    order = ro.optimize_order(points, ORIGIN)
+    assert sorted(order) == list(range(12))
+    assert open_length(points, order) <= open_length(points, range(12)) + 1e-9
+
+
+def test_optimize_order_sorts_points_on_a_line():
+    points = [[1.30, 103.80 + 0.01 * i] for i in range(1, 9)]
+    shuffled = [points[i] for i in (5, 2, 7, 0, 3, 6, 1, 4)]
+    order = ro.optimize_order(shuffled, [1.30, 103.80])
+    assert [shuffled[i] for i in order] == points
+
+
+@pytest.mark.parametrize("origin", [ORIGIN, None])
+@pytest.mark.parametrize("seed", range(5))
+def test_cheapest_insertion_matches_brute_force(seed, origin):
+    points = random_points(seed, 6)
+    new_point = random_points(seed + 100, 1)[0]
+    start = [] if origin is None else [origin]
+
+    def added(pos):
+        path = start + points[:pos] + [new_point] + points[pos:]
+        dist = ro.distance_matrix(path)
+        return ro.path_length(dist, list(range(len(path))))
+
+    best = min(range(len(points) + 1), key=added)
+    assert added(ro.cheapest_insertion(points, new_point, origin)) == pytest.approx(added(best))
+
+
+def test_insert_stop_refreshes_only_changed_legs():
+    leg = {"method": "步行", "duration": "5 mins", "cost": "SGD $0"}
+    stops = [{"name": "A", "coords": [1.30, 103.81], "transport_from_prev": None},
+             {"name": "C", "coords": [1.30, 103.83], "transport_from_prev": leg}]
+    new = ro.insert_stop(stops, {"name": "B", "coords": [1.30, 103.82]}, [1.30, 103.80])
+    assert [s["name"] for s in new] == ["A", "B", "C"]
+    assert new[1]["transport_from_prev"] == ro.estimate_leg(1.112) # 0.01° of longitude
+    assert new[2]["transport_from_prev"] != leg
+    assert stops[1]["transport_from_prev"] is leg # Input left alone
+
+
+def test_insert_stop_without_coords_appends():
+    stops = [{"name": "A", "coords": [1.30, 103.81]}, {"name": "B", "coords": [1.30, 103.83]}]
+    new = ro.insert_stop(stops, {"name": "X"})
+    assert [s["name"] for s in new] == ["A", "B", "X"]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from route_stream import StopStreamParser
+
+STOPS = [
+    {"name": "Maxwell \"Food\" Centre", "coords": [1.2803, 103.8448], "desc": "C:\\path {not a brace}"},
+    {"name": "Gardens", "coords": [1.2816, 103.8636], "meta": {"stops": [{"name": "nested"}], "tags": ["[", "]"]}},
+    {"name": "牛车水", "coords": [1.2839, 103.8436], "desc": "夜市"},
+]
+DOCUMENT = json.dumps({"summary": "A day out", "stops": STOPS, "extra": {"stops": [{"name": "not a stop"}]}},
+                      ensure_ascii=False)
+
+
+def feed_in(parser, text, sizes):
+    """Feed `text` in chunks cycling through `sizes`; returns every completed stop."""
+    out, pos, i = [], 0, 0
+    while pos < len(text):
+        size = sizes[i % len(sizes)]
+        out += parser.feed(text[pos:pos + size])
+        pos += size
+        i += 1
+    return out
+
+
+@pytest.mark.parametrize("sizes", [[len(DOCUMENT)], [1], [2, 3], [7], [5, 1, 13]])
+def test_any_chunking_yields_the_same_stops(sizes):
+    parser = StopStreamParser()
+    assert feed_in(parser, DOCUMENT, sizes) == STOPS
+    assert parser.document() == json.loads(DOCUMENT)
+
+
+def test_stops_arrive_as_soon_as_they_close():
+    parser = StopStreamParser()
+    first_end = DOCUMENT.index(', {"name": "Gardens"')
+    assert parser.feed(DOCUMENT[:first_end - 1]) == []
+    assert parser.feed(DOCUMENT[first_end - 1:first_end]) == [STOPS[0]]
+
+
+def test_other_keys_and_nested_arrays_are_ignored():
+    parser = StopStreamParser()
+    text = '{"notes": ["stops", {"a": 1}], "stops": [{"name": "A"}], "x": {"stops": [{"name": "B"}]}}'
+    assert feed_in(parser, text, [3]) == [{"name": "A"}]
+
+
+def test_malformed_stop_is_skipped():
+    parser = StopStreamParser()
+    text = '{"stops": [{"name": "A",}, {"name": "B"}]'
+    assert feed_in(parser, text, [4]) == [{"name": "B"}]
+
+
+def test_custom_key():
+    parser = StopStreamParser("routes")
+    text = '{"stops": [{"name": "A"}], "routes": [{"stops": [{"name": "B"}]}]}'
+    assert feed_in(parser, text, [1]) == [{"stops": [{"name": "B"}]}]
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+import database
+
+ROUTE = [
+    {"name": "滨海湾花园", "coords": [1.2816, 103.8636], "desc": "超级树", "price": "SGD $28"},
+    {"name": "Maxwell Food Centre", "coords": [1.2804, 103.8448], "desc": "海南鸡饭", "price": "Free"},
+]
+
+
+def save(summary, route=ROUTE):
+    database.save_plan(1, "tester", "Foodie (美食)", "MBS (Marina Bay Sands)", [dict(s) for s in route], summary)
+    with database.get_connection() as conn:
+        return conn.execute("SELECT max(id) FROM plans").fetchone()[0]
+
+
+def hit_ids(query, **filters):
+    return [plan["id"] for plan in database.search_plans(query, filters)]
+
+
+@pytest.fixture
+def raw_conn(fresh_db):
+    # A plain sqlite3 connection: no custom SQL functions registered
+    conn = sqlite3.connect(fresh_db)
+    yield conn
+    conn.close()
+
+
+def test_fts_query():
+    assert database.fts_query("滨海湾 Garden") == '"滨海 海湾" "Garden"*'
+    assert database.fts_query("美") == '"美"*'
+    assert database.fts_query("  ,; ") is None
+
+
+def test_saved_plans_are_searchable(fresh_db):
+    plan_id = save("在老巴刹吃沙爹")
+    other_id = save("Night walk along the river", route=ROUTE[1:])
+    assert hit_ids("滨海") == [plan_id]
+    assert hit_ids("沙爹") == [plan_id]
+    assert sorted(hit_ids("maxwell")) == [plan_id, other_id]
+    assert hit_ids("river walk") == [other_id]
+    assert hit_ids("美食", mood="Chill (休闲)") == []
+
+    database.add_review(other_id, "Chill (休闲)", "夜景很美", 5)
+    assert hit_ids("夜景") == [other_id]
+
+
+def test_raw_sql_writes_are_searchable(fresh_db, raw_conn):
+    plan_id = save("在老巴刹吃沙爹")
+    with raw_conn:
+        raw_conn.execute("UPDATE plans SET summary = 'sunset cruise', review_text = '辣椒蟹很好吃' WHERE id = ?", (plan_id,))
+        raw_conn.executemany("INSERT INTO plans (user_id, username, mood, start_loc, summary) VALUES (1, 'raw', 'm', 's', ?)",
+                             [("bulk loaded plan",)] * 3)
+    assert hit_ids("沙爹") == []
+    assert hit_ids("sunset") == [plan_id]
+    assert hit_ids("辣椒蟹") == [plan_id]
+    assert len(hit_ids("bulk")) == 3
+
+    with raw_conn:
+        raw_conn.execute("DELETE FROM plans WHERE id = ?", (plan_id,))
+    assert hit_ids("sunset") == []
+    assert raw_conn.execute("SELECT count(*) FROM plans_fts WHERE rowid = ?", (plan_id,)).fetchone()[0] == 0
+
+
+def test_triggers_need_no_custom_functions(raw_conn):
+    triggers = raw_conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    assert triggers and not any("fts_segment" in sql for sql, in triggers)
+
+
+def test_init_db_indexes_existing_plans(fresh_db, raw_conn, monkeypatch):
+    save("在老巴刹吃沙爹")
+    with raw_conn:
+        raw_conn.execute("UPDATE plans SET summary = 'chilli crab'")
+    monkeypatch.setattr(database, "_migrated", set())
+    database.init_db()
+    assert raw_conn.execute("SELECT count(*) FROM plans_fts_pending").fetchone()[0] == 0
+    assert raw_conn.execute("SELECT count(*) FROM plans_fts WHERE plans_fts MATCH 'crab'").fetchone()[0] == 1
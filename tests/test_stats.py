@@ -0,0 +1,87 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+import database
+
+MOODS = ["Chill (休闲)", "Foodie (美食)", None]
+STARTS = ["NUS (National University of Singapore)", "MBS (Marina Bay Sands)", None]
+PLACES = ["Gardens by the Bay", "Maxwell Food Centre", "Chinatown", "Jewel Changi", "Haw Par Villa"]
+
+
+def random_route(rng):
+    # Repeated stop names count once per plan
+    return [{"name": rng.choice(PLACES), "coords": [1.3, 103.8]} for _ in range(rng.randint(0, 4))]
+
+
+def edit_route(conn, plan_id, route):
+    # A bulk-load style write: the blob is moved into plan_stops afterwards
+    conn.execute("UPDATE plans SET route_json = ? WHERE id = ?", (json.dumps(route), plan_id))
+    database._import_route_blobs(conn)
+
+
+def recomputed(conn):
+    plans = conn.execute("SELECT id, mood, start_loc, post_mood, rating FROM plans").fetchall()
+    routes = database._load_routes(conn)
+    transitions, ratings, places = Counter(), {}, Counter()
+    for plan_id, mood, start_loc, post_mood, rating in plans:
+        if post_mood is not None:
+            transitions[(mood or "", post_mood)] += 1
+        if rating is not None:
+            total, count = ratings.get((mood or "", start_loc or ""), (0, 0))
+            ratings[(mood or "", start_loc or "")] = (total + rating, count + 1)
+        places.update({stop["name"] for stop in routes.get(plan_id, [])})
+    return transitions, ratings, places
+
+
+def maintained(conn):
+    transitions = Counter({(m, p): n for m, p, n in conn.execute("SELECT * FROM mood_transitions WHERE count > 0")})
+    ratings = {(m, s): (t, n) for m, s, t, n in conn.execute("SELECT * FROM rating_stats WHERE rating_count > 0")}
+    places = Counter(dict(conn.execute("SELECT place, uses FROM place_usage WHERE uses > 0")))
+    return transitions, ratings, places
+
+
+def plan_ids(conn):
+    return [r[0] for r in conn.execute("SELECT id FROM plans ORDER BY id")]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_aggregates_match_plans_after_random_writes(fresh_db, seed):
+    rng = random.Random(seed)
+    for _ in range(150):
+        with database.get_connection() as conn:
+            ids = plan_ids(conn)
+            op = rng.choice(["insert", "insert", "review", "route", "mood", "delete"]) if ids else "insert"
+            if op == "insert":
+                plan_id = conn.execute("INSERT INTO plans (user_id, username, mood, start_loc, summary) VALUES (1, 't', ?, ?, '')",
+                                       (rng.choice(MOODS), rng.choice(STARTS))).lastrowid
+                edit_route(conn, plan_id, random_route(rng))
+            elif op == "review":
+                conn.execute("UPDATE plans SET post_mood = ?, rating = ? WHERE id = ?",
+                             (rng.choice(MOODS), rng.choice([None, 1, 3, 5]), rng.choice(ids)))
+            elif op == "route":
+                edit_route(conn, rng.choice(ids), random_route(rng))
+            elif op == "mood":
+                conn.execute("UPDATE plans SET mood = ?, start_loc = ? WHERE id = ?",
+                             (rng.choice(MOODS), rng.choice(STARTS), rng.choice(ids)))
+            else:
+                conn.execute("DELETE FROM plans WHERE id = ?", (rng.choice(ids),))
+    with database.get_connection() as conn:
+        assert maintained(conn) == recomputed(conn)
+
+
+def test_stats_api(fresh_db):
+    database.save_plan(1, "t", MOODS[0], STARTS[0], [{"name": "Chinatown"}, {"name": "Chinatown"}], "")
+    database.save_plan(1, "t", MOODS[0], STARTS[1], [{"name": "Chinatown"}, {"name": "Jewel Changi"}], "")
+    with database.get_connection() as conn:
+        first, second = plan_ids(conn)
+    database.add_review(first, MOODS[1], "", 4)
+    database.add_review(second, MOODS[1], "", 2)
+
+    assert database.get_popular_places() == [("Chinatown", 2), ("Jewel Changi", 1)]
+    assert database.get_mood_transitions(MOODS[0]) == [(MOODS[0], MOODS[1], 2)]
+    assert database.get_rating_stats(MOODS[0]) == (3.0, 2)
+    assert database.get_rating_stats(MOODS[0], STARTS[1]) == (2.0, 1)
+    assert database.get_rating_stats(MOODS[1]) == (None, 0)
@@ -0,0 +1,162 @@
+"""Precomputed travel times and fares between known places.
+
+Build it offline (re-run after many new plans have been shared):
+
+    python travel_matrix.py
+
+The app memory-maps the resulting file, so a leg lookup is two array reads
+and every Streamlit worker process shares one copy through the page cache.
+"""
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+import gazetteer
+import route_optimizer
+
+TRAVEL_MATRIX_FILE = "travel_matrix.bin"
+
+MAGIC = b"SGTM"
+FORMAT_VERSION = 1
+DATA_ALIGN = 64
+
+# --- Mode Models ---
+# Straight-line distance times a detour factor gives the travel distance.
+# Time is a fixed overhead (waiting, walking to the station) plus distance at
+# an average speed; fares are a base plus a per-km rate, capped.
+MODES = {
+    #        label        detour  km/h  overhead min  base SGD  per km  cap SGD
+    "walk": ("步行",       1.3,    4.5,  0,            0.0,      0.0,    0.0),
+    "bus":  ("巴士",       1.4,    18.0, 8,            1.09,     0.10,   2.37),
+    "mrt":  ("地铁",       1.3,    35.0, 10,           1.09,     0.08,   2.50),
+    "taxi": ("Taxi/Grab",  1.35,   30.0, 5,            4.10,     0.70,   80.0),
+}
+MAX_WALK_MINUTES = 15
+MINUTES_PER_SGD = 5 # How many minutes of travel one dollar is worth when picking a mode
+
+
+def build_matrix(places):
+    """Travel minutes and fare cents for every mode between every pair.
+
+    Returns a uint16 array of shape (2, len(MODES), n, n): [0] minutes, [1] fares.
+    """
+    km = route_optimizer.distance_matrix([p["coords"] for p in places])
+    data = np.zeros((2, len(MODES), len(places), len(places)), dtype=np.uint16)
+    for m, (_, detour, kmh, overhead, base, per_km, cap) in enumerate(MODES.values()):
+        travel_km = km * detour
+        minutes = np.ceil(overhead + travel_km / kmh * 60)
+        fares = np.minimum(base + per_km * travel_km, cap) * 100 if base else np.zeros_like(km)
+        np.fill_diagonal(minutes, 0)
+        np.fill_diagonal(fares, 0)
+        data[0, m] = np.clip(minutes, 0, 65535)
+        data[1, m] = np.clip(np.round(fares), 0, 65535)
+    return data
+
+
+def write_matrix(path, places):
+    names = [p["name"] for p in places]
+    data = build_matrix(places)
+    header = json.dumps({"modes": list(MODES), "names": names, "shape": list(data.shape)},
+                        ensure_ascii=False).encode()
+    offset = len(MAGIC) + 8 + len(header)
+    padding = -offset % DATA_ALIGN
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", FORMAT_VERSION, len(header) + padding))
+        f.write(header + b" " * padding)
+        f.write(data.tobytes())
+    os.replace(tmp_path, path) # Running apps keep their old mapping until restart
+
+
+class TravelMatrix:
+    """Read-only, memory-mapped view of a travel matrix file."""
+
+    def __init__(self, path=TRAVEL_MATRIX_FILE):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a travel matrix file")
+            version, header_len = struct.unpack("<II", f.read(8))
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+            header = json.loads(f.read(header_len))
+        self.modes = header["modes"]
+        self.names = header["names"]
+        self._data = np.memmap(path, dtype=np.uint16, mode="r",
+                               offset=len(MAGIC) + 8 + header_len, shape=tuple(header["shape"]))
+        self._index = {}
+        for i, name in enumerate(self.names):
+            for key in gazetteer.name_keys(name):
+                self._index.setdefault(key, i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        for key in gazetteer.name_keys(name):
+            if key in self._index:
+                return self._index[key]
+        return None
+
+    def options(self, i, j):
+        """{mode: (minutes, fare_cents)} for travelling from place i to place j."""
+        return {mode: (int(self._data[0, m, i, j]), int(self._data[1, m, i, j]))
+                for m, mode in enumerate(self.modes)}
+
+    def best_leg(self, i, j):
+        """The leg we'd suggest from place i to j, in transport_from_prev format."""
+        options = self.options(i, j)
+        if options["walk"][0] <= MAX_WALK_MINUTES:
+            mode = "walk"
+        else:
+            mode = min((m for m in options if m != "walk"),
+                       key=lambda m: options[m][0] + options[m][1] / 100 * MINUTES_PER_SGD)
+        minutes, fare_cents = options[mode]
+        cost = f"SGD ${fare_cents / 100:.2f}" if fare_cents else "SGD $0"
+        return {"method": MODES[mode][0], "duration": f"{minutes} mins", "cost": cost, "cost_cents": fare_cents}
+
+    def leg(self, from_name, to_name, gaz=None):
+        """best_leg between two place names, or None if either isn't in the matrix.
+
+        With a gazetteer, names are first resolved to a known place, so
+        slight variations in LLM spelling still hit the matrix.
+        """
+        ends = []
+        for name in (from_name, to_name):
+            idx = self.index(name)
+            if idx is None and gaz is not None:
+                place, score = gaz.lookup(name)
+                if place and score >= gazetteer.MATCH_THRESHOLD:
+                    idx = self.index(place["name"])
+            if idx is None:
+                return None
+            ends.append(idx)
+        return self.best_leg(*ends)
+
+
+def load(path=TRAVEL_MATRIX_FILE):
+    """The travel matrix at path, or None if it hasn't been built."""
+    if not os.path.exists(path):
+        return None
+    return TravelMatrix(path)
+
+
+def main():
+    import database
+    from constants import START_LOCATIONS, TICKET_PRICES
+
+    parser = argparse.ArgumentParser(description="Build the travel-time matrix between known places.")
+    parser.add_argument("--out", default=TRAVEL_MATRIX_FILE)
+    args = parser.parse_args()
+
+    database.init_db()
+    gaz = gazetteer.build(TICKET_PRICES, START_LOCATIONS, database.get_place_locations())
+    write_matrix(args.out, gaz.places)
+    print(f"Wrote {len(gaz.places)} places x {len(MODES)} modes to {args.out} ({os.path.getsize(args.out)} bytes)")
+
+
+if __name__ == "__main__":
+    main()